@@ -26,8 +26,9 @@ from data_tools.load_raw_cluster_data import LoadExperiment as le
 
 from analysis_tools.common import sqr_err
 from data_tools.common import get_data
+from analysis_tools.rng import get_rng
 from akf.common import fetch_weights
-from akf.armakf import autokf as akf
+from akf.armakf import autokf_batch as akf_batch
 
 class AKF_Optimisation(object):
     ''' AKF_Optimisation
@@ -79,12 +80,17 @@ class AKF_Optimisation(object):
 
 
 
-    def make_BR_AKF_MAP(self, mapname='_BR_AKF_MAP_correctQ_'):
+    def make_BR_AKF_MAP(self, mapname='_BR_AKF_MAP_correctQ_', rng_seed=None):
         ''' Save .npz file for a Bayes Risk map for random (sigma, R) for AKF.
 
         Parameters:
         ----------
             mapname (str) : Filename for output .npz file.
+            rng_seed (`int`, optional) : Seed for reproducible random number streams.
+                Measurement noise for record idx_d of (sigma, R) pair idx_randparams
+                is drawn from the stream (rng_seed, (idx_randparams, idx_d)), see
+                analysis_tools.rng. If None, draws from the global np.random state.
+                Defaults to None.
 
         Returns:
         -------
@@ -104,19 +110,31 @@ class AKF_Optimisation(object):
             forecastng_errors = []
             store_this_truth = []
 
+            init_ = self.dataobject.LKFFB_random_hyperparams_list[idx_randparams, :]
+            truths = []
+            y_signals = []
+
             for idx_d in xrange(self.dataobject.LKFFB_max_it_BR):
 
-                init_ = self.dataobject.LKFFB_random_hyperparams_list[idx_randparams, :]
                 truth = self.dataobject.LKFFB_macro_truth[idx_randparams, idx_d, :]
-                y_signal = truth + self.dataobject.LKFFB_msmt_noise_variance*np.random.randn(truth.shape[0])
-
-                akf_prediction = akf(path2dir+'_AKF_', y_signal, self.AKF_weights,
-                                     init_[0],
-                                     init_[1],
-                                     n_train=self.dataobject.Expt.n_train,
-                                     n_testbefore=self.dataobject.Expt.n_testbefore,
-                                     n_predict=self.dataobject.Expt.n_predict,
-                                     p0=10000, skip_msmts=self.AKF_skip_msmts)
+                rng = np.random if rng_seed is None else get_rng(rng_seed, (idx_randparams, idx_d))
+                y_signal = truth + self.dataobject.LKFFB_msmt_noise_variance*rng.randn(truth.shape[0])
+                truths.append(truth)
+                y_signals.append(y_signal)
+
+            # Gains are data independent: filter all records at once with one gain schedule
+            akf_predictions = akf_batch(np.array(y_signals), self.AKF_weights,
+                                        init_[0],
+                                        init_[1],
+                                        n_train=self.dataobject.Expt.n_train,
+                                        n_testbefore=self.dataobject.Expt.n_testbefore,
+                                        n_predict=self.dataobject.Expt.n_predict,
+                                        p0=10000, skip_msmts=self.AKF_skip_msmts)
+
+            for idx_d in xrange(self.dataobject.LKFFB_max_it_BR):
+
+                truth = truths[idx_d]
+                akf_prediction = akf_predictions[idx_d]
 
                 truth_ = truth[self.dataobject.Expt.n_train - self.dataobject.Expt.n_testbefore : self.dataobject.Expt.n_train + self.dataobject.Expt.n_predict]
                 residuals_sqr_errors = sqr_err(akf_prediction, truth_) ## (akf_prediction.real - truth_.real)**2
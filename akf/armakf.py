@@ -13,18 +13,47 @@ Created on Thu Apr 20 19:20:43 2017
     ----------------------
         get_autoreg_model : Return the dynamic state space model for AR(q).
         propagate_states_no_gamma : Return state propagation without a Kalman update.
+        companion_dot : Return the product of the AR(q) dynamic model with an array,
+            using its companion matrix structure.
+        propagate_states_companion : As propagate_states_no_gamma, using the
+            companion matrix structure of the dynamic model in O(order^2).
+        get_steady_state_gain : Return the steady state Kalman gain for AKF via a
+            discrete algebraic Riccati equation.
         autokf : Save .npz file ooutput from an autoregressive Kalman Filtering (AKF) run.
+        get_gain_schedule : Return the data independent sequence of AKF Kalman gains.
+        autokf_batch : Return AKF predictions for a stack of measurement records,
+            filtered simultaneously with a shared gain schedule.
 
 .. moduleauthor:: Riddhi Gupta <riddhi.sw@gmail.com>
 '''
 
 from __future__ import division, print_function, absolute_import
 
+import warnings
+from collections import OrderedDict
+
 import numpy as np
+import numpy.linalg as la
+from scipy.linalg import solve_discrete_are
 import sys
 sys.path.append('../')
 
 from kf.common import calc_residuals, calc_Kalman_Gain, projected_msmt
+from kf.jit import resolve_backend, NUMBA, akf_loop
+
+DENSE, COMPANION = range(2)
+PropagationMode = {
+    "Dense": DENSE,
+    "Companion": COMPANION
+}
+
+# Max number of (weights, oe, rk) steady state solutions kept by get_steady_state_gain
+STEADY_STATE_CACHE_SIZE = 16
+_STEADY_STATE_CACHE = OrderedDict()
+
+# Max number of gain schedules kept by get_gain_schedule
+GAIN_SCHEDULE_CACHE_SIZE = 8
+_GAIN_SCHEDULE_CACHE = OrderedDict()
 
 def get_autoreg_model(order, weights):
     """ Return the dynamic state space model for AR(q) process.
@@ -76,8 +105,107 @@ def propagate_states_no_gamma(a, x_hat, P_hat, Q):
     return x_hat_apriori, P_hat_apriori
 
 
+def companion_dot(weights, x):
+    '''Return a * x, where a is the AR(q) dynamic model from get_autoreg_model.
+    As a is a companion matrix, a * x is one dot product with weights for the
+    first row, and a shift of x for the remaining rows.
+
+    Parameters:
+    ----------
+        weights (`float64`) : Coefficients of an AR(q) process [Dim: 1 x order].
+        x (`float64`) : Array to be multiplied [Dim: order x m].
+
+    Returns:
+    -------
+        ax (`float64`) : a * x [Dim: order x m].
+    '''
+    ax = np.empty(x.shape)
+    ax[0] = np.dot(weights, x)
+    ax[1:] = x[:-1]
+    return ax
+
+
+def propagate_states_companion(weights, x_hat, P_hat, Q):
+    '''Return state propagation as in propagate_states_no_gamma, using the
+    companion matrix structure of the dynamic model. Costs O(order^2) per time
+    step rather than O(order^3).
+
+    Parameters:
+    ----------
+         weights (`float64`) : Coefficients of an AR(q) process [Dim: 1 x order].
+         x_hat, P_hat, Q : As defined in propagate_states_no_gamma.
+
+    Returns:
+    -------
+        x_hat_apriori, P_hat_apriori : As defined in propagate_states_no_gamma.
+    '''
+    x_hat_apriori = companion_dot(weights, x_hat)
+    # a P a.T == (a (a P).T).T
+    P_hat_apriori = companion_dot(weights, companion_dot(weights, P_hat).T).T + Q
+
+    return x_hat_apriori, P_hat_apriori
+
+
+def get_steady_state_gain(weights, oe, rk):
+    '''Return the steady state Kalman gain for AKF, from one solve of the discrete
+    algebraic Riccati equation for the apriori state variance. Solutions are cached
+    by (weights, oe, rk).
+
+    Parameters:
+    ----------
+        weights (`float64`) : Coefficients of an AR(q) process [Dim: 1 x order].
+        oe (`float64`) : Kalman process noise variance parameter [Dim: 1 x 1].
+        rk (`float64`) : Kalman measurement noise variance parameter [Dim: 1 x 1].
+
+    Returns:
+    -------
+        W (`float64`) : Steady state Kalman gain [Dim: order x 1].
+        S (`float64`) : Steady state predicted output variance [Dim: 1 x 1].
+        P_hat (`float64`) : Steady state aposteriori state variance [Dim: order x order].
+
+        Returned arrays are read only.
+
+    Raises:
+    ------
+        LinAlgError, ValueError : If no stabilising solution to the Riccati
+            equation is found.
+    '''
+    weights = np.asarray(weights, dtype=np.float64)
+    key = (weights.tobytes(), float(oe), float(rk))
+
+    if key in _STEADY_STATE_CACHE:
+        # Move to the end to mark as most recently used
+        solution = _STEADY_STATE_CACHE.pop(key)
+        _STEADY_STATE_CACHE[key] = solution
+        return solution
+
+    order = weights.shape[0]
+    a = get_autoreg_model(order, weights)
+    Q = np.zeros((order, order))
+    Q[0, 0] = oe**2
+    h = np.zeros((order, 1))
+    h[0, 0] = 1.0
+
+    # Filtering form of the Riccati equation is the dual of the control form
+    P_hat_apriori = solve_discrete_are(a.T, h, Q, np.array([[rk]], dtype=np.float64))
+
+    S = np.dot(h.T, np.dot(P_hat_apriori, h)) + rk
+    W = np.dot(P_hat_apriori, h)*(1.0/S)
+    P_hat = P_hat_apriori - S*np.outer(W, W.T)
+
+    for array in (W, S, P_hat):
+        array.flags.writeable = False
+
+    if len(_STEADY_STATE_CACHE) >= STEADY_STATE_CACHE_SIZE:
+        _STEADY_STATE_CACHE.popitem(last=False)
+    _STEADY_STATE_CACHE[key] = (W, S, P_hat)
+
+    return W, S, P_hat
+
+
 def autokf(descriptor, y_signal, weights, oe, rk, n_train=1000, n_testbefore=50,
-           n_predict=50, p0=10000, skip_msmts=1,  save='No', quantised='No'):
+           n_predict=50, p0=10000, skip_msmts=1,  save='No', quantised='No', backend='numpy',
+           steady_state='No', steady_state_tol=None, propagation='Companion'):
 
     '''
     Save .npz file ooutput from an autoregressive Kalman Filtering (AKF) run. KF
@@ -104,6 +232,22 @@ def autokf(descriptor, y_signal, weights, oe, rk, n_train=1000, n_testbefore=50,
             Defaults to 'No'.
         quantised (`str`, optional): Implements a QKF (non-linear) measurement model if 'Yes'.
             Defaults to 'No'. [DEPRECIATED - see module QIF instead.]
+        backend (`str`, optional): 'numpy' / 'numba' choice for the filtering loop.
+            'numba' runs kf.jit.akf_loop. 'numpy' is used instead if numba is not
+            installed or if quantised is 'Yes'. Defaults to 'numpy'.
+        steady_state (`str`, optional): If 'Yes', filters with the fixed steady state
+            gain from get_steady_state_gain, such that each time step costs one
+            matrix-vector product. Applies only if skip_msmts == 1 and quantised
+            is 'No'. If no steady state gain is found, warns with a RuntimeWarning
+            and uses the time-varying gain. Defaults to 'No'.
+        steady_state_tol (`float64`, optional): If steady_state is 'Yes', the
+            time-varying gain is used until it differs from the steady state gain by
+            less than steady_state_tol in every element. If None, the steady state
+            gain is used from the first time step. Defaults to None.
+        propagation (`str`, optional): 'Dense' / 'Companion' choice for state
+            propagation. 'Companion' uses propagate_states_companion, in O(order^2)
+            per time step rather than O(order^3). Backend 'numba' propagates
+            densely. Defaults to 'Companion'.
 
     Returns:
     -------
@@ -133,6 +277,7 @@ def autokf(descriptor, y_signal, weights, oe, rk, n_train=1000, n_testbefore=50,
     Q[0, 0] = oe**2
 
     a = get_autoreg_model(order, weights)
+    propagation_ = PropagationMode[propagation]
 
     h[0] = 1.0
 
@@ -152,11 +297,62 @@ def autokf(descriptor, y_signal, weights, oe, rk, n_train=1000, n_testbefore=50,
     predictions = np.zeros(n_testbefore + n_predict)
 
 
+    # Steady state gain, if requested and valid for this measurement model
+    fixed_gain = False
+    if steady_state == 'Yes' and skip_msmts == 1 and quantised == 'No':
+        try:
+            W_ss, S_ss, P_hat_ss = get_steady_state_gain(weights, oe, rk)
+            steady_state_on = True
+        except (la.LinAlgError, ValueError):
+            warnings.warn("No steady state gain found; time-varying gain is used instead",
+                          RuntimeWarning, stacklevel=2)
+            steady_state_on = False
+        if steady_state_on and steady_state_tol is None:
+            fixed_gain = True
+            P_hat = np.array(P_hat_ss)
+    else:
+        steady_state_on = False
+
     # Start Filtering
     k = order # Wait until order number of msmts have been made
+
+    if resolve_backend(backend) == NUMBA and quantised == 'No' and not steady_state_on:
+        akf_loop(np.asarray(y_signal, dtype=np.float64), a, Q, x_hat, P_hat, float(rk),
+                 n_train, skip_msmts, store_x_hat[:, 0, :], store_P_hat,
+                 store_W[:, 0, :], store_S[0, 0, :], store_S_Outer_W, e_z)
+        k = num
+
     while k < num:
 
-        x_hat_apriori, P_hat_apriori = propagate_states_no_gamma(a, x_hat, P_hat, Q)
+        if fixed_gain:
+            # The gain and state variance are fixed; only states are updated
+            if propagation_ == COMPANION:
+                x_hat_apriori = companion_dot(weights, x_hat)
+            else:
+                x_hat_apriori = np.dot(a, x_hat)
+
+            if k > n_train:
+                x_hat = x_hat_apriori
+                if save == 'Yes' and propagation_ == COMPANION:
+                    P_hat = propagate_states_companion(weights, x_hat, P_hat, Q)[1]
+                elif save == 'Yes':
+                    P_hat = np.dot(np.dot(a, P_hat), a.T) + Q
+            else:
+                e_z[k] = calc_residuals(h, x_hat_apriori, y_signal[k])
+                x_hat = x_hat_apriori + W_ss*e_z[k]
+                store_S[:, :, k] = S_ss
+                store_S_Outer_W[:, :, k] = S_ss*np.outer(W_ss, W_ss.T)
+                store_W[:, :, k] = W_ss
+
+            store_x_hat[:, :, k] = x_hat
+            store_P_hat[:, :, k] = P_hat
+            k = k + 1
+            continue
+
+        if propagation_ == COMPANION:
+            x_hat_apriori, P_hat_apriori = propagate_states_companion(weights, x_hat, P_hat, Q)
+        else:
+            x_hat_apriori, P_hat_apriori = propagate_states_no_gamma(a, x_hat, P_hat, Q)
 
         if k > (n_train):
             # This loop is equivalent to setting the gain to zero (forecasting)
@@ -188,6 +384,11 @@ def autokf(descriptor, y_signal, weights, oe, rk, n_train=1000, n_testbefore=50,
         store_P_hat[:, :, k] = P_hat
         store_W[:, :, k] = W
 
+        if steady_state_on and np.max(np.abs(W - W_ss)) < steady_state_tol:
+            # Transient has decayed; switch to the steady state gain
+            fixed_gain = True
+            P_hat = np.array(P_hat_ss)
+
         k = k + 1
 
     if  save == 'Yes':
@@ -215,3 +416,116 @@ def autokf(descriptor, y_signal, weights, oe, rk, n_train=1000, n_testbefore=50,
         return store_x_hat[0, 0, n_train - n_testbefore: ]
     else:
         return projected_msmt(store_x_hat[0, 0, n_train - n_testbefore: ])
+
+
+def get_gain_schedule(weights, oe, rk, p0, n_train, skip_msmts, num, propagation='Companion'):
+    '''Return the sequence of AKF Kalman gains. In AKF, the state variance
+    recursion and hence the Kalman gains depend only on the Kalman design, and
+    not on measurement data. Schedules are cached by
+    (weights, oe, rk, p0, n_train, skip_msmts, num, propagation).
+
+    Parameters:
+    ----------
+        weights, oe, rk, p0, n_train, skip_msmts, propagation : As defined in autokf.
+        num (`int`) : Number of points in a measurement record.
+
+    Returns:
+    -------
+        W_schedule (`float64`) : Kalman gain at each time step, as in autokf. Zero
+            for time steps before order, for skipped msmts and for time steps
+            after n_train [Dim: num x order]. Read only.
+    '''
+    weights = np.asarray(weights, dtype=np.float64)
+    key = (weights.tobytes(), float(oe), float(rk), float(p0), int(n_train),
+           int(skip_msmts), int(num), PropagationMode[propagation])
+
+    if key in _GAIN_SCHEDULE_CACHE:
+        # Move to the end to mark as most recently used
+        W_schedule = _GAIN_SCHEDULE_CACHE.pop(key)
+        _GAIN_SCHEDULE_CACHE[key] = W_schedule
+        return W_schedule
+
+    order = weights.shape[0]
+    a = get_autoreg_model(order, weights)
+    Q = np.zeros((order, order))
+    Q[0, 0] = oe**2
+    h = np.zeros(order)
+    h[0] = 1.0
+
+    idx = range(order)
+    P_hat = np.zeros((order, order))
+    P_hat[idx, idx] = p0
+    dummy_x_hat = np.zeros((order, 1)) # State variances do not depend on states
+
+    W_schedule = np.zeros((num, order))
+    for k in xrange(order, min(n_train + 1, num)):
+
+        if PropagationMode[propagation] == COMPANION:
+            P_hat_apriori = propagate_states_companion(weights, dummy_x_hat, P_hat, Q)[1]
+        else:
+            P_hat_apriori = propagate_states_no_gamma(a, dummy_x_hat, P_hat, Q)[1]
+        W_, S = calc_Kalman_Gain(h, P_hat_apriori, rk)
+        W = W_.reshape(order, 1)
+
+        # Skip msmts
+        if k % skip_msmts != 0:
+            W = np.zeros((order, 1))
+
+        P_hat = P_hat_apriori - S*np.outer(W, W.T)
+        W_schedule[k, :] = W[:, 0]
+
+    W_schedule.flags.writeable = False
+
+    if len(_GAIN_SCHEDULE_CACHE) >= GAIN_SCHEDULE_CACHE_SIZE:
+        _GAIN_SCHEDULE_CACHE.popitem(last=False)
+    _GAIN_SCHEDULE_CACHE[key] = W_schedule
+
+    return W_schedule
+
+
+def autokf_batch(y_signals, weights, oe, rk, n_train=1000, n_testbefore=50,
+                 n_predict=50, p0=10000, skip_msmts=1, propagation='Companion'):
+    '''Return AKF predictions for a stack of measurement records. The gain
+    schedule from get_gain_schedule is shared by all records, so that every
+    record in the stack is filtered at once with one matrix product per time
+    step. Predictions for each record agree with autokf (quantised='No') called
+    on that record alone.
+
+    Parameters:
+    ----------
+        y_signals (`float64`) : Stack of time stamped measurement sequences
+            [Dim: batch x num].
+        All other parameters are as defined in autokf.
+
+    Returns:
+    -------
+        predictions (`float64`) : AKF predictions for each record
+            [Dim: batch x (num - n_train + n_testbefore)].
+    '''
+    y_signals = np.asarray(y_signals, dtype=np.float64)
+    num = y_signals.shape[1]
+    order = weights.shape[0]
+
+    a = get_autoreg_model(order, weights)
+    W_schedule = get_gain_schedule(weights, oe, rk, p0, n_train, skip_msmts, num, propagation)
+
+    # States for all records are stored as columns [Dim: order x batch]
+    x_hat = y_signals[:, 0 : order].T.copy()
+
+    store_x_hat = np.zeros((y_signals.shape[0], num))
+    store_x_hat[:, order] = x_hat[0, :]
+
+    for k in xrange(order, num):
+
+        if PropagationMode[propagation] == COMPANION:
+            x_hat = companion_dot(weights, x_hat)
+        else:
+            x_hat = np.dot(a, x_hat)
+
+        if k <= n_train:
+            e_z = y_signals[:, k] - x_hat[0, :]
+            x_hat += np.outer(W_schedule[k, :], e_z)
+
+        store_x_hat[:, k] = x_hat[0, :]
+
+    return store_x_hat[:, n_train - n_testbefore:]
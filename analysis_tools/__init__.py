@@ -14,6 +14,8 @@
         riskanalysis : Optimises LKFFB Kalman noise variance parameters for a parameter regime
             specified by (testcase, variation); and used Bayes Risk metric to assess
             predictive performance.
+        rng : Reproducible random number streams for data generation and
+            Bayes Risk drivers.
 
     Author: Riddhi Gupta <riddhi.sw@gmail.com>
 '''
@@ -26,11 +26,13 @@ plt.ioff()
 import sys
 sys.path.append("../") # Look in the parent directory containing both kf and analysis_tools packages
 from kf import fast as skf
+from kf import fast_2 as skf_2
 from kf import detailed as dkf
 
 from analysis_tools.experiment import Experiment
 from analysis_tools.noisydata import Noisy_Data
 from analysis_tools.common import sqr_err
+from analysis_tools.rng import get_rng, SETUP_KEY
 
 FUDGE = 0.5 # Scaling factor for debugging and plotting [DEPRECIATED].
 HILBERT_TRANSFORM = 2.0
@@ -63,11 +65,16 @@ class Kalman(Experiment, Noisy_Data):
         phase_dict (`type`) : List of built-in phase corrections for choice of  basisA, basiB or basisC.
         prediction_method_list (`type`) : Choice of prediction / forecasting method,
             once data collection ceases. Defaults to 'ZeroGain'.
+        propagation (`str`) : 'Dense' / 'Block' choice for LKFFB state covariance
+            propagation, as in kf.fast.kf_2017. Defaults to 'Dense'.
 
     Methods:
     -------
         calc_phase_correction : Calculate phase correction for choice of LKFFB basis, else returns zero.
         single_prediction : Return predictions for LKFFB (using ZeroGain).
+        batch_prediction : Return predictions for LKFFB for a stack of measurement records.
+        forked_batch_prediction : Return predictions for LKFFB for a stack of measurement
+            records under all prediction methods, sharing filtering up to n_train.
         detailed_single_prediction : Return predictions and inst. amplitudes for LKFFB (using PropForward).
         ensemble_avg_predictions : Return ensemble averaged LKFFB prediction over Basis A,B,C and Prediction Methods.
         convert_amp_hz_to_radians : Return PSD in radians based on a frequency axis.
@@ -118,6 +125,9 @@ class Kalman(Experiment, Noisy_Data):
         # Pre-defined choices for prediction methods
         self.prediction_method_list = ["ZeroGain", "PropForward"]
 
+        # Choice of state covariance propagation
+        self.propagation = 'Dense'
+
 
     def calc_phase_correction(self, bdelta, Delta_S_Sampling, phase_correction):
         ''' Calculate phase correction for choice of LKFFB basis, else returns zero.
@@ -177,7 +187,86 @@ class Kalman(Experiment, Noisy_Data):
                                   self.basis_dict[basis_choice],
                                   phase_correction=self.phase_dict[basis_choice],
                                   prediction_method=prediction_method_default,
-                                  skip_msmts=skip_msmts, descriptor=append_decriptor)
+                                  skip_msmts=skip_msmts, descriptor=append_decriptor,
+                                  propagation=self.propagation)
+        return predictions
+
+    def batch_prediction(self, y_signals, skip_msmts, init=[None, None],
+                         basis_choice='A', prediction_method_default='ZeroGain',
+                         chunk_size=None):
+        ''' Return predictions for LKFFB for a stack of measurement records,
+        filtered simultaneously. Prediction method default is ZeroGain.
+
+        Parameters:
+        ----------
+            y_signals (`float64`) :  Stack of noisy measurement records
+                (input to filtering) [Dim: batch x number_of_points].
+            skip_msmts, init, basis_choice, prediction_method_default :
+                As defined in Kalman.single_prediction.
+            chunk_size (`int`, optional) : Number of records filtered at once. If
+                None, chunks are bounded by kf.fast_2.BATCH_MAX_ELEMENTS.
+
+        Returns:
+        ------
+            predictions : Returns Kalman predictions spanning state estimation
+                and forecasting regions for each record [Dim: batch x
+                (n_testbefore + n_predict)].
+        '''
+
+        if init[0] == None and init[1] == None:
+            init = np.zeros(2)
+            init[0] = self.optimal_sigma
+            init[1] = self.optimal_R
+
+        predictions = skf_2.kf_2017_batch(y_signals, self.n_train, self.n_testbefore,
+                                          self.n_predict, self.Delta_T_Sampling,
+                                          self.x0, self.p0, init[0], init[1],
+                                          self.basis_dict[basis_choice],
+                                          phase_correction=self.phase_dict[basis_choice],
+                                          prediction_method=prediction_method_default,
+                                          skip_msmts=skip_msmts,
+                                          propagation=self.propagation,
+                                          chunk_size=chunk_size,
+                                          return_states='No')[0]
+        return predictions
+
+    def forked_batch_prediction(self, y_signals, skip_msmts, init=[None, None],
+                                basis_choice='A', chunk_size=None):
+        ''' Return predictions for LKFFB for a stack of measurement records under
+        all methods in Kalman.prediction_method_list. Each record is filtered once
+        up to n_train and every prediction method forecasts from the shared state.
+
+        Parameters:
+        ----------
+            y_signals (`float64`) :  Stack of noisy measurement records
+                (input to filtering) [Dim: batch x number_of_points].
+            skip_msmts, init, basis_choice :
+                As defined in Kalman.single_prediction.
+            chunk_size (`int`, optional) : Number of records filtered at once. If
+                None, chunks are bounded by kf.fast_2.BATCH_MAX_ELEMENTS.
+
+        Returns:
+        ------
+            predictions : Dictionary of Kalman predictions spanning state
+                estimation and forecasting regions for each record, keyed by
+                prediction method [Dim of each value: batch x
+                (n_testbefore + n_predict)].
+        '''
+
+        if init[0] == None and init[1] == None:
+            init = np.zeros(2)
+            init[0] = self.optimal_sigma
+            init[1] = self.optimal_R
+
+        predictions = skf_2.kf_2017_batch_fork(y_signals, self.n_train, self.n_testbefore,
+                                               self.n_predict, self.Delta_T_Sampling,
+                                               self.x0, self.p0, init[0], init[1],
+                                               self.basis_dict[basis_choice],
+                                               phase_correction=self.phase_dict[basis_choice],
+                                               prediction_methods=self.prediction_method_list,
+                                               skip_msmts=skip_msmts,
+                                               propagation=self.propagation,
+                                               chunk_size=chunk_size)
         return predictions
 
     def detailed_single_prediction(self, y_signal, skip_msmts, init=[None, None], basis_choice='A'):
@@ -223,7 +312,8 @@ class Kalman(Experiment, Noisy_Data):
         return predictions, instantA
 
 
-    def ensemble_avg_predictions(self, skip_msmts, chosen_params=[None, None], NO_OF_KALMAN_VARIATIONS=6):
+    def ensemble_avg_predictions(self, skip_msmts, chosen_params=[None, None], NO_OF_KALMAN_VARIATIONS=6, rng_seed=None,
+                                 chunk_size=None):
         '''
         Return ensemble averaged LKFFB prediction over Basis A,B,C and all Prediction
         Methods and save output of all runs as npz file.
@@ -238,6 +328,13 @@ class Kalman(Experiment, Noisy_Data):
             NO_OF_KALMAN_VARIATIONS (`int`) : Number of combinations of choice of
                 LKFFB basis ['A', 'B', 'C'] and choice of prediction methods
                 ['ZeroGain, 'PropForward']. Defaults to '6'.
+            rng_seed (`int`, optional) : Seed for reproducible random number streams.
+                Run `run` draws simulated data from the stream (rng_seed, (run,)), see
+                analysis_tools.rng, and uncalibrated measurement noise is calibrated
+                once from the stream (rng_seed, SETUP_KEY). If None, draws from the
+                global np.random state. Defaults to None.
+            chunk_size (`int`, optional) : Number of records filtered at once. If
+                None, chunks are bounded by kf.fast_2.BATCH_MAX_ELEMENTS.
 
         Returns:
         ------
@@ -249,23 +346,36 @@ class Kalman(Experiment, Noisy_Data):
         KF_Error_Means = np.zeros((NO_OF_KALMAN_VARIATIONS, self.n_predict+self.n_testbefore))
         Predict_Zero_Means = np.zeros((self.n_testbefore+self.n_predict))
 
+        y_signals = np.zeros((self.max_it, self.number_of_points))
+
+        if rng_seed is not None and self.user_defined_variance is None and self.msmt_noise_variance is None:
+            # Calibrate msmt noise once, so that every run draws only from its own stream
+            self.msmt_noise_variance = self.msmt_noise_variance_calc(rng=get_rng(rng_seed, SETUP_KEY))
+
         for run in xrange(self.max_it): # Loop over ensemble size
 
-            truth, y_signal = self.generate_data_from_truth(self.user_defined_variance)
+            rng = None if rng_seed is None else get_rng(rng_seed, (run,))
+            truth, y_signals[run, :] = self.generate_data_from_truth(self.user_defined_variance, rng=rng)
             truth_datasets[:, run] = truth
             Predict_Zero_Means += (1.0/float(self.max_it))*sqr_err(np.zeros(self.n_testbefore + self.n_predict ), truth[ self.n_train - self.n_testbefore : self.n_train +self.n_predict])
 
-            choice_counter = 0 # choice_counter takes values from 0, 1, ..., NO_OF_KALMAN_VARIATIONS -1
+        choice_counter = 0 # choice_counter takes values from 0, 1, ..., NO_OF_KALMAN_VARIATIONS -1
+
+        for choice1 in self.basis_list: # Loop over Basis A, B, C
+
+            # Filter the whole ensemble at once, forking into all prediction methods at n_train
+            forked_predictions = self.forked_batch_prediction(y_signals, skip_msmts, init=chosen_params, basis_choice=choice1,
+                                                              chunk_size=chunk_size)
 
-            for choice1 in self.basis_list: # Loop over Basis A, B, C
+            for choice2 in self.prediction_method_list: # Loop over Prediction Methods
 
-                for choice2 in self.prediction_method_list: # Loop over Prediction Methods
+                predictions = forked_predictions[choice2]
 
-                    predictions = self.single_prediction(y_signal, skip_msmts, init=chosen_params, basis_choice=choice1, prediction_method_default=choice2)
-                    KF_Error_Means[choice_counter, :] += (1.0/float(self.max_it))*sqr_err(predictions, truth[self.n_train-self.n_testbefore : self.n_train + self.n_predict])
-                    KF_Predictions_Matrix[choice_counter, :, run] = predictions
+                for idx_run in xrange(self.max_it):
+                    KF_Error_Means[choice_counter, :] += (1.0/float(self.max_it))*sqr_err(predictions[idx_run], truth_datasets[self.n_train-self.n_testbefore : self.n_train + self.n_predict, idx_run])
+                KF_Predictions_Matrix[choice_counter, :, :] = predictions.T
 
-                    choice_counter += 1
+                choice_counter += 1
 
         Normalised_Means = KF_Error_Means / Predict_Zero_Means
 
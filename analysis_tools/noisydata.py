@@ -42,6 +42,8 @@ class Noisy_Data(Truth):
     -------
         msmt_noise_variance_calc() : Return msmt_noise_variance for applying noise
             to simulated data, based on Truth and target msmt_noise_level.
+        generate_data_from_truth() : Return one true realisation and noisy data.
+        generate_data_batch() : Return an ensemble of true realisations and noisy data.
     '''
 
     def __init__(self, msmt_noise_params, true_noise_params, user_defined_variance=None, **kwargs):
@@ -56,7 +58,7 @@ class Noisy_Data(Truth):
         self.msmt_noise_variance = None
 
 
-    def msmt_noise_variance_calc(self, num_of_standard_dev=3.0):
+    def msmt_noise_variance_calc(self, num_of_standard_dev=3.0, rng=None):
         '''Return msmt_noise_variance for applying measurement noise to simulated
             experimental data, based on Truth and target msmt_noise_level.
 
@@ -65,6 +67,9 @@ class Noisy_Data(Truth):
             num_of_standard_dev (`int`, optional) : Links target measurement noise
                 level as a expression of the variance of one realisation of random
                 variables of a true, unobserved random process.
+            rng (`np.random.RandomState`, optional) : Random number stream for
+                the true realisation, see analysis_tools.rng. If None, draws from
+                the global np.random state.
 
         Returns:
         -------
@@ -72,14 +77,14 @@ class Noisy_Data(Truth):
                 simulate noisy data based on one realisation of true dephasing field.
         '''
 
-        one_realisation = self.beta_z()[0]
+        one_realisation = self.beta_z(rng=rng)[0]
         msmt_noise_var = self.msmt_noise_level*num_of_standard_dev*np.sqrt(np.var(one_realisation))
 
         return msmt_noise_var # this is not variance. It's a new standard deviation.
 
 
 
-    def generate_data_from_truth(self, user_defined_variance):
+    def generate_data_from_truth(self, user_defined_variance, rng=None):
         ''' Return one realisation of a true dephasing field and noisy
             simulated experimental data under this dephasing realisation.
 
@@ -87,6 +92,9 @@ class Noisy_Data(Truth):
         ----------
             user_defined_variance (`float`, optional) : Manually overides strength of
             applied measurement noise via Noisy_Data.msmt_noise_variance_calc()
+            rng (`np.random.RandomState`, optional) : Random number stream for the
+                true realisation and measurement noise, see analysis_tools.rng.
+                If None, draws from the global np.random state.
 
         Returns:
         -------
@@ -102,11 +110,12 @@ class Noisy_Data(Truth):
             self.msmt_noise_variance = user_defined_variance
 
         if user_defined_variance is None and self.msmt_noise_variance is None:
-            self.msmt_noise_variance = self.msmt_noise_variance_calc()
+            self.msmt_noise_variance = self.msmt_noise_variance_calc(rng=rng)
 
         if self.msmt_noise_variance != None:
-            truth = self.beta_z()[0]
-            y_signal =  truth + self.msmt_noise_variance*np.random.randn(self.number_of_points)
+            rng = np.random if rng is None else rng
+            truth = self.beta_z(rng=rng)[0]
+            y_signal =  truth + self.msmt_noise_variance*rng.randn(self.number_of_points)
             # This is a standard deviation. True noise variance = msmt_noise_var **2
             # Double check that np.random.normal(loc=0,scale=sdev) == sdev*np.random.randn()
             return  truth, y_signal
@@ -114,3 +123,34 @@ class Noisy_Data(Truth):
         return "Unspecified ERROR in method generate_data_from_truth()"
 
 
+    def generate_data_batch(self, n, user_defined_variance, rng=None):
+        '''Return n true realisations of the dephasing field and simulated noisy
+        measurement records, as in generate_data_from_truth(). Random phases for
+        all realisations are drawn before all measurement noise.
+
+        Parameters:
+        ----------
+            n (`int`) : Number of realisations.
+            user_defined_variance (`float`, optional) : As in generate_data_from_truth().
+            rng (`np.random.RandomState`, optional) : As in generate_data_from_truth().
+
+        Returns:
+        -------
+            truths (`float64`) : True realisations [Dim: n x number_of_points].
+            y_signals (`float64`) : Simulated noisy measurement records
+                [Dim: n x number_of_points].
+        '''
+
+        if user_defined_variance != None:
+            # overrides existing msmt_noise_variance
+            self.msmt_noise_variance = user_defined_variance
+
+        if user_defined_variance is None and self.msmt_noise_variance is None:
+            self.msmt_noise_variance = self.msmt_noise_variance_calc(rng=rng)
+
+        rng = np.random if rng is None else rng
+        truths = self.beta_z_batch(n, rng=rng)
+        y_signals = truths + self.msmt_noise_variance*rng.randn(n, self.number_of_points)
+        return truths, y_signals
+
+
@@ -19,11 +19,36 @@ Created on Sat Apr  8 11:40:01 2017
 
 from __future__ import division, print_function, absolute_import
 import os
+import multiprocessing
 import numpy as np
 # import time as t
 
 from analysis_tools.kalman import Kalman
 from analysis_tools.common import get_tuned_params_
+from analysis_tools.rng import get_rng, SETUP_KEY
+
+# Create_KF_Experiment instance held by each worker in a process pool
+_WORKER_EXPERIMENT = None
+
+
+def _set_worker_experiment(experiment):
+    ''' Store a Create_KF_Experiment instance for use in a pool worker. [Helper Function]'''
+    global _WORKER_EXPERIMENT
+    _WORKER_EXPERIMENT = experiment
+
+
+def _filter_bayes_trial(trial):
+    ''' Return Create_KF_Experiment.filter_bayes_trial output for the worker's
+    instance, where trial is the output of Create_KF_Experiment.draw_bayes_trial.
+    [Helper Function]'''
+    return _WORKER_EXPERIMENT.filter_bayes_trial(*trial)
+
+
+def _one_bayes_trial(ind):
+    ''' Return Create_KF_Experiment.one_bayes_trial output for the worker's
+    instance and Bayes trial index ind. [Helper Function]'''
+    return _WORKER_EXPERIMENT.one_bayes_trial(ind)
+
 
 class Bayes_Risk(object):
     ''' Stores Bayes Risk map for a scenario specified by (testcase, variation)
@@ -38,7 +63,14 @@ class Bayes_Risk(object):
             truncation (`int`) : Pre-determined threshold for number of
                 lowest input values to return in modcule function,
                 get_tuned_params(), in module common.
-        doparallel (`Boolean`) : Enable parallelisation of Bayes Risk calculations [DEPRECIATED].
+        doparallel (`Boolean`) : Enable parallelisation of Bayes Risk calculations over a
+            process pool, if num_processes != 1.
+        num_processes (`int`) : Number of worker processes for Bayes Risk calculations.
+            If None, uses all available CPUs. Defaults to 1 (serial).
+        rng_seed (`int`) : Seed for reproducible random number streams, see
+            analysis_tools.rng. Bayes trial ind draws from the stream (rng_seed, (ind,)),
+            so that serial and parallel runs give identical results. If None,
+            draws from the global np.random state. Defaults to None.
         lowest_pred_BR_pair (`float64`) : (sigma, R) pair with min Bayes Risk in state estimation.
         lowest_fore_BR_pair (`float64`) : (sigma, R) pair with min Bayes Risk in prediction.
         means_list (`float64`) : Helper calculation for Bayes Risk.
@@ -61,6 +93,8 @@ class Bayes_Risk(object):
         self.num_randparams = bayes_params[1]
         self.space_size = bayes_params[2]
         self.doparallel = True
+        self.num_processes = 1
+        self.rng_seed = None
         self.bayes_params = bayes_params
         self.truncation = bayes_params[3]
         self.lowest_pred_BR_pair = None
@@ -96,6 +130,9 @@ class Create_KF_Experiment(Bayes_Risk, Kalman):
         rand_param : Return a randomly sampled (sigma, R) pair.
         one_bayes_trial : Return true realisations, state etimation errors and
             prediction errors over max_it_BR repetitions for one (sigma, R) pair.
+        draw_bayes_trial : Return the random inputs to one_bayes_trial.
+        trial_rng : Return the random number stream for one Bayes trial.
+        filter_bayes_trial : Return one_bayes_trial output for given random inputs.
         naive_implementation : Return Bayes Risk analysis as a saved .npz file.
         func_x0 : Returns random dim=2 arrays from a parameter space defined by space_size.
         get_tuned_params : Helper function for Bayes Risk mapping.
@@ -136,7 +173,7 @@ class Create_KF_Experiment(Bayes_Risk, Kalman):
         return residuals_sqr_errors # not summed over prediction steps
 
 
-    def one_loss_trial(self, random_hyperparams, skip_msmts):
+    def one_loss_trial(self, random_hyperparams, skip_msmts, rng=None):
         ''' Return loss values for a specific choice of random samples (sigma, R),
         and a choice of skip_msmts.
 
@@ -145,6 +182,8 @@ class Create_KF_Experiment(Bayes_Risk, Kalman):
             random_hyperparams (`float64`) : A single random pair of [sigma, R].
             skip_msmts (`int`) : Number of time-steps to skip between measurements.
                 To receive measurement at every time-step, set skip_msmts=1.
+            rng (`np.random.RandomState`, optional) : Random number stream for
+                simulated data. If None, draws from the global np.random state.
 
         Returns:
         -------
@@ -153,43 +192,83 @@ class Create_KF_Experiment(Bayes_Risk, Kalman):
             Output[2] (`float64`) : Kalman prediction errors.
         '''
 
-        truth, y_signal = self.generate_data_from_truth(self.user_defined_variance)
+        truth, y_signal = self.generate_data_from_truth(self.user_defined_variance, rng=rng)
         errors = self.loss(random_hyperparams, y_signal, skip_msmts, truth)
 
         return truth, errors[0:self.n_testbefore], errors[self.n_testbefore : self.n_testbefore + self.n_predict]
 
 
-    def rand_param(self):
+    def rand_param(self, rng=None):
         ''' Return a randomly sampled (sigma, R) pair. '''
-        return np.array([self.func_x0(), self.func_x0()])
+        return np.array([self.func_x0(rng=rng), self.func_x0(rng=rng)])
+
 
+    def trial_rng(self, ind):
+        ''' Return the random number stream for Bayes trial ind, or None (global
+        np.random state) if rng_seed or ind is None. '''
+        if self.rng_seed is None or ind is None:
+            return None
+        return get_rng(self.rng_seed, (ind,))
 
-    def one_bayes_trial(self, _):
+    def one_bayes_trial(self, ind):
         ''' Return true realisations, state etimation errors and prediction errors
         over max_it_BR repetitions for one (sigma, R) pair. '''
 
-        init_ = self.rand_param()
-        skip_msmts_ = self.skip_msmts
+        return self.filter_bayes_trial(*self.draw_bayes_trial(ind))
 
-        prediction_errors = []
-        forecastng_errors = []
-        truths_in_trials = []
+    def draw_bayes_trial(self, ind=None):
+        ''' Return a random (sigma, R) pair, and max_it_BR true realisations and
+        measurement records, as inputs to filter_bayes_trial. All random numbers
+        for one Bayes trial are drawn here, from the stream trial_rng(ind). '''
 
-        for ind in xrange(self.max_it_BR):
+        rng = self.trial_rng(ind)
+        init_ = self.rand_param(rng=rng)
 
-            true, pred, fore = self.one_loss_trial(init_, skip_msmts_)
+        truths, y_signals = self.generate_data_batch(self.max_it_BR, self.user_defined_variance, rng=rng)
+        truths_in_trials = list(truths)
 
-            truths_in_trials.append(true)
-            prediction_errors.append(pred)
-            forecastng_errors.append(fore)
+        return init_, truths_in_trials, y_signals
+
+    def filter_bayes_trial(self, init_, truths_in_trials, y_signals):
+        ''' Return true realisations, state etimation errors and prediction errors
+        for one (sigma, R) pair, given the output of draw_bayes_trial. '''
+
+        skip_msmts_ = self.skip_msmts
+
+        # Filter all max_it_BR records at once
+        predictions = self.batch_prediction(y_signals, skip_msmts_, init=init_)
+        truths_ = np.asarray(truths_in_trials)[:, self.n_train - self.n_testbefore : self.n_train + self.n_predict]
+        errors = (predictions.real - truths_.real)**2
+
+        prediction_errors = list(errors[:, 0:self.n_testbefore])
+        forecastng_errors = list(errors[:, self.n_testbefore : self.n_testbefore + self.n_predict])
 
         return truths_in_trials, prediction_errors, forecastng_errors, init_
 
+    def pooled_bayes_trials(self, pool):
+        ''' Return a generator of filter_bayes_trial outputs for num_randparams
+        trials, filtered over pool. Inputs are drawn from the global np.random
+        state in serial order, num_processes trials at a time, such that only one
+        round of trial inputs is held in memory. '''
+        for start in xrange(0, self.num_randparams, self.num_processes):
+            stop = min(start + self.num_processes, self.num_randparams)
+            trials = [self.draw_bayes_trial() for _ in xrange(stop - start)]
+            for full_bayes_map in pool.imap(_filter_bayes_trial, trials):
+                yield full_bayes_map
+
     def naive_implementation(self, change_skip_msmts=1):
         ''' Return Bayes Risk analysis as a saved .npz file over max_it_BR
         repetitions of true dephasing noise and simulated datasets; for
         num_randparams number of random (sigma, R) pairs.
 
+        If doparallel is True and num_processes != 1, Bayes trials are filtered
+        over a pool of num_processes workers, and results are gathered in order.
+        If rng_seed is None, random inputs are drawn from the global np.random
+        state in the parent process in serial order, num_processes trials at a
+        time (see pooled_bayes_trials). Otherwise, each worker draws the inputs
+        for trial ind from the stream trial_rng(ind). Either way, the output is
+        identical to a serial run.
+
         Parameters:
         ----------
             change_skip_msmts (`int`, optional) : Manually specify skip_msmts.
@@ -208,16 +287,39 @@ class Create_KF_Experiment(Bayes_Risk, Kalman):
         self.macro_forecastng_errors = []
         self.macro_truth = []
 
-        # start_outer_multp = t.time()
+        if self.rng_seed is not None and self.user_defined_variance is None and self.msmt_noise_variance is None:
+            # Calibrate msmt noise once, before trials are shared over processes
+            self.msmt_noise_variance = self.msmt_noise_variance_calc(rng=get_rng(self.rng_seed, SETUP_KEY))
 
-        for ind in xrange(self.num_randparams):
-
-            full_bayes_map = self.one_bayes_trial(None)
+        # start_outer_multp = t.time()
 
-            self.macro_truth.append(full_bayes_map[0])
-            self.macro_prediction_errors.append(full_bayes_map[1])
-            self.macro_forecastng_errors.append(full_bayes_map[2])
-            self.random_hyperparams_list.append(full_bayes_map[3])
+        pool = None
+        try:
+            if self.doparallel and self.num_processes != 1:
+                pool = multiprocessing.Pool(processes=self.num_processes,
+                                            initializer=_set_worker_experiment,
+                                            initargs=(self,))
+                if self.rng_seed is None:
+                    bayes_maps = self.pooled_bayes_trials(pool)
+                else:
+                    # Each worker draws the inputs for trial ind from trial_rng(ind)
+                    bayes_maps = pool.imap(_one_bayes_trial, xrange(self.num_randparams))
+            else:
+                bayes_maps = (self.one_bayes_trial(ind) for ind in xrange(self.num_randparams))
+
+            for ind, full_bayes_map in enumerate(bayes_maps):
+
+                self.macro_truth.append(full_bayes_map[0])
+                self.macro_prediction_errors.append(full_bayes_map[1])
+                self.macro_forecastng_errors.append(full_bayes_map[2])
+                self.random_hyperparams_list.append(full_bayes_map[3])
+
+            if pool is not None:
+                pool.close()
+                pool.join()
+        finally:
+            if pool is not None:
+                pool.terminate()
 
         # total_outer_multp = t.time() - start_outer_multp
 
@@ -245,15 +347,16 @@ class Create_KF_Experiment(Bayes_Risk, Kalman):
         self.did_BR_Map = True
 
 
-    def func_x0(self):
+    def func_x0(self, rng=None):
         '''
         Returns random dim =2 arrays from a parameter space defined by space_size
         [Helper function for Bayes Risk mapping]
         '''
+        rng = np.random if rng is None else rng
         maxindex = self.space_size.shape[0]-1
-        ind = int(np.random.uniform(low=0, high=maxindex))
+        ind = int(rng.uniform(low=0, high=maxindex))
         exponent = self.space_size[ind]
-        return np.random.uniform(0,1)*(10.0**exponent)
+        return rng.uniform(0,1)*(10.0**exponent)
 
 
     def get_tuned_params(self, max_forecast_loss):
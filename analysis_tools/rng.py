@@ -0,0 +1,66 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+"""
+.. module:: analysis_tools.rng
+
+    :synopsis: Reproducible random number streams for data generation and
+        Bayes Risk drivers.
+
+    A stream is a np.random.RandomState identified by a user seed and a key of
+    non-negative integers, e.g. (trial index, record index). Streams with
+    different keys are independent, and a stream depends only on (seed, key).
+    Work sharded over processes in any order therefore gives bit-identical
+    results to a serial run with the same seed.
+
+    Data generators accept an optional `rng` argument. If rng is None, they draw
+    from the global np.random state as before.
+
+    Module Level Functions:
+    ----------------------
+        get_rng : Return the random number stream identified by (seed, key).
+        spawn_rngs : Return num independent child streams of the stream (seed, key).
+
+.. moduleauthor:: Riddhi Gupta <riddhi.sw@gmail.com>
+
+"""
+
+from __future__ import division, print_function, absolute_import
+import numpy as np
+
+# Key reserved for draws made once per experiment (e.g. calibrating measurement noise)
+SETUP_KEY = (2**32 - 1,)
+
+
+def get_rng(seed, key=()):
+    ''' Return the random number stream identified by (seed, key).
+
+    Parameters:
+    ----------
+        seed (`int`) : User seed, 0 <= seed < 2**32.
+        key (`tuple`, optional) : Integers 0 <= key[i] < 2**32 identifying a
+            stream spawned from seed. Defaults to (), the root stream.
+
+    Returns:
+    -------
+        rng (`np.random.RandomState`) : Random number stream.
+    '''
+    # The key length is part of the seed array: np.random.RandomState seeds
+    # [seed] and [seed, 0] would otherwise give the same stream
+    return np.random.RandomState([int(seed), len(key)] + [int(item) for item in key])
+
+
+def spawn_rngs(seed, num, key=()):
+    ''' Return num independent child streams of the stream (seed, key), with keys
+    key + (0,), ..., key + (num - 1,).
+
+    Parameters:
+    ----------
+        seed (`int`) : User seed, 0 <= seed < 2**32.
+        num (`int`) : Number of child streams.
+        key (`tuple`, optional) : Key of the parent stream. Defaults to ().
+
+    Returns:
+    -------
+        rngs (`list`) : List of np.random.RandomState child streams.
+    '''
+    return [get_rng(seed, tuple(key) + (idx,)) for idx in xrange(num)]
@@ -42,6 +42,21 @@ SYMMETRIC_ONE_SIDED_PSD = 2.0
 # OTHER SCALING FACTORS
 NUM_SCALE = 2.0*np.pi # Numerical averaging vs. Theory # not required for paper
 
+# Upper bound on the number of float64 elements held per ensemble chunk in Truth.beta_z_batch
+BATCH_MAX_ELEMENTS = 2**22
+
+# Synthesis of true noise traces in Truth.beta_z_batch
+# 'Auto' uses an inverse FFT if f0*Delta_T_Sampling*number_of_points is an integer,
+# such that all spectral components lie on the FFT grid; else a direct sum.
+AUTO, DIRECT = range(2)
+SynthesisMode = {
+    "Auto": AUTO,
+    "Direct": DIRECT
+}
+
+# Tolerance for f0*Delta_T_Sampling*number_of_points to be treated as an integer
+COMMENSURATE_TOL = 1e-9
+
 class Truth(object):
     ''' Defines true dephasing field and its properties. The dephasing field is
         used to generate simulated experimental datasets. Learning algorithms
@@ -72,6 +87,11 @@ class Truth(object):
             Calculated by Truth.average_PSD().
         num_S_norm (`float64`) : Numerical total energy (norm) for two sided, bandlimited PSD.
             Calculated by Truth.average_PSD().
+        num_realisations (`int`) : Number of realisations in the running PSD estimate.
+        num_norms_mean (`float64`) : Running mean of the [time domain, Fourier domain]
+            energy (norm) of realisations. Calculated by Truth.average_PSD().
+        num_norms_var (`float64`) : Running variance of the [time domain, Fourier domain]
+            energy (norm) of realisations. Calculated by Truth.average_PSD().
         true_w_axis (`float64`) : Frequency axis (radians) for theoretical true noise PSD.
             Calculated by Truth.beta_z_truePSD().
         true_S_twosided (`float64`) : Theoretical two sided power spectral density.
@@ -82,8 +102,12 @@ class Truth(object):
     Methods:
     -------
         beta_z : Return true stochastic state in discrete time, namely f(n).
+        beta_z_batch : Return an ensemble of realisations of beta_z.
+        fft_grid_spacing : Return spacing of true noise frequencies on the FFT grid.
         beta_z_truePSD : Calculate theoretical PSD for beta_z
         average_PSD : Calculate numerical PSD estimate using beta_z() realisations.
+        reset_PSD : Discard the running PSD estimate.
+        update_PSD : Fold a batch of realisations into the running PSD estimate.
         norm_squared : Return magnitude squared of a vector
     '''
 
@@ -108,8 +132,8 @@ class Truth(object):
 
         self.num_w_axis = None
         self.num_S_estimate = None
-        self.num_norms = None
         self.num_S_norm = None
+        self.reset_PSD()
 
         self.true_w_axis = None
         self.true_S_twosided = None
@@ -118,21 +142,112 @@ class Truth(object):
         self.true_signal_params = [self.pdf_type, self.number_of_points, self.Delta_T_Sampling, self.alpha, self.f0, self.p, self.J, self.jstart]
         #self.true_signal_params = [0.0, self.number_of_points, self.Delta_T_Sampling, self.alpha, self.f0, self.p, self.J, self.jstart]
 
-    def beta_z(self):
+    def beta_z(self, rng=None):
 
         '''Return true stochastic state in discrete time, namely f(n), as a periodic
-        noise signal with random phase information.'''
+        noise signal with random phase information. Random phases are drawn from
+        rng (see analysis_tools.rng), or from the global np.random state if None.'''
+
+        return self.beta_z_batch(1, rng=rng)[0], # add comma to retain compatability with beta_z
+
+
+    def fft_grid_spacing(self):
+        '''Return the integer m such that f0 = m / (number_of_points * Delta_T_Sampling),
+        i.e. every frequency of the true noise comb lies on the FFT grid; or None
+        if the comb is not commensurate with the FFT grid.'''
+
+        grid_ratio = self.f0*self.Delta_T_Sampling*self.number_of_points
+        m = int(round(grid_ratio))
+
+        if m < 1 or abs(grid_ratio - m) > COMMENSURATE_TOL*max(1.0, grid_ratio):
+            return None
+        return m
+
+
+    def beta_z_batch(self, n, rng=None, chunk_size=None, synthesis='Auto'):
+        '''Return n realisations of beta_z as rows of a matrix [Dim: n x number_of_points].
+
+        Random phases for all realisations are drawn in one call, in the same order
+        as n successive calls to beta_z. If the true noise comb is commensurate with
+        the FFT grid (see fft_grid_spacing), each chunk of realisations is
+        synthesised by an inverse FFT of its spectrum in O(N log N) per trace.
+        Otherwise, spectral components are summed as a matrix product in O(J N)
+        per trace.
+
+        Parameters:
+        ----------
+            n (`int`) : Number of realisations.
+            rng (`np.random.RandomState`, optional) : Random number stream for
+                random phases, see analysis_tools.rng. If None, draws from the
+                global np.random state.
+            chunk_size (`int`, optional) : Number of realisations per chunk. If
+                None, chunks are bounded by BATCH_MAX_ELEMENTS.
+            synthesis (`str`, optional) : 'Auto' or 'Direct' choice of synthesis,
+                see SynthesisMode. Defaults to 'Auto'.
+
+        Returns:
+        -------
+            traces (`float64`) : Realisations of the true dephasing field
+                [Dim: n x number_of_points].
+        '''
+
+        rng = np.random if rng is None else rng
 
         twopi = 2.0*np.pi
         list_of_t = np.linspace(0, self.number_of_points-1, self.number_of_points)
         list_of_j = np.arange(self.jstart, self.J, 1) # Define with J, j_start = 1
         J_ = self.J - 1 # Define dimensions of tensor sums using J_
 
-        theta = np.random.uniform(low=0.0, high=2.0*np.pi, size=J_)
-        freqtensor_tj = np.cos((twopi*self.f0*self.Delta_T_Sampling*list_of_j*np.ones((J_, self.number_of_points)).T).T * list_of_t + (theta*np.ones((self.number_of_points,J_))).T)
-        amplitudes = map(lambda x: x*(x**(0.5*self.p - 1)), list_of_j)
+        theta = rng.uniform(low=0.0, high=2.0*np.pi, size=(n, J_))
+        amplitudes = list_of_j*(list_of_j**(0.5*self.p - 1))
+
+        grid_spacing = None
+        if SynthesisMode[synthesis] == AUTO:
+            grid_spacing = self.fft_grid_spacing()
+
+        if grid_spacing is not None:
+            return self.alpha*twopi*self.f0*self._fft_synthesis(amplitudes, theta, list_of_j*grid_spacing, chunk_size)
+
+        # cos(w_j t + theta_j) = cos(w_j t) cos(theta_j) - sin(w_j t) sin(theta_j)
+        omega_t = np.outer(twopi*self.f0*self.Delta_T_Sampling*list_of_j, list_of_t)
+        cos_tj = np.cos(omega_t)
+        sin_tj = np.sin(omega_t)
+
+        if chunk_size is None:
+            chunk_size = max(1, BATCH_MAX_ELEMENTS // (J_ + self.number_of_points))
+
+        traces = np.zeros((n, self.number_of_points))
+        for start in xrange(0, n, chunk_size):
+            theta_ = theta[start : start + chunk_size, :]
+            traces[start : start + chunk_size, :] = np.dot(amplitudes*np.cos(theta_), cos_tj) - np.dot(amplitudes*np.sin(theta_), sin_tj)
+
+        return self.alpha*twopi*self.f0*traces
+
+
+    def _fft_synthesis(self, amplitudes, theta, bins, chunk_size):
+        '''Return sum_j amplitudes[j] cos(2 pi bins[j] t / N + theta[:, j]) for
+        t = 0, ..., N - 1 as an inverse FFT, where N = number_of_points.
+        [Helper function for Truth.beta_z_batch]'''
+
+        N = self.number_of_points
 
-        return self.alpha*twopi*self.f0*np.sum((amplitudes*freqtensor_tj.T).T, axis=0), # add comma to retain compatability with beta_z
+        # Components above the sampling frequency alias, as in a direct sum; sum
+        # components sharing a bin
+        order = np.argsort(bins % N, kind='mergesort')
+        sorted_bins = (bins % N)[order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(sorted_bins)) + 1))
+
+        if chunk_size is None:
+            chunk_size = max(1, BATCH_MAX_ELEMENTS // (2*N))
+
+        traces = np.zeros((theta.shape[0], N))
+        for start in xrange(0, theta.shape[0], chunk_size):
+            spectrum = np.zeros((theta[start : start + chunk_size, :].shape[0], N), dtype='complex128')
+            components = amplitudes*np.exp(1j*theta[start : start + chunk_size, :])
+            spectrum[:, sorted_bins[starts]] = np.add.reduceat(components[:, order], starts, axis=1)
+            traces[start : start + chunk_size, :] = N*np.fft.ifft(spectrum, axis=1).real
+
+        return traces
 
 
     def beta_z_truePSD(self):
@@ -154,31 +269,134 @@ class Truth(object):
         pass # self.true_w_axis, self.true_S_twosided, self.true_S_norm
 
 
-    def average_PSD(self):
+    def average_PSD(self, rng=None, chunk_size=None, segment_length=None):
         '''Returns PSD estimate for an ensemble of time domain realisations of
         dephasing field by performing both ensemble and time averaging.
+        Realisations are drawn from rng, as in Truth.beta_z.
+
+        The ensemble is generated and transformed in chunks, and folded into a
+        running estimate via Truth.update_PSD, so that memory does not grow with
+        ensemble_size.
+
+        Parameters:
+        ----------
+            rng (`np.random.RandomState`, optional) : Random number stream, see
+                analysis_tools.rng. If None, draws from the global np.random state.
+            chunk_size (`int`, optional) : Number of realisations per chunk. If
+                None, chunks are bounded by BATCH_MAX_ELEMENTS.
+            segment_length (`int`, optional) : If None, each realisation
+                contributes one periodogram. Else, Welch estimate over segments
+                of segment_length, see Truth.update_PSD.
         '''
 
-        self.num_norms = np.zeros([self.ensemble_size,2])
+        if chunk_size is None:
+            chunk_size = max(1, BATCH_MAX_ELEMENTS // (2*self.number_of_points))
 
-        PSD_ensemble = np.zeros(self.number_of_points, dtype='complex128')
-        for ensemble in xrange(self.ensemble_size):
-            noise_realisation = self.beta_z()[0] # Note that beta_z returns noise trace and phases. The [0] index picks out the noise traces
-            PSDnoise_realisation = np.abs((1.0/np.sqrt(self.number_of_points))*np.fft.fft(noise_realisation))**2 # Using an scaled FFT
-            self.num_norms[ensemble,0] = self.norm_squared(noise_realisation) # Energy of the signal in the time domain
-            self.num_norms[ensemble,1] = np.sum(PSDnoise_realisation) # Energy of the signal in the Fourier domain. These norms are equal
-            PSD_ensemble += PSDnoise_realisation
+        self.reset_PSD()
+        for start in xrange(0, self.ensemble_size, chunk_size):
+            num_in_chunk = min(chunk_size, self.ensemble_size - start)
+            self.update_PSD(self.beta_z_batch(num_in_chunk, rng=rng), segment_length=segment_length)
 
-        avg_PSD = (1.0/self.ensemble_size)*PSD_ensemble # Ensemble averaging
-        self.num_S_estimate = NUM_SCALE*(1.0/self.number_of_points)*(avg_PSD) # Taking the limit with respect to time.
+        pass  #self.num_w_axis, self.num_S_estimate, self.num_norms_mean, self.num_norms_var, self.num_S_norm
+
+
+    def reset_PSD(self):
+        '''Discard the running PSD estimate and norm statistics of Truth.update_PSD.'''
+
+        self.num_realisations = 0
+        self.num_norms_mean = np.zeros(2)
+        self.num_norms_var = np.zeros(2)
+        self._PSD_sum = None
+        self._num_segments = 0
+        self._norms_sum_sqr_dev = np.zeros(2)
 
-        #Total Power
-        self.num_S_norm = np.sum(self.num_S_estimate) 
-        # Difference in num_S_norm and one member of norms[:,1] arises from taking the limit over time. 
-        # Difference in height of num_S_norm and true_S_norm at primary signal frequency is because small, non zero energy exists at other frequencies 
-        self.num_w_axis = 2.0*np.pi*np.fft.fftfreq(self.number_of_points,d=self.Delta_T_Sampling)
 
-        pass  #self.num_w_axis, self.num_S_estimate, self.num_norms, self.num_S_norm
+    def update_PSD(self, noise_realisations, segment_length=None):
+        '''Fold a batch of time domain realisations of dephasing field into the
+        running PSD estimate, without retaining the realisations.
+
+        Updates num_S_estimate, num_S_norm and num_w_axis as an average over all
+        realisations since Truth.reset_PSD, and running mean and variance of the
+        time domain and Fourier domain norms of each realisation
+        (num_norms_mean, num_norms_var, indexed as [time, Fourier]).
+
+        Parameters:
+        ----------
+            noise_realisations (`float64`) : Realisations of dephasing field,
+                [Dim: number of realisations x number_of_points].
+            segment_length (`int`, optional) : If None, each realisation
+                contributes one periodogram of length number_of_points. Else, each
+                realisation contributes Hann windowed periodograms of segments
+                of segment_length, overlapping by half (Welch estimate). The same
+                segment_length must be used between calls to Truth.reset_PSD.
+                Raises ValueError unless 3 <= segment_length <= number_of_points.
+        '''
+
+        noise_realisations = np.atleast_2d(noise_realisations)
+        num_in_batch, N = noise_realisations.shape
+
+        # A Hann window of length 2 or less is zero everywhere
+        if segment_length is not None and not 3 <= segment_length <= N:
+            raise ValueError("segment_length must be in [3, number_of_points]; got %s" %(segment_length))
+
+        periodograms = self._periodograms(noise_realisations)
+
+        # Running norm statistics (pairwise merge of batch mean and variance)
+        norms = np.zeros((num_in_batch, 2))
+        norms[:, 0] = np.sum(np.abs(noise_realisations)**2, axis=1) # Energy of the signal in the time domain
+        norms[:, 1] = np.sum(periodograms, axis=1) # Energy of the signal in the Fourier domain. These norms are equal
+
+        total = self.num_realisations + num_in_batch
+        delta = np.mean(norms, axis=0) - self.num_norms_mean
+        self.num_norms_mean = self.num_norms_mean + delta*(num_in_batch/float(total))
+        self._norms_sum_sqr_dev = self._norms_sum_sqr_dev + num_in_batch*np.var(norms, axis=0) + (delta**2)*self.num_realisations*num_in_batch/float(total)
+        self.num_norms_var = self._norms_sum_sqr_dev / total
+        self.num_realisations = total
+
+        # Running PSD sum over realisations or segments
+        if segment_length is None:
+            L = N
+            PSD_batch = periodograms
+        else:
+            L = int(segment_length)
+            starts = np.arange(0, N - L + 1, max(1, L // 2))
+            segments = noise_realisations[:, starts[:, np.newaxis] + np.arange(L)].reshape(-1, L)
+            PSD_batch = self._periodograms(segments, window=np.hanning(L))
+
+        if self._PSD_sum is None:
+            self._PSD_sum = np.zeros(L)
+        self._PSD_sum += np.sum(PSD_batch, axis=0)
+        self._num_segments += PSD_batch.shape[0]
+
+        avg_PSD = (1.0/self._num_segments)*self._PSD_sum # Ensemble averaging
+        self.num_S_estimate = NUM_SCALE*(1.0/L)*(avg_PSD) # Taking the limit with respect to time.
+
+        #Total Power
+        self.num_S_norm = np.sum(self.num_S_estimate)
+        # Difference in num_S_norm and num_norms_mean[1] arises from taking the limit over time.
+        # Difference in height of num_S_norm and true_S_norm at primary signal frequency is because small, non zero energy exists at other frequencies
+        self.num_w_axis = 2.0*np.pi*np.fft.fftfreq(L, d=self.Delta_T_Sampling)
+
+
+    def _periodograms(self, traces, window=None):
+        '''Return scaled periodograms |FFT(window*trace)|**2 / sum(window**2) of the
+        rows of traces, in np.fft.fft order, via a real FFT over all rows.
+        For window=None (rectangular), |FFT(trace)/sqrt(N)|**2.
+        [Helper function for Truth.update_PSD]'''
+
+        L = traces.shape[1]
+        scale = float(L)
+        if window is not None:
+            traces = traces*window
+            scale = np.sum(window**2)
+
+        half = np.abs(np.fft.rfft(traces, axis=1))**2 / scale
+
+        # Real traces have symmetric spectra: PSD[L - k] = PSD[k]
+        full = np.zeros((traces.shape[0], L))
+        full[:, 0 : half.shape[1]] = half
+        full[:, half.shape[1]:] = half[:, 1 : L - half.shape[1] + 1][:, ::-1]
+        return full
 
 
     def norm_squared(self, signal):
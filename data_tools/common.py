@@ -16,7 +16,7 @@ Created on Thu Apr 20 19:20:43 2017
 from __future__ import division, print_function, absolute_import
 import numpy as np
 
-def get_data(dataobject):
+def get_data(dataobject, rng=None):
 
     '''Return noisy measurements given a randomly chosen realisation of truth.
 
@@ -25,7 +25,11 @@ def get_data(dataobject):
     (Faster than generating another true noise realisation). A randomly chosen
     realisation of truth is picked from macro_truths dataobject - a LoadExperiment
     instance for LKFFB for given (test_case, variation) pair.
+
+    Random draws are made from rng, a np.random.RandomState stream (see
+    analysis_tools.rng), or from the global np.random state if rng is None.
     '''
+    rng = np.random if rng is None else rng
 
     msmt_noise_variance = dataobject.LKFFB_msmt_noise_variance
     number_of_points = dataobject.Expt.number_of_points
@@ -35,6 +39,6 @@ def get_data(dataobject):
     macro_truth = dataobject.LKFFB_macro_truth.reshape(shape[0]*shape[1], shape[2]) 
     # collapse  first two axees (only relevant to KF techniques)
 
-    pick_one = int(np.random.uniform(low=0, high = int(macro_truth.shape[0]-1)))
+    pick_one = int(rng.uniform(low=0, high = int(macro_truth.shape[0]-1)))
 
-    return macro_truth[pick_one, :] + msmt_noise_variance*np.random.randn(number_of_points), pick_one
+    return macro_truth[pick_one, :] + msmt_noise_variance*rng.randn(number_of_points), pick_one
@@ -269,7 +269,7 @@ def choose_GPR_params(LdExp):
     return ans
 
 
-def GPRP_run(LdExp, y_signal):
+def GPRP_run(LdExp, y_signal, backend='numpy', inducing_pts=None):
     '''
     Return a single GPRP prediction based on tuned hyper parameters.
 
@@ -277,15 +277,19 @@ def GPRP_run(LdExp, y_signal):
     ----------
         LdExp (`class object`) : A data_tools.load_raw_cluster_data.LoadExperiment instance.
         y_signal (`float64`) : Noisy measurements (input for filtering).
+        backend (`str`, optional) : 'numpy' / 'GPy' choice of GPR engine.
+            Defaults to 'numpy'.
+        inducing_pts (`int`, optional) : Number of inducing inputs for sparse
+            (FITC) GPR, backend 'numpy' only. Defaults to None (exact GPR).
 
     Returns:
     -------
         predictions (`float64`) : Predictions sequence from a single run of AKF.
     '''
 
-    import GPy
+    from gpr.periodic import GPR_Periodic, GPR_Periodic_FITC, Backend, GPY, FACTOR_CACHE
 
-    # Create training data objects and test pts for GPy
+    # Create training data objects and test pts for GPR
     X = LdExp.Expt.Time_Axis[0:LdExp.Expt.n_train, np.newaxis]
     Y = y_signal[0:LdExp.Expt.n_train, np.newaxis]
     testx = LdExp.Expt.Time_Axis[LdExp.Expt.n_train - LdExp.Expt.n_testbefore : ]
@@ -295,6 +299,17 @@ def GPRP_run(LdExp, y_signal):
 
         R, sigma, period, length_scale = choose_GPR_params(LdExp) # pick tuned parameters
 
+        if Backend[backend] != GPY:
+            if inducing_pts is not None:
+                m1 = GPR_Periodic_FITC(X, Y, sigma, R, period, length_scale, inducing_pts)
+            else:
+                # Records share X and tuned parameters: reuse one factorisation of K + R I
+                m1 = GPR_Periodic(X, Y, sigma, R, period, length_scale, cache=FACTOR_CACHE)
+            predictions = m1.predict(testx[:,np.newaxis])[0].flatten()
+            return predictions
+
+        import GPy # Non standard Python package
+
         kernel_per = GPy.kern.StdPeriodic(1, period=period, variance=sigma, lengthscale=length_scale)
         gauss = GPy.likelihoods.Gaussian(variance=R)
         exact = GPy.inference.latent_function_inference.ExactGaussianInference()
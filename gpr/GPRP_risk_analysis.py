@@ -4,30 +4,74 @@ Created on Thu Apr 20 19:20:43 2017
 
 .. module:: gpr.GPRP_risk_analysis
 
-    :synopsis: Calculates GPy predictions and tunes algorithms
-         according to lowest Bayes Risk.
+    :synopsis: Calculates GPR predictions and tunes algorithms
+         according to lowest Bayes Risk. GPR models are built by gpr.periodic
+         (backend 'numpy', default) or by GPy (backend 'GPy', imported on demand).
 
     Module Level Classes:
     --------------------
-        GPRP_Optimisation : Calculates GPy predictions using L-BFGF-B optimiser to
+        GPRP_Optimisation : Calculates GPR predictions using L-BFGF-B optimiser to
             tune kernel hyper-parameters.
 
+    Module Level Functions:
+    ----------------------
+        optimise_GPR_restart : Return log likelihood and optimised parameters for
+            one L-BFGS-B start of the 'numpy' backend.
+
 .. moduleauthor:: Riddhi Gupta <riddhi.sw@gmail.com>
 
 '''
 from __future__ import division, print_function, absolute_import
 
 import sys
+import multiprocessing
 import numpy as np
-import GPy # Non standard Python package
+import scipy.linalg as sla
 
 from data_tools.load_raw_cluster_data import LoadExperiment as le
 from gpr.common import get_data
+from gpr.periodic import GPR_Periodic, GPR_Periodic_FITC, Backend, GPY
 from analysis_tools.common import sqr_err
+from analysis_tools.rng import get_rng
+
+# Ratio of greatest to least initial period for random restarts
+PERIOD_RANGE = 10.0
+
+
+def optimise_GPR_restart(restart):
+    ''' Return log likelihood and optimised parameters for one L-BFGS-B start of
+    the 'numpy' backend. Used by a process pool in GPRPOptimisation.
+
+    Parameters:
+    ----------
+        restart (`tuple`) : (X, Y, init_params_list, sigma_bound, R_bound,
+            inducing_pts), as in GPRPOptimisation.call_GPR_optimise.
+
+    Returns:
+    -------
+        log_likelihood (`float64`) : Log marginal likelihood at optimised parameters,
+            or -inf if the kernel matrix is not numerically positive definite.
+        opt_params_list (`float64`) : List of optimally tuned parameters
+            [sigma, R, period, lengthscale].
+    '''
+    X, Y, init_params_list, sigma_bound, R_bound, inducing_pts = restart
+
+    if inducing_pts is not None:
+        m1 = GPR_Periodic_FITC(X, Y, *init_params_list, inducing=inducing_pts)
+    else:
+        m1 = GPR_Periodic(X, Y, *init_params_list)
+    m1.optimize(sigma_bound, R_bound)
+
+    try:
+        log_likelihood = m1.log_likelihood()
+    except sla.LinAlgError:
+        log_likelihood = -np.inf
+    return log_likelihood, m1.params()
+
 
 class GPRPOptimisation(object):
     '''
-    Calculates GPy predictions using L-BFGF-B optimiser to tune kernel
+    Calculates GPR predictions using L-BFGF-B optimiser to tune kernel
     hyper-parameters.
 
     Attributes:
@@ -43,10 +87,16 @@ class GPRPOptimisation(object):
         dataobject (`class object`): A data_tools.load_raw_cluster_data.LoadExperiment instance.
         Sigma_Max (`float64`): Maximal bound for sigma in L-BFGS-B optimiser in GPy.
         R_Max (`float64`): Maximal bound for R in L-BFGS-B optimiser in GPy.
+        backend (`str`): 'numpy' / 'GPy' choice of GPR engine. Defaults to 'numpy'.
+        warm_start (`tuple`): (log likelihood, parameters) of the best multi-restart
+            fit to the latest record, used as a start for the next record; or None.
 
     Methods:
     -------
         initialise_GPR_hyperparams : Return initial values for L-BFGF-S in GPy.
+        call_GPR_optimise : Return optimised GPR model from the chosen backend.
+        call_GPR_multi_restart : Return the best optimised GPR model over several
+            starts, optionally in a process pool.
         call_GPy_optimise : Return optimised GPy model.
         one_GPRP_model : Returns GPRP predictions for one truth, dataset,
             and GPRP initialisation.
@@ -55,7 +105,8 @@ class GPRPOptimisation(object):
     '''
     def __init__(self, test_case, variation,
                  Sigma_Max, R_Max,
-                 LKFFBfilepath, GPRP_savetopath):
+                 LKFFBfilepath, GPRP_savetopath,
+                 backend='numpy'):
 
         self.test_case = test_case
         self.variation = variation
@@ -71,9 +122,11 @@ class GPRPOptimisation(object):
 
         self.Sigma_Max = Sigma_Max
         self.R_Max = R_Max
+        self.backend = backend
+        self.warm_start = None
 
 
-    def initialise_GPR_hyperparams(self, approx_l_0=3.0):
+    def initialise_GPR_hyperparams(self, approx_l_0=3.0, random_period='No', rng=None):
         '''
         Return initial values for L-BFGF-S in GPy.
 
@@ -82,6 +135,11 @@ class GPRPOptimisation(object):
             approx_l_0 (`float64', optional) : Approximates the order of the
                 lengthscale in the periodic kernel, l_0, proportional to the time
                 between consecutie measurements, Delta_T_Sampling.
+            random_period (`str`, optional) : A Yes / No flag to sample p_0 log-uniformly
+                in [n_train / PERIOD_RANGE, n_train], e.g. for multiple restarts.
+                Defaults to 'No'.
+            rng (`np.random.RandomState`, optional) : Random number stream (see
+                analysis_tools.rng). If None, draws from the global np.random state.
 
         Note:
         ----
@@ -105,10 +163,96 @@ class GPRPOptimisation(object):
         p_0 = self.dataobject.Expt.n_train
         l_0 = self.dataobject.Expt.Delta_T_Sampling * approx_l_0
         # By randomly chosing value between (0, max], where max == L-BFGFS Bound, tuned manually:
-        sigma_0 = np.random.uniform(low=0.1, high=self.Sigma_Max)
-        R_0 = np.random.uniform(low=0.1, high=self.R_Max)
+        rng = np.random if rng is None else rng
+        sigma_0 = rng.uniform(low=0.1, high=self.Sigma_Max)
+        R_0 = rng.uniform(low=0.1, high=self.R_Max)
+        if random_period == 'Yes':
+            p_0 = p_0 * PERIOD_RANGE**rng.uniform(low=-1.0, high=0.0)
         return sigma_0, R_0, p_0, l_0
 
+    def call_GPR_optimise(self, X, Y, sigma_0, R_0, p_0, l_0, messages=False, optimizer=None,
+                          inducing_pts=None):
+        ''' Return optimised GPR model with a periodic kernel, using the backend
+        chosen by GPRPOptimisation.backend, and list of its optimised parameters.
+
+        Parameters:
+        ----------
+            X, Y, sigma_0, R_0, p_0, l_0, messages, optimizer : As in
+                GPRPOptimisation.call_GPy_optimise. optimizer is ignored for
+                backend 'numpy', which uses L-BFGS-B.
+            inducing_pts (`int`, optional) : Number of inducing inputs for sparse
+                (FITC) GPR, backend 'numpy' only. Defaults to None (exact GPR).
+
+        Returns:
+        -------
+            m1 : Optimised GPR model with periodic kernel (gpr.periodic.GPR_Periodic,
+                gpr.periodic.GPR_Periodic_FITC or GPy.core.GP object).
+            opt_params_list (`float64`) : List of optimally tuned parameters
+                [sigma, R, period, lengthscale].
+        '''
+
+        if Backend[self.backend] == GPY:
+            if inducing_pts is not None:
+                raise ValueError("Sparse GPR (inducing_pts) requires backend 'numpy'")
+            m1 = self.call_GPy_optimise(X, Y, sigma_0, R_0, p_0, l_0, messages=messages, optimizer=optimizer)
+            opt_params_list = [m1.std_periodic.variance[0], m1.Gaussian_noise.variance[0], m1.std_periodic.period[0], m1.std_periodic.lengthscale[0]]
+            return m1, opt_params_list
+
+        if inducing_pts is not None:
+            m1 = GPR_Periodic_FITC(X, Y, sigma_0, R_0, p_0, l_0, inducing_pts)
+        else:
+            m1 = GPR_Periodic(X, Y, sigma_0, R_0, p_0, l_0)
+        m1.optimize(self.Sigma_Max, self.R_Max, messages=messages)
+        return m1, m1.params()
+
+    def call_GPR_multi_restart(self, X, Y, init_params_lists, pool=None, inducing_pts=None):
+        ''' Return the optimised GPR model with the greatest log likelihood over
+        several L-BFGS-B starts. Starts are optimised in a process pool if pool is
+        not None and the backend is 'numpy'; else serially. The returned model is
+        rebuilt from the best parameters and factorises K + R I on first use.
+
+        Parameters:
+        ----------
+            X, Y, inducing_pts : As in GPRPOptimisation.call_GPR_optimise.
+            init_params_lists (`list`) : Lists of initial [sigma, R, period, lengthscale].
+            pool (`multiprocessing.Pool`, optional) : Worker pool. Defaults to None.
+
+        Returns:
+        -------
+            m1 : Optimised GPR model with the greatest log likelihood.
+            opt_params_list (`float64`) : List of optimally tuned parameters of m1.
+            init_params_list (`float64`) : List of initial conditions of m1.
+            log_likelihood (`float64`) : Log marginal likelihood of m1.
+        '''
+
+        if Backend[self.backend] == GPY:
+            fits = []
+            for init_params_list in init_params_lists:
+                m1, opt_params_list = self.call_GPR_optimise(X, Y, *init_params_list, inducing_pts=inducing_pts)
+                fits.append((m1.log_likelihood(), opt_params_list, m1))
+            idx_best = np.argmax([fit[0] for fit in fits])
+            log_likelihood, opt_params_list, m1 = fits[idx_best]
+            return m1, opt_params_list, init_params_lists[idx_best], log_likelihood
+
+        restarts = [(X, Y, init_params_list, self.Sigma_Max, self.R_Max, inducing_pts) for init_params_list in init_params_lists]
+        if pool is not None:
+            fits = pool.map(optimise_GPR_restart, restarts)
+        else:
+            fits = [optimise_GPR_restart(restart) for restart in restarts]
+
+        idx_best = np.argmax([fit[0] for fit in fits])
+        log_likelihood, opt_params_list = fits[idx_best]
+
+        # Workers return parameters only. Returning factorisations would pickle
+        # O(n**2) arrays for every start; the best model instead factorises once
+        # more here, as for a single start
+        if inducing_pts is not None:
+            m1 = GPR_Periodic_FITC(X, Y, *opt_params_list, inducing=inducing_pts)
+        else:
+            m1 = GPR_Periodic(X, Y, *opt_params_list)
+
+        return m1, opt_params_list, init_params_lists[idx_best], log_likelihood
+
     def call_GPy_optimise(self, X, Y, sigma_0, R_0, p_0, l_0,
                           sigma_bound=0,
                           R_bound=0,
@@ -144,6 +288,8 @@ class GPRPOptimisation(object):
             m1 : Optimised GPR model with periodic kernel. (GPy.core.GP object).
         '''
 
+        import GPy # Non standard Python package
+
         if sigma_bound == 0:
             sigma_bound = self.Sigma_Max
 
@@ -164,7 +310,8 @@ class GPRPOptimisation(object):
         m1.optimize(optimizer=optimizer, messages=messages)
         return m1
 
-    def one_GPRP_model(self, training_pts, approx_l_0, randdata, messages=False, optimizer=None):
+    def one_GPRP_model(self, training_pts, approx_l_0, randdata, messages=False, optimizer=None,
+                       inducing_pts=None, compare_exact='No', num_restarts=1, pool=None, rng=None):
         '''
         Returns GPRP predictions for one truth, dataset, and GPRP initialisation.
         [Helper Function].
@@ -178,6 +325,19 @@ class GPRPOptimisation(object):
             randdata (`str`): A Yes (`y`) / No (`n`) flag to randomize choice of time labels.
             messages : Display messages during GPy optimisation. Defaults to False.
             optimizer : Preferred GPy optimiser. Defaults to None / lbfgs.
+            inducing_pts (`int`, optional) : Number of inducing inputs for sparse
+                (FITC) GPR. Defaults to None (exact GPR).
+            compare_exact (`str`, optional) : A Yes / No flag to also return exact
+                GPR predictions with the sparse GPR tuned parameters. Defaults to 'No'.
+            num_restarts (`int`, optional) : Number of L-BFGS-B starts. If > 1, the
+                first start is as for num_restarts == 1, the second start is
+                GPRPOptimisation.warm_start (if any), and the remaining starts have
+                random initial periods. Defaults to 1.
+            pool (`multiprocessing.Pool`, optional) : Worker pool for starts.
+                Defaults to None.
+            rng (`np.random.RandomState`, optional) : Random number stream for
+                the dataset and all initial conditions (see analysis_tools.rng).
+                If None, draws from the global np.random state.
 
         Returns:
         -------
@@ -186,31 +346,59 @@ class GPRPOptimisation(object):
             msmts (`float64`) : Noisy measurements (input to filtering).
             opt_params_list (`float64`) : List of optimally tuned parameters.
             init_params_list (`float64`) : List of initial conditions (theory and/or random).
-            m1 (`GPy object`) : Tuned GPy GPR model with Periodic Kernel (GPy.core.GP object).
+            m1 (`object`) : Tuned GPR model with Periodic Kernel (gpr.periodic.GPR_Periodic,
+                gpr.periodic.GPR_Periodic_FITC or GPy.core.GP object).
+            exact_predictions (`float64`) : Predictions from exact GPR with the tuned
+                parameters of m1, if compare_exact == 'Yes' and inducing_pts is not
+                None; else None.
 
         See Also:
         -------
             gpr.common.get_data
             GPRPOptimisation.initialise_GPR_hyperparams
-            GPRPOptimisation.call_GPy_optimise
+            GPRPOptimisation.call_GPR_optimise
+            GPRPOptimisation.call_GPR_multi_restart
 
         '''
         X, Y, testx, truth, msmts  = get_data(self.dataobject, 
                                               points=training_pts,
-                                              randomize=randdata)
+                                              randomize=randdata,
+                                              rng=rng)
 
-        sigma_0, R_0, p_0, l_0 = self.initialise_GPR_hyperparams(approx_l_0=approx_l_0)
+        sigma_0, R_0, p_0, l_0 = self.initialise_GPR_hyperparams(approx_l_0=approx_l_0, rng=rng)
 
         init_params_list = [sigma_0, R_0, p_0, l_0]
-        m1 = self.call_GPy_optimise(X, Y, sigma_0, R_0, p_0, l_0, messages=messages, optimizer=optimizer)
-        opt_params_list = [m1.std_periodic.variance[0], m1.Gaussian_noise.variance[0], m1.std_periodic.period[0], m1.std_periodic.lengthscale[0]]
+
+        if num_restarts > 1:
+            init_params_lists = [init_params_list]
+            if self.warm_start is not None:
+                init_params_lists.append(list(self.warm_start[1]))
+            while len(init_params_lists) < num_restarts:
+                init_params_lists.append(list(self.initialise_GPR_hyperparams(approx_l_0=approx_l_0,
+                                                                              random_period='Yes',
+                                                                              rng=rng)))
+
+            m1, opt_params_list, init_params_list, log_likelihood = self.call_GPR_multi_restart(X, Y, init_params_lists,
+                                                                                               pool=pool,
+                                                                                               inducing_pts=inducing_pts)
+            # Likelihoods of different records are not comparable: keep the latest fit
+            self.warm_start = (log_likelihood, opt_params_list)
+        else:
+            m1, opt_params_list = self.call_GPR_optimise(X, Y, sigma_0, R_0, p_0, l_0, messages=messages, optimizer=optimizer,
+                                                         inducing_pts=inducing_pts)
 
         predictions = m1.predict(testx)[0].flatten()
 
-        return predictions, truth, msmts, opt_params_list, init_params_list, m1
+        exact_predictions = None
+        if compare_exact == 'Yes' and inducing_pts is not None:
+            exact_predictions = GPR_Periodic(X, Y, *opt_params_list).predict(testx)[0].flatten()
 
+        return predictions, truth, msmts, opt_params_list, init_params_list, m1, exact_predictions
 
-    def make_GPR_PER(self, mapname='_GPR_PER_', approx_l_0=3.0, randdata='y'):
+
+    def make_GPR_PER(self, mapname='_GPR_PER_', approx_l_0=3.0, randdata='y',
+                     inducing_pts=None, compare_exact='No', num_restarts=1, num_processes=1,
+                     rng_seed=None):
         ''' Save L-BFGS-B optimised GPR predictions dataset for ensemble of runs
             using a Periodic Kernel as a .npz file.
 
@@ -222,6 +410,22 @@ class GPRPOptimisation(object):
                     consecutive measurements.
                 randdata (`str`, optional): A Yes (`y`) / No (`n`) flag to randomize choice
                     of time labels.
+                inducing_pts (`int`, optional) : Number of inducing inputs for sparse
+                    (FITC) GPR. Defaults to None (exact GPR).
+                compare_exact (`str`, optional) : A Yes / No flag to also save errors of
+                    exact GPR, for accuracy of the sparse approximation. The exact GPR
+                    is not tuned: it uses the sparse (FITC) tuned parameters, and its
+                    errors are saved as GPR_PER_exact_at_sparse_params_prediction_errors
+                    and GPR_PER_exact_at_sparse_params_forecastng_errors. Defaults to 'No'.
+                num_restarts (`int`, optional) : Number of L-BFGS-B starts per record,
+                    keeping the greatest log likelihood; see one_GPRP_model. Defaults to 1.
+                num_processes (`int`, optional) : Number of worker processes for starts.
+                    Raises ValueError for backend 'GPy' unless num_processes == 1.
+                    Defaults to 1 (serial).
+                rng_seed (`int`, optional) : Seed for reproducible random number streams.
+                    The dataset and initial conditions for record idx_d are drawn from
+                    the stream (rng_seed, (idx_d,)), see analysis_tools.rng. If None,
+                    draws from the global np.random state. Defaults to None.
             Returns:
             -------
                 Saves .npz file with L-BFGS-B optimised GPR (Periodic Kernel) predictions dataset.
@@ -238,32 +442,66 @@ class GPRPOptimisation(object):
         macro_data = []
         macro_opt_params = []
         macro_init_params = []
-
-        for idx_d in xrange(self.dataobject.LKFFB_max_it_BR):
-
-            predictions, truth, msmts, opt_params_list, init_params_list = self.one_GPRP_model(training_pts, approx_l_0, randdata)[0:5]
-
-            truth_ = truth[self.dataobject.Expt.n_train - self.dataobject.Expt.n_testbefore : self.dataobject.Expt.n_train + self.dataobject.Expt.n_predict]
-            residuals_sqr_errors = sqr_err(predictions, truth_)
-
-            prediction_errors.append(residuals_sqr_errors[0: self.dataobject.Expt.n_testbefore])
-            forecastng_errors.append(residuals_sqr_errors[self.dataobject.Expt.n_testbefore : ])
-            macro_truth.append(truth)
-            macro_data.append(msmts)
-            macro_opt_params.append(opt_params_list)
-            macro_init_params.append(init_params_list)
-
-            np.savez(path2dir+'_GPR_PER_',
-                     msmt_noise_variance=self.dataobject.LKFFB_msmt_noise_variance,
-                     max_it_BR=self.dataobject.LKFFB_max_it_BR,
-                     macro_truth=macro_truth,
-                     GPR_opt_params=macro_opt_params,
-                     macro_data=macro_data,
-                     GPR_init_params=macro_init_params,
-                     GPR_PER_prediction_errors=prediction_errors,
-                     GPR_PER_forecastng_errors=forecastng_errors,
-                     training_pts=training_pts,
-                     Sigma_Max=self.Sigma_Max,
-                     R_Max=self.R_Max)
+        exact_prediction_errors = []
+        exact_forecastng_errors = []
+
+        if num_processes != 1 and Backend[self.backend] == GPY:
+            raise ValueError("num_processes != 1 requires backend 'numpy'")
+
+        pool = None
+        if num_restarts > 1 and num_processes != 1:
+            pool = multiprocessing.Pool(processes=num_processes)
+
+        try:
+            for idx_d in xrange(self.dataobject.LKFFB_max_it_BR):
+
+                rng = None if rng_seed is None else get_rng(rng_seed, (idx_d,))
+                output = self.one_GPRP_model(training_pts, approx_l_0, randdata,
+                                             inducing_pts=inducing_pts,
+                                             compare_exact=compare_exact,
+                                             num_restarts=num_restarts,
+                                             pool=pool,
+                                             rng=rng)
+                predictions, truth, msmts, opt_params_list, init_params_list = output[0:5]
+                exact_predictions = output[6]
+
+                truth_ = truth[self.dataobject.Expt.n_train - self.dataobject.Expt.n_testbefore : self.dataobject.Expt.n_train + self.dataobject.Expt.n_predict]
+                residuals_sqr_errors = sqr_err(predictions, truth_)
+
+                if exact_predictions is not None:
+                    exact_sqr_errors = sqr_err(exact_predictions, truth_)
+                    exact_prediction_errors.append(exact_sqr_errors[0: self.dataobject.Expt.n_testbefore])
+                    exact_forecastng_errors.append(exact_sqr_errors[self.dataobject.Expt.n_testbefore : ])
+
+                prediction_errors.append(residuals_sqr_errors[0: self.dataobject.Expt.n_testbefore])
+                forecastng_errors.append(residuals_sqr_errors[self.dataobject.Expt.n_testbefore : ])
+                macro_truth.append(truth)
+                macro_data.append(msmts)
+                macro_opt_params.append(opt_params_list)
+                macro_init_params.append(init_params_list)
+
+                np.savez(path2dir+'_GPR_PER_',
+                         msmt_noise_variance=self.dataobject.LKFFB_msmt_noise_variance,
+                         max_it_BR=self.dataobject.LKFFB_max_it_BR,
+                         macro_truth=macro_truth,
+                         GPR_opt_params=macro_opt_params,
+                         macro_data=macro_data,
+                         GPR_init_params=macro_init_params,
+                         GPR_PER_prediction_errors=prediction_errors,
+                         GPR_PER_forecastng_errors=forecastng_errors,
+                         training_pts=training_pts,
+                         Sigma_Max=self.Sigma_Max,
+                         R_Max=self.R_Max,
+                         inducing_pts=-1 if inducing_pts is None else inducing_pts,
+                         GPR_PER_exact_at_sparse_params_prediction_errors=exact_prediction_errors,
+                         GPR_PER_exact_at_sparse_params_forecastng_errors=exact_forecastng_errors,
+                         num_restarts=num_restarts)
+
+            if pool is not None:
+                pool.close()
+                pool.join()
+        finally:
+            if pool is not None:
+                pool.terminate()
 
         return
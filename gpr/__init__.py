@@ -5,8 +5,10 @@
     Modules:
     -------
         common : Build training data for GPR with Periodic Kernel in GPy.
-        GPRP_risk_analysis : Calculates GPy predictions and tunes algorithms
+        GPRP_risk_analysis : Calculates GPR predictions and tunes algorithms
          according to lowest Bayes Risk.
+        periodic : Exact and sparse (FITC) GPR with a standard periodic kernel
+         in NumPy; GPy is an optional backend.
 
     Author: Riddhi Gupta <riddhi.sw@gmail.com>
 '''
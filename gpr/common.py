@@ -24,7 +24,7 @@ def add_axis(some_array):
     return some_array[:, np.newaxis]
 
 
-def get_data(dataobject, points=200, randomize='y'):
+def get_data(dataobject, points=200, randomize='y', rng=None):
     '''Return a set of data inputs in desired format for GPy implementation of
        Gaussian Process Regression with a Periodic Kernel.
 
@@ -33,6 +33,8 @@ def get_data(dataobject, points=200, randomize='y'):
             dataobject (`class object`) :  A data_tools.load_raw_cluster_data.LoadExperiment instance.
             randomize (`str`, optional): A Yes (`y`) / No (`n`) flag to randomize choice of time labels.
             points (`int`) : Number of time labels chosen for GPR analysis.
+            rng (`np.random.RandomState`, optional) : Random number stream (see
+                analysis_tools.rng). If None, draws from the global np.random state.
 
        Returns:
        -------
@@ -46,7 +48,9 @@ def get_data(dataobject, points=200, randomize='y'):
             n_predict (`int`): number of points in forecasting region,
                 i.e. n_predict + n_train = number_of_points.
     '''
-    msmts, idx_truth = fetchdata(dataobject)
+    rng = np.random if rng is None else rng
+
+    msmts, idx_truth = fetchdata(dataobject, rng=rng)
 
     num = dataobject.Expt.number_of_points
     n_predict = dataobject.Expt.n_predict
@@ -65,7 +69,7 @@ def get_data(dataobject, points=200, randomize='y'):
         x = []
         y = []
 
-        for index in np.random.uniform(low=0, high=n_train, size=points):
+        for index in rng.uniform(low=0, high=n_train, size=points).astype(int):
             x.append(timeaxis[index])
             y.append(msmts[index])
 
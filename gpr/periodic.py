@@ -0,0 +1,682 @@
+'''
+.. module:: gpr.periodic
+
+    :synopsis: Exact and sparse (FITC) Gaussian Process Regression with a standard
+        periodic kernel, using NumPy and SciPy only. The exact model is equivalent
+        to a GPy.core.GP model with a GPy.kern.StdPeriodic kernel, Gaussian
+        likelihood and exact inference, as used in gpr.GPRP_risk_analysis,
+        without the GPy import and model object overhead.
+
+    The kernel is
+        k(x, x') = sigma * exp(-0.5 * (sin(pi * (x - x') / period) / lengthscale)**2),
+    and measurements carry white Gaussian noise of variance R.
+
+    A `backend` choice of 'numpy' (this module) or 'GPy' selects the GPR engine
+    in gpr.GPRP_risk_analysis and data_tools.data_tuned_run_analysis.GPRP_run.
+    GPy is imported only if the 'GPy' backend is requested.
+
+    On a uniform grid of training inputs (e.g. gpr.common.get_data with
+    randomize != 'y'), K + R I is symmetric Toeplitz. Solver 'Auto' then uses
+    Durbin's recursion (O(n**2)) for the log determinant and the Gohberg-Semencul
+    form of the inverse, applied by FFT, instead of an O(n**3) Cholesky factor,
+    unless K + R I is ill-conditioned (see TOEPLITZ_MIN_ERROR_RATIO).
+
+    Module Level Functions:
+    ----------------------
+        std_periodic : Return the standard periodic kernel matrix.
+        jitchol : Return a lower Cholesky factor, adding diagonal jitter if required.
+        uniform_grid_spacing : Return spacing of uniformly spaced inputs, else None.
+        durbin : Return Gohberg-Semencul generators and log determinant of a
+            symmetric positive definite Toeplitz matrix.
+        toeplitz_inv_apply : Return T^-1 B from Gohberg-Semencul generators of T.
+        fingerprint : Return a hashable fingerprint of an input array.
+
+    Factorisations of K + R I are stored in an LRU cache keyed by (fingerprint of
+    X, solver, hyper-parameters), so that models which share inputs and tuned
+    hyper-parameters, e.g. an ensemble of records, reuse one factorisation and
+    only pay O(n**2) per new measurement record. Models with per-record tuned
+    hyper-parameters should not use the cache, as their entries are never reused.
+
+    Module Level Classes:
+    ----------------------
+        FactorCache : Memory bounded LRU cache of factorisations of K + R I.
+        GPR_Periodic : Exact GPR model with a standard periodic kernel.
+        GPR_Periodic_FITC : Sparse GPR model with a standard periodic kernel and
+            fixed inducing inputs (FITC approximation).
+
+.. moduleauthor:: Riddhi Gupta <riddhi.sw@gmail.com>
+'''
+from __future__ import division, print_function, absolute_import
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import scipy.linalg as sla
+from scipy.optimize import fmin_l_bfgs_b
+from scipy.special import expit
+
+NUMPY, GPY = range(2)
+Backend = {
+    "numpy": NUMPY,
+    "GPy": GPY
+}
+
+AUTO, CHOLESKY, TOEPLITZ = range(3)
+Solver = {
+    "Auto": AUTO,
+    "Cholesky": CHOLESKY,
+    "Toeplitz": TOEPLITZ
+}
+
+# Maximum number of L-BFGS-B iterations, as for GPy model.optimize()
+MAX_ITERS = 1000
+
+# Relative tolerance on input spacings for a uniform grid
+UNIFORM_GRID_TOL = 1e-9
+
+# Least prediction error variance of Durbin's recursion, relative to c[0], for
+# solver 'Auto'. Below it, K + R I is too ill-conditioned for the Toeplitz path
+# (errors grow like the condition number) and a Cholesky factor is used instead
+TOEPLITZ_MIN_ERROR_RATIO = 1e-4
+
+# Jitter added to the inducing point kernel matrix, relative to sigma
+INDUCING_JITTER = 1e-6
+
+# Default memory bound for FACTOR_CACHE, in bytes (eight n = 2000 Cholesky factors)
+FACTOR_CACHE_BYTES = 2**28
+
+
+def std_periodic(X, X2, sigma, period, lengthscale):
+    ''' Return the standard periodic kernel matrix, as in GPy.kern.StdPeriodic.
+
+    Parameters:
+    ----------
+        X (`float64`) : Inputs [Dim: n x 1] or [Dim: n].
+        X2 (`float64`) : Inputs [Dim: m x 1] or [Dim: m].
+        sigma (`float64`) : Kernel variance.
+        period (`float64`) : Kernel period.
+        lengthscale (`float64`) : Kernel lengthscale.
+
+    Returns:
+    -------
+        K (`float64`) : Kernel matrix [Dim: n x m].
+    '''
+    base = np.pi*(np.ravel(X)[:, np.newaxis] - np.ravel(X2)[np.newaxis, :])/period
+    return sigma*np.exp(-0.5*np.square(np.sin(base)/lengthscale))
+
+
+def jitchol(A, maxtries=5):
+    ''' Return a lower Cholesky factor of A, adding increasing diagonal jitter
+    if A is not numerically positive definite (as GPy.util.linalg.jitchol).
+    '''
+    try:
+        return sla.cholesky(A, lower=True)
+    except sla.LinAlgError:
+        jitter = np.mean(np.diag(A))*1e-6
+        for idx_try in xrange(maxtries):
+            try:
+                return sla.cholesky(A + jitter*np.eye(A.shape[0]), lower=True)
+            except sla.LinAlgError:
+                jitter *= 10.0
+        raise sla.LinAlgError("Kernel matrix is not positive definite, even with jitter")
+
+
+def uniform_grid_spacing(X, tol=UNIFORM_GRID_TOL):
+    ''' Return spacing h if inputs are X[0] + h * arange(n) with h > 0 (within
+    relative tolerance tol), else None.
+    '''
+    X = np.ravel(X)
+    if X.shape[0] < 2:
+        return None
+    spacings = np.diff(X.astype(np.float64))
+    h = spacings[0]
+    if h <= 0 or np.max(np.abs(spacings - h)) > tol*h:
+        return None
+    return h
+
+
+def durbin(c):
+    ''' Return Gohberg-Semencul generators and log determinant of a symmetric
+    positive definite Toeplitz matrix T with first column c, by Durbin's
+    recursion in O(n**2). T^-1 = (A A^T - B B^T) / E, where A, B are lower
+    triangular Toeplitz matrices with first columns a, b.
+
+    Parameters:
+    ----------
+        c (`float64`) : First column of T [Dim: n].
+
+    Returns:
+    -------
+        a (`float64`) : First column of A, [1, -phi] for the order n - 1
+            predictor phi [Dim: n].
+        b (`float64`) : First column of B, [0, a[n-1], ..., a[1]] [Dim: n].
+        E (`float64`) : Prediction error variance of order n - 1.
+        log_det (`float64`) : Log determinant of T.
+
+    Raises:
+    ------
+        LinAlgError : T is not numerically positive definite.
+    '''
+    n = c.shape[0]
+    phi = np.zeros(n - 1)
+    E = c[0]
+    if E <= 0:
+        raise sla.LinAlgError("Toeplitz matrix is not positive definite")
+    log_det = np.log(E)
+
+    for k in xrange(1, n):
+        kappa = (c[k] - np.dot(phi[:k-1], c[k-1:0:-1])) / E
+        if k > 1:
+            phi[:k-1] = phi[:k-1] - kappa*phi[k-2::-1]
+        phi[k-1] = kappa
+        E *= (1.0 - kappa**2)
+        if E <= 0:
+            raise sla.LinAlgError("Toeplitz matrix is not positive definite")
+        log_det += np.log(E)
+
+    a = np.concatenate([[1.0], -phi])
+    b = np.concatenate([[0.0], a[:0:-1]])
+    return a, b, E, log_det
+
+
+def _lower_toeplitz_dot(fft_u, Z, nfft):
+    ''' Return L(u) Z, for lower triangular Toeplitz L(u) with first column u,
+    given fft_u = rfft(u, nfft) [Dim Z: n x m]. [Helper Function]'''
+    n = Z.shape[0]
+    return np.fft.irfft(fft_u[:, np.newaxis]*np.fft.rfft(Z, nfft, axis=0), nfft, axis=0)[:n]
+
+
+def toeplitz_inv_apply(a, b, E, B):
+    ''' Return T^-1 B from Gohberg-Semencul generators of T (see durbin), in
+    O(n log n) per column of B.
+
+    Parameters:
+    ----------
+        a, b, E : As returned by durbin.
+        B (`float64`) : Right hand side [Dim: n] or [Dim: n x m].
+
+    Returns:
+    -------
+        X (`float64`) : Solution of T X = B, of the same shape as B.
+    '''
+    B = np.asarray(B, dtype=np.float64)
+    Z = B.reshape(B.shape[0], -1)
+    nfft = 2*Z.shape[0]
+    fft_a = np.fft.rfft(a, nfft)
+    fft_b = np.fft.rfft(b, nfft)
+
+    # L(u)^T Z = J L(u) J Z, for exchange matrix J
+    AtZ = _lower_toeplitz_dot(fft_a, Z[::-1], nfft)[::-1]
+    BtZ = _lower_toeplitz_dot(fft_b, Z[::-1], nfft)[::-1]
+    X = (_lower_toeplitz_dot(fft_a, AtZ, nfft) - _lower_toeplitz_dot(fft_b, BtZ, nfft)) / E
+    return X.reshape(B.shape)
+
+
+def _toeplitz_inv_diagonal_sums(a, b, E):
+    ''' Return w[k] = sum_i T^-1[i, i + k] from Gohberg-Semencul generators of T,
+    using sum_i (L(u) L(u)^T)[i, i + k] = sum_p (n - k - p) u[p] u[p + k].
+    [Helper Function]'''
+    n = a.shape[0]
+    lags = np.arange(n)
+    w = np.zeros(n)
+    for u, sign in [(a, 1.0), (b, -1.0)]:
+        w += sign*((n - lags)*_autocorrelation(u, u) - _autocorrelation(lags*u, u))
+    return w / E
+
+
+def _autocorrelation(u, v):
+    ''' Return r[k] = sum_p u[p] v[p + k] for 0 <= k < n, by FFT. [Helper Function]'''
+    n = u.shape[0]
+    nfft = 2*n
+    return np.fft.irfft(np.conj(np.fft.rfft(u, nfft))*np.fft.rfft(v, nfft), nfft)[:n]
+
+
+def fingerprint(X):
+    ''' Return a hashable fingerprint (shape, SHA-1 digest) of an input array. '''
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    return X.shape, hashlib.sha1(X.tobytes()).hexdigest()
+
+
+class FactorCache(object):
+    ''' Memory bounded LRU cache of factorisations of K + R I, as returned by
+    GPR_Periodic._factorise.
+
+    Attributes:
+    ----------
+        max_bytes (`int`) : Memory bound on stored factorisations, in bytes.
+        nbytes (`int`) : Memory used by stored factorisations, in bytes.
+        hits (`int`) : Number of successful look ups.
+        misses (`int`) : Number of unsuccessful look ups.
+
+    Methods:
+    -------
+        get : Return the factorisation stored under key, or None.
+        put : Store a factorisation under key, evicting least recently used entries.
+        clear : Remove all entries.
+    '''
+
+    def __init__(self, max_bytes=FACTOR_CACHE_BYTES):
+        '''Initiates a FactorCache class instance. '''
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+
+    def get(self, key):
+        ''' Return the factorisation stored under key, or None. '''
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        factor, nbytes = self._entries.pop(key)
+        self._entries[key] = (factor, nbytes) # most recently used
+        return factor
+
+
+    def put(self, key, factor):
+        ''' Store a factorisation under key, evicting least recently used entries
+        to stay within max_bytes. Factorisations larger than max_bytes are not stored.
+        '''
+        nbytes = sum([item.nbytes for item in _factor_arrays(factor)])
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+        if nbytes > self.max_bytes:
+            return
+        while self.nbytes + nbytes > self.max_bytes:
+            self.nbytes -= self._entries.popitem(last=False)[1][1]
+        self._entries[key] = (factor, nbytes)
+        self.nbytes += nbytes
+
+
+    def clear(self):
+        ''' Remove all entries. '''
+        self._entries.clear()
+        self.nbytes = 0
+
+
+def _factor_arrays(factor):
+    ''' Return arrays held by a factorisation of K + R I. [Helper Function]'''
+    if factor[0] == 'Toeplitz':
+        return factor[1][0:2]
+    return (factor[1],)
+
+
+# Cache shared by GPR models in this process
+FACTOR_CACHE = FactorCache()
+
+
+def _kernel_gradient(dL_dK, base, sigma, period, lengthscale):
+    ''' Return gradient of a scalar with respect to [sigma, period, lengthscale]
+    of std_periodic, given its gradient dL_dK with respect to kernel entries
+    with scaled separations base = pi * (x - x') / period. [Helper Function]'''
+    sin_base = np.sin(base)
+    exp_dist = np.exp(-0.5*np.square(sin_base/lengthscale))
+    dL_dK_f = dL_dK*sigma*exp_dist
+    return np.array([np.sum(dL_dK*exp_dist),
+                     np.sum(dL_dK_f*sin_base*np.cos(base)*base)/(lengthscale**2 * period),
+                     np.sum(dL_dK_f*np.square(sin_base))/(lengthscale**3)])
+
+
+def _logistic(x, upper):
+    ''' Map x in R to (0, upper), as GPy Logistic constraint. [Helper Function]'''
+    return upper*expit(x)
+
+
+def _logistic_inv(f, upper):
+    ''' Inverse of _logistic. [Helper Function]'''
+    f = np.clip(f, 1e-12*upper, (1.0 - 1e-12)*upper)
+    return np.log(f) - np.log(upper - f)
+
+
+def _logexp(x):
+    ''' Map x in R to (0, inf), as GPy Logexp constraint. [Helper Function]'''
+    return np.logaddexp(0.0, x)
+
+
+def _logexp_inv(f):
+    ''' Inverse of _logexp. [Helper Function]'''
+    return f + np.log(-np.expm1(-f))
+
+
+class GPR_Periodic(object):
+    ''' Exact GPR model with a standard periodic kernel and zero prior mean.
+
+    Attributes:
+    ----------
+        X (`float64`) : Training inputs [Dim: n].
+        Y (`float64`) : Training measurements [Dim: n].
+        sigma (`float64`) : Kernel variance.
+        R (`float64`) : Measurement noise variance.
+        period (`float64`) : Kernel period.
+        lengthscale (`float64`) : Kernel lengthscale.
+        solver (`str`) : 'Auto' / 'Cholesky' / 'Toeplitz' choice of solver for
+            K + R I. 'Auto' uses 'Toeplitz' if X is a uniform grid.
+        grid_spacing (`float64`) : Spacing of X if X is a uniform grid, else None.
+        cache (`FactorCache`) : Cache of factorisations of K + R I, or None. Not
+            used for intermediate hyper-parameters during optimize().
+
+    Methods:
+    -------
+        params : Return hyper-parameters as [sigma, R, period, lengthscale].
+        set_params : Set hyper-parameters as [sigma, R, period, lengthscale].
+        log_likelihood : Return the log marginal likelihood of Y.
+        log_likelihood_gradient : Return the log marginal likelihood and its gradient.
+        optimize : Maximise the log marginal likelihood over hyper-parameters by L-BFGS-B.
+        predict : Return predictive mean and variance at new inputs.
+    '''
+
+    def __init__(self, X, Y, sigma, R, period, lengthscale, solver='Auto', cache=None):
+        '''Initiates a GPR_Periodic class instance. '''
+
+        self.X = np.asarray(X, dtype=np.float64).ravel()
+        self.Y = np.asarray(Y, dtype=np.float64).ravel()
+        self.solver = solver
+        self.grid_spacing = uniform_grid_spacing(self.X)
+        self.cache = cache
+        self._X_fingerprint = fingerprint(self.X)
+
+        if Solver[solver] == TOEPLITZ and self.grid_spacing is None:
+            raise ValueError("Solver 'Toeplitz' requires uniformly spaced inputs X")
+
+        self.set_params([sigma, R, period, lengthscale])
+
+
+    def params(self):
+        ''' Return hyper-parameters as [sigma, R, period, lengthscale]. '''
+        return [self.sigma, self.R, self.period, self.lengthscale]
+
+
+    def set_params(self, params):
+        ''' Set hyper-parameters as [sigma, R, period, lengthscale]. '''
+        self.sigma, self.R, self.period, self.lengthscale = [float(item) for item in params]
+        self._posterior = None
+
+
+    def _factorise(self):
+        ''' Return factorisation of K + R I: ('Toeplitz', (a, b, E), log_det) if
+        X is a uniform grid and K + R I is numerically positive definite for
+        Durbin's recursion, and ('Cholesky', L, log_det) otherwise. For solver
+        'Auto', the Toeplitz path also requires E >= TOEPLITZ_MIN_ERROR_RATIO * c[0].
+        [Helper Function]
+        '''
+        if self.grid_spacing is not None and Solver[self.solver] != CHOLESKY:
+            c = std_periodic(self.grid_spacing*np.arange(self.X.shape[0]), 0.0,
+                             self.sigma, self.period, self.lengthscale)[:, 0]
+            c[0] += self.R
+            try:
+                a, b, E, log_det = durbin(c)
+                if Solver[self.solver] == TOEPLITZ or E >= TOEPLITZ_MIN_ERROR_RATIO*c[0]:
+                    return ('Toeplitz', (a, b, E), log_det)
+            except sla.LinAlgError:
+                pass # fall back to Cholesky factor with jitter
+
+        K = std_periodic(self.X, self.X, self.sigma, self.period, self.lengthscale)
+        K[np.diag_indices_from(K)] += self.R
+        L = jitchol(K)
+        return ('Cholesky', L, 2.0*np.sum(np.log(np.diag(L))))
+
+
+    def _get_posterior(self):
+        ''' Return factorisation of K + R I and alpha = (K + R I)^-1 Y, computed
+        once per choice of hyper-parameters, or looked up in cache. [Helper Function]
+        '''
+        if self._posterior is None:
+
+            if self.cache is None:
+                factor = self._factorise()
+            else:
+                key = (self._X_fingerprint, self.solver) + tuple(self.params())
+                factor = self.cache.get(key)
+                if factor is None:
+                    factor = self._factorise()
+                    self.cache.put(key, factor)
+
+            self._posterior = (factor, self._solve(factor, self.Y))
+        return self._posterior
+
+
+    @staticmethod
+    def _solve(factor, B):
+        ''' Return (K + R I)^-1 B from a factorisation of K + R I. [Helper Function]'''
+        kind, data = factor[0:2]
+        if kind == 'Toeplitz':
+            return toeplitz_inv_apply(data[0], data[1], data[2], B)
+        return sla.cho_solve((data, True), B)
+
+
+    def log_likelihood(self):
+        ''' Return the log marginal likelihood of Y. '''
+        factor, alpha = self._get_posterior()
+        n = self.Y.shape[0]
+        return -0.5*np.dot(self.Y, alpha) - 0.5*factor[2] - 0.5*n*np.log(2.0*np.pi)
+
+
+    def log_likelihood_gradient(self):
+        ''' Return the log marginal likelihood of Y, and its gradient with respect
+        to [sigma, R, period, lengthscale].
+        '''
+        factor, alpha = self._get_posterior()
+        kind, data = factor[0:2]
+
+        if kind == 'Toeplitz':
+            # dK / dtheta are Toeplitz: sum dlogL / dK over each diagonal, by lag
+            n = alpha.shape[0]
+            multiplicity = np.full(n, 2.0)
+            multiplicity[0] = 1.0
+            dL_dK = 0.5*multiplicity*(_autocorrelation(alpha, alpha) - _toeplitz_inv_diagonal_sums(*data))
+            dL_dR = dL_dK[0]
+            base = np.pi*self.grid_spacing*np.arange(n)/self.period
+        else:
+            # dlogL / dK = 0.5 * (alpha alpha^T - (K + R I)^-1)
+            dL_dK = np.outer(alpha, alpha) - sla.cho_solve((data, True), np.eye(data.shape[0]))
+            dL_dK *= 0.5
+            dL_dR = np.trace(dL_dK)
+            base = np.pi*(self.X[:, np.newaxis] - self.X[np.newaxis, :])/self.period
+
+        gradient = np.zeros(4)
+        gradient[[0, 2, 3]] = _kernel_gradient(dL_dK, base, self.sigma, self.period, self.lengthscale)
+        gradient[1] = dL_dR
+
+        return self.log_likelihood(), gradient
+
+
+    def optimize(self, sigma_bound, R_bound, messages=False, max_iters=MAX_ITERS):
+        ''' Maximise the log marginal likelihood over hyper-parameters by L-BFGS-B,
+        with sigma in (0, sigma_bound), R in (0, R_bound), period > 0 and
+        lengthscale > 0; as GPy with constrain_bounded on sigma and R.
+
+        Parameters:
+        ----------
+            sigma_bound (`float64`) : Maximal bound on kernel variance.
+            R_bound (`float64`) : Maximal bound on measurement noise variance.
+            messages (`Boolean`) : Display optimiser messages. Defaults to False.
+            max_iters (`int`) : Maximum number of iterations. Defaults to MAX_ITERS.
+        '''
+
+        def to_params(x):
+            return [_logistic(x[0], sigma_bound), _logistic(x[1], R_bound), _logexp(x[2]), _logexp(x[3])]
+
+        def objective(x):
+            try:
+                self.set_params(to_params(x))
+                log_lik, gradient = self.log_likelihood_gradient()
+            except (sla.LinAlgError, ValueError):
+                # Not positive definite, or non-finite (e.g. period underflows to 0)
+                return np.inf, np.zeros(4)
+            # Chain rule through constraint transformations
+            dparams_dx = np.array([self.sigma*(1.0 - self.sigma/sigma_bound),
+                                   self.R*(1.0 - self.R/R_bound),
+                                   expit(x[2]),
+                                   expit(x[3])])
+            return -log_lik, -gradient*dparams_dx
+
+        x0 = np.array([_logistic_inv(self.sigma, sigma_bound), _logistic_inv(self.R, R_bound),
+                       _logexp_inv(self.period), _logexp_inv(self.lengthscale)])
+
+        # Intermediate hyper-parameters are not worth caching
+        cache, self.cache = self.cache, None
+        try:
+            x_opt, f_opt, info = fmin_l_bfgs_b(objective, x0, maxiter=max_iters, iprint=0 if messages else -1)
+        finally:
+            self.cache = cache
+        if messages:
+            print("L-BFGS-B:", info['task'], "-log likelihood:", f_opt)
+
+        self.set_params(to_params(x_opt))
+        return self
+
+
+    def predict(self, Xnew):
+        ''' Return predictive mean and variance of noisy measurements at Xnew, in
+        the format of GPy.core.GP.predict.
+
+        Parameters:
+        ----------
+            Xnew (`float64`) : Test inputs [Dim: m x 1] or [Dim: m].
+
+        Returns:
+        -------
+            mean (`float64`) : Predictive mean [Dim: m x 1].
+            var (`float64`) : Predictive variance, including measurement noise [Dim: m x 1].
+        '''
+        factor, alpha = self._get_posterior()
+        K_star = std_periodic(self.X, Xnew, self.sigma, self.period, self.lengthscale)
+        mean = np.dot(K_star.T, alpha)
+        if factor[0] == 'Toeplitz':
+            var = self.sigma - np.sum(K_star*self._solve(factor, K_star), axis=0) + self.R
+        else:
+            v = sla.solve_triangular(factor[1], K_star, lower=True)
+            var = self.sigma - np.sum(v**2, axis=0) + self.R
+        return mean[:, np.newaxis], var[:, np.newaxis]
+
+
+class GPR_Periodic_FITC(GPR_Periodic):
+    ''' Sparse GPR model with a standard periodic kernel, zero prior mean and
+    fixed inducing inputs Z, using the Fully Independent Training Conditional
+    (FITC) approximation: the prior covariance of Y is
+        Q_ff + diag(K_ff - Q_ff) + R I, where Q_ff = K_fu K_uu^-1 K_uf.
+    For n training and m inducing inputs, likelihood, gradient and prediction
+    cost O(n m**2) time and O(n m) memory instead of O(n**3) and O(n**2).
+
+    Attributes:
+    ----------
+        X, Y, sigma, R, period, lengthscale : As in GPR_Periodic.
+        Z (`float64`) : Inducing inputs [Dim: m].
+
+    Methods:
+    -------
+        As in GPR_Periodic.
+    '''
+
+    def __init__(self, X, Y, sigma, R, period, lengthscale, inducing):
+        '''Initiates a GPR_Periodic_FITC class instance.
+
+        Parameters:
+        ----------
+            X, Y, sigma, R, period, lengthscale : As in GPR_Periodic.
+            inducing (`int` or `float64`) : Number of inducing inputs, placed
+                uniformly between the least and greatest training input; or an
+                array of inducing inputs [Dim: m].
+        '''
+
+        self.X = np.asarray(X, dtype=np.float64).ravel()
+        self.Y = np.asarray(Y, dtype=np.float64).ravel()
+        if np.ndim(inducing) == 0:
+            self.Z = np.linspace(np.min(self.X), np.max(self.X), int(inducing))
+        else:
+            self.Z = np.asarray(inducing, dtype=np.float64).ravel()
+        self.cache = None
+        self.set_params([sigma, R, period, lengthscale])
+
+
+    def _get_posterior(self):
+        ''' Return factorisations for the FITC approximation, computed once per
+        choice of hyper-parameters. [Helper Function]
+
+        With K_uu = L_uu L_uu^T, V = L_uu^-1 K_uf and Lam = diag(K_ff - Q_ff) + R,
+        the prior covariance of Y is V^T V + diag(Lam), and by the matrix inversion
+        lemma its inverse and determinant follow from A = I + V Lam^-1 V^T = L_A L_A^T.
+        '''
+        if self._posterior is None:
+            K_uu = std_periodic(self.Z, self.Z, self.sigma, self.period, self.lengthscale)
+            K_uu[np.diag_indices_from(K_uu)] += INDUCING_JITTER*self.sigma
+            L_uu = jitchol(K_uu)
+            K_uf = std_periodic(self.Z, self.X, self.sigma, self.period, self.lengthscale)
+            V = sla.solve_triangular(L_uu, K_uf, lower=True)
+            Lam = np.maximum(self.sigma - np.sum(V**2, axis=0), 0.0) + self.R
+            V_Lam = V / Lam
+            A = np.dot(V_Lam, V.T)
+            A[np.diag_indices_from(A)] += 1.0
+            L_A = jitchol(A)
+            c = sla.solve_triangular(L_A, np.dot(V_Lam, self.Y), lower=True)
+            log_det = np.sum(np.log(Lam)) + 2.0*np.sum(np.log(np.diag(L_A)))
+            self._posterior = (L_uu, V, Lam, L_A, c, log_det)
+        return self._posterior
+
+
+    def log_likelihood(self):
+        ''' Return the FITC log marginal likelihood of Y. '''
+        Lam, L_A, c, log_det = self._get_posterior()[2:]
+        n = self.Y.shape[0]
+        data_fit = np.sum(self.Y**2 / Lam) - np.dot(c, c)
+        return -0.5*data_fit - 0.5*log_det - 0.5*n*np.log(2.0*np.pi)
+
+
+    def log_likelihood_gradient(self):
+        ''' Return the FITC log marginal likelihood of Y, and its gradient with
+        respect to [sigma, R, period, lengthscale].
+        '''
+        L_uu, V, Lam, L_A, c = self._get_posterior()[0:5]
+
+        # With S the prior covariance of Y, alpha = S^-1 Y and M = S^-1 - alpha alpha^T,
+        # dlogL = -0.5 tr(M dS), and dS = dQ_ff + diag(dK_ff - dQ_ff) + dR I
+        V_Lam = V / Lam
+        P = sla.solve_triangular(L_A, V_Lam, lower=True)
+        A_inv_V_Lam = sla.solve_triangular(L_A, P, lower=True, trans='T')
+        alpha = self.Y / Lam - np.dot(V_Lam.T, sla.solve_triangular(L_A, c, lower=True, trans='T'))
+        diag_M = 1.0 / Lam - np.sum(P**2, axis=0) - alpha**2
+
+        # B = K_uu^-1 K_uf; BM_off = B (M - diag(M))
+        B = sla.solve_triangular(L_uu, V, lower=True, trans='T')
+        BM_off = (B / Lam - np.dot(np.dot(B, V_Lam.T), A_inv_V_Lam)
+                  - np.outer(np.dot(B, alpha), alpha) - B*diag_M)
+
+        dL_dK_uf = -BM_off
+        dL_dK_uu = 0.5*np.dot(BM_off, B.T)
+        dL_dK_diag = -0.5*diag_M
+
+        base_uu = np.pi*(self.Z[:, np.newaxis] - self.Z[np.newaxis, :])/self.period
+        base_uf = np.pi*(self.Z[:, np.newaxis] - self.X[np.newaxis, :])/self.period
+
+        gradient = np.zeros(4)
+        gradient[[0, 2, 3]] = (_kernel_gradient(dL_dK_uu, base_uu, self.sigma, self.period, self.lengthscale)
+                               + _kernel_gradient(dL_dK_uf, base_uf, self.sigma, self.period, self.lengthscale))
+        gradient[0] += INDUCING_JITTER*np.trace(dL_dK_uu) + np.sum(dL_dK_diag) # dK_ff / dsigma = 1
+        gradient[1] = np.sum(dL_dK_diag) # dS / dR = I
+
+        return self.log_likelihood(), gradient
+
+
+    def predict(self, Xnew):
+        ''' Return FITC predictive mean and variance of noisy measurements at Xnew,
+        in the format of GPy.core.GP.predict.
+
+        Parameters:
+        ----------
+            Xnew (`float64`) : Test inputs [Dim: m x 1] or [Dim: m].
+
+        Returns:
+        -------
+            mean (`float64`) : Predictive mean [Dim: m x 1].
+            var (`float64`) : Predictive variance, including measurement noise [Dim: m x 1].
+        '''
+        L_uu, V, Lam, L_A, c = self._get_posterior()[0:5]
+        K_us = std_periodic(self.Z, Xnew, self.sigma, self.period, self.lengthscale)
+        v_uu = sla.solve_triangular(L_uu, K_us, lower=True)
+        v_A = sla.solve_triangular(L_A, v_uu, lower=True)
+        mean = np.dot(v_A.T, c)
+        var = self.sigma - np.sum(v_uu**2, axis=0) + np.sum(v_A**2, axis=0) + self.R
+        return mean[:, np.newaxis], var[:, np.newaxis]
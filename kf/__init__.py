@@ -11,6 +11,7 @@
         fast : LKFFB implementation with memoryless Kalman filtering.
         fast_2 : LKFFB implementation leveraging speed of kf.fast (memoryless filtering) but
             retaining some information about state variables.
+        jit : Optional numba compiled time-stepping loops for LKFFB and AKF.
 
     Author: Riddhi Gupta <riddhi.sw@gmail.com>
 '''
@@ -13,14 +13,38 @@ Created on Thu Apr 20 19:20:43 2017
             associated with each LKFFB basis oscillator.
         calc_pred : Return one step ahead predicted observation based on the
             apriori Kalman state.
+        get_trig_table : Return cached cosines and sines of basis oscillator phases
+            at time steps start <= tn < num.
+        calc_harmonic_sum : Return PropForward predictions as a harmonic sum of
+            basis oscillators with learned amplitudes and phases.
         calc_Gamma : Return a vector of noise features in LKFFB.
         get_dynamic_model : Return the dynamic state space model for LKFFB.
+        get_rotation_blocks : Return the 2x2 rotation blocks of the LKFFB dynamic model.
+        rotate_blocks : Return the product of the LKFFB dynamic model, stored as
+            2x2 rotation blocks, with an array.
         propagate_states : Return state propagation using the Kalman dynamic model
             but without a Kalman gain / Bayesian update.
+        propagate_states_block : As propagate_states, applying the dynamic model as
+            2x2 rotation blocks in O(numf^2).
+        propagate_states_zero_gain : Return Kalman state vectors for a sequence of
+            zero gain time steps in closed form.
         calc_z_proj : Return the measured output of a Kalman state, under a linearisable
             measurement model.
         calc_Kalman_Gain : Return the Kalman gain and scalar S for performing state
             updates.
+        calc_Gamma_batch : Return noise features vectors for a stack of LKFFB states.
+        propagate_states_batch : Return state propagation for a stack of LKFFB filters
+            sharing one dynamic model, without a Kalman gain / Bayesian update.
+        calc_Kalman_Gain_batch : Return Kalman gains and scalars S for a stack of
+            LKFFB filters sharing one measurement model.
+        calc_Kalman_Gain_block : As calc_Kalman_Gain, exploiting the sparse linear
+            LKFFB measurement model.
+        init_state_record : Return an empty store for the history of a
+            (twonumf x twonumf) Kalman variable, sized by a recording policy.
+        record_state : Write a (twonumf x twonumf) Kalman variable at time step k
+            into a store, according to a recording policy.
+        state_record_items : Return .npz items for stores of (twonumf x twonumf)
+            Kalman variables, keyed by recording policy.
         one_shot_msmt : Return a single shot qubit measurement, with Born probability
             for measuring an up state specified as p.
         projected_msmt : Return a qubit measurement outcome based on an estimate of relative
@@ -34,10 +58,17 @@ Created on Thu Apr 20 19:20:43 2017
 
 from __future__ import division, print_function, absolute_import
 
+from collections import OrderedDict
+
 import numpy as np
 #import numba as nb
 import numpy.linalg as la
 
+# Memory bound on trig tables kept by get_trig_table, in bytes
+TRIG_TABLE_CACHE_BYTES = 2**26
+_TRIG_TABLE_CACHE = OrderedDict()
+_TRIG_TABLE_CACHE_NBYTES = [0]
+
 
 #@nb.jit(nopython=True)
 def calc_inst_params(x_hat_time_slice):
@@ -97,6 +128,92 @@ def calc_pred(x_hat_series, quantised='No'):
         return projected_msmt(jitter)
 
 
+def get_trig_table(freq_basis_array, Delta_T_Sampling, num, start=0):
+    ''' Return cosines and sines of the phases of each LKFFB basis oscillator at
+    time steps start <= tn < num. Tables are cached by (freq_basis_array,
+    Delta_T_Sampling, num, start), so that repeated runs for the same Experiment
+    skip rebuilding them. Least recently used tables are evicted to keep the cache
+    within TRIG_TABLE_CACHE_BYTES; larger tables are not cached.
+
+    Parameters:
+    ----------
+        freq_basis_array (`float64`): Array containing `numf` number of basis frequencies.
+        Delta_T_Sampling (`float64`): Time interval between measurements.
+        num (`int`): Number of points in msmt_record.
+        start (`int`, optional): First time step in the table. Defaults to 0.
+
+    Returns:
+    -------
+        cosines (`float64`): cos(2*pi*Delta_T_Sampling*tn*freq_basis_array) for
+            tn in range(start, num) [Dim: (num - start) x numf]. Read only.
+        sines (`float64`): sin(2*pi*Delta_T_Sampling*tn*freq_basis_array) for
+            tn in range(start, num) [Dim: (num - start) x numf]. Read only.
+    '''
+    freq_basis_array = np.asarray(freq_basis_array, dtype=np.float64)
+    key = (freq_basis_array.tobytes(), float(Delta_T_Sampling), int(num), int(start))
+
+    if key in _TRIG_TABLE_CACHE:
+        # Move to the end to mark as most recently used
+        table = _TRIG_TABLE_CACHE.pop(key)
+        _TRIG_TABLE_CACHE[key] = table
+        return table
+
+    phases = np.outer(np.arange(start, num), Delta_T_Sampling*freq_basis_array*2*np.pi)
+    cosines = np.cos(phases)
+    sines = np.sin(phases)
+    cosines.flags.writeable = False
+    sines.flags.writeable = False
+
+    nbytes = cosines.nbytes + sines.nbytes
+    if nbytes <= TRIG_TABLE_CACHE_BYTES:
+        while _TRIG_TABLE_CACHE_NBYTES[0] + nbytes > TRIG_TABLE_CACHE_BYTES:
+            evicted = _TRIG_TABLE_CACHE.popitem(last=False)[1]
+            _TRIG_TABLE_CACHE_NBYTES[0] -= evicted[0].nbytes + evicted[1].nbytes
+        _TRIG_TABLE_CACHE[key] = (cosines, sines)
+        _TRIG_TABLE_CACHE_NBYTES[0] += nbytes
+
+    return cosines, sines
+
+
+def calc_harmonic_sum(freq_basis_array, instantA, instantP, Delta_T_Sampling,
+                      phase_correction_noisetraces, num, n_train):
+    ''' Return PropForward predictions as a harmonic sum of LKFFB basis oscillators
+    with learned amplitudes and phases, for all timesteps n_train <= tn < num in
+    one vectorised evaluation.
+
+    The phase correction applies to all basis oscillators except the first.
+    Each cosine is expanded as cos(w*tn)*cos(phi) - sin(w*tn)*sin(phi), using
+    the cached table from get_trig_table.
+
+    Parameters:
+    ----------
+        freq_basis_array (`float64`): Array containing `numf` number of basis frequencies.
+        instantA (`float64`): Instantaneous amplitudes at n_train [Dim: numf].
+            A stack of amplitudes [Dim: batch x numf] is also accepted.
+        instantP (`float64`): Instantaneous phases at n_train [Dim: as instantA].
+        Delta_T_Sampling (`float64`): Time interval between measurements.
+        phase_correction_noisetraces (`float64`): Applies depending on choice of
+            basis and prediction method.
+        num (`int`): Number of points in msmt_record.
+        n_train (`int`): Timestep at which propagation forward begins.
+
+    Returns:
+    -------
+        Propagate_Foward (`float64`): Output predictions. Non-zero only
+            for n_train <= timestep < num [Dim: num], or [Dim: batch x num] for a stack.
+    '''
+    # Only forecast rows of the trig table are required
+    cosines, sines = get_trig_table(freq_basis_array, Delta_T_Sampling, num, start=n_train)
+
+    phase_offsets = np.array(instantP, dtype=np.float64)
+    phase_offsets[..., 1:] += phase_correction_noisetraces # with correction for noise traces
+
+    Propagate_Foward = np.zeros(phase_offsets.shape[:-1] + (num,))
+    Propagate_Foward[..., n_train:] = (np.dot(instantA*np.cos(phase_offsets), cosines.T) -
+                                       np.dot(instantA*np.sin(phase_offsets), sines.T))
+    return Propagate_Foward
+
+
 #@nb.jit(nopython=True)
 def calc_Gamma(x_hat, oe, numf):
     ''' Return a vector of noise features in LKFFB.
@@ -156,11 +273,7 @@ def get_dynamic_model(twonumf, Delta_T_Sampling, freq_basis_array, coswave=-1):
     # twnumf is even so need to add 1 to write over the last element
     index2 = range(1, twonumf+1, 2)
 
-    # dim(diagonals) == numf
-    diagonals = np.cos(Delta_T_Sampling*freq_basis_array*2*np.pi)
-
-    # dim(off-diagonals) == numf
-    off_diagonals = coswave*np.sin(Delta_T_Sampling*freq_basis_array*2*np.pi)
+    diagonals, off_diagonals = get_rotation_blocks(Delta_T_Sampling, freq_basis_array, coswave=coswave)
     a[index, index] = diagonals
     a[index2, index2] = diagonals
     a[index, index2] = off_diagonals
@@ -169,6 +282,53 @@ def get_dynamic_model(twonumf, Delta_T_Sampling, freq_basis_array, coswave=-1):
     return a
 
 
+def get_rotation_blocks(Delta_T_Sampling, freq_basis_array, coswave=-1):
+    '''
+    Return the 2x2 rotation blocks on the diagonal of the LKFFB dynamic model.
+
+    Parameters:
+    ----------
+        Delta_T_Sampling, freq_basis_array, coswave : As defined in get_dynamic_model.
+
+    Returns:
+    -------
+        diagonals (`float64`):  Diagonal elements of each 2x2 block [Dim: numf].
+        off_diagonals (`float64`):  Upper off-diagonal elements of each 2x2 block;
+            the lower off-diagonal element is the negative [Dim: numf].
+    '''
+    # dim(diagonals) == numf
+    diagonals = np.cos(Delta_T_Sampling*freq_basis_array*2*np.pi)
+
+    # dim(off-diagonals) == numf
+    off_diagonals = coswave*np.sin(Delta_T_Sampling*freq_basis_array*2*np.pi)
+
+    return diagonals, off_diagonals
+
+
+def rotate_blocks(rotation_blocks, x):
+    '''Return the product a * x, where a is the LKFFB dynamic model stored as
+    2x2 rotation blocks. Costs O(twonumf) per column of x, instead of O(twonumf^2).
+
+    Parameters:
+    ----------
+        rotation_blocks (`float64`): (diagonals, off_diagonals) as returned by
+            get_rotation_blocks.
+        x (`float64`): Array whose second last axis has length twonumf. Leading
+            axes are treated as a stack [Dim: ... x twonumf x m].
+
+    Returns:
+    -------
+        ax (`float64`): Product a * x, for each member of the stack [Dim: as x].
+    '''
+    diagonals = rotation_blocks[0][:, np.newaxis]
+    off_diagonals = rotation_blocks[1][:, np.newaxis]
+
+    ax = np.empty_like(x)
+    ax[..., ::2, :] = diagonals*x[..., ::2, :] + off_diagonals*x[..., 1::2, :]
+    ax[..., 1::2, :] = diagonals*x[..., 1::2, :] - off_diagonals*x[..., ::2, :]
+    return ax
+
+
 def propagate_states(a, x_hat, P_hat, oe, numf):
     '''Return state propagation using the Kalman dynamic model but without a
           a Kalman gain / Bayesian update.
@@ -196,6 +356,77 @@ def propagate_states(a, x_hat, P_hat, oe, numf):
     return x_hat_apriori, P_hat_apriori, Q
 
 
+def propagate_states_block(rotation_blocks, x_hat, P_hat, oe, numf):
+    '''Return state propagation as in propagate_states, with the dynamic model
+    applied as 2x2 rotation blocks. Costs O(numf^2) rather than O(numf^3) per
+    time step.
+
+    Parameters:
+    ----------
+        rotation_blocks (`float64`): (diagonals, off_diagonals) as returned by
+            get_rotation_blocks.
+        x_hat (`float64`): Kalman state vector (posterior at previous time step).
+            A stack of state vectors [Dim: batch x twonumf x 1] is also accepted.
+        P_hat (`float64`): Kalman state covariance matrix (posterior at previous
+            time step). A stack [Dim: batch x twonumf x twonumf] is also accepted.
+        oe (`float64`): Kalman process noise variance scale.
+        numf (`int`):  Number of Kalman sub-states in LKFFB.
+
+    Returns:
+    -------
+        x_hat_apriori, P_hat_apriori, Q : As defined in propagate_states.
+    '''
+    x_hat_apriori = rotate_blocks(rotation_blocks, x_hat)
+    Gamma = rotate_blocks(rotation_blocks, calc_Gamma_batch(x_hat, oe, numf))
+
+    # Rank one process noise
+    Q = Gamma*np.swapaxes(Gamma, -1, -2)
+
+    # a * P_hat * a.T == (a * (a * P_hat).T).T
+    aP_hat = rotate_blocks(rotation_blocks, P_hat)
+    P_hat_apriori = np.swapaxes(rotate_blocks(rotation_blocks, np.swapaxes(aP_hat, -1, -2)), -1, -2) + Q
+
+    return x_hat_apriori, P_hat_apriori, Q
+
+
+def propagate_states_zero_gain(x_hat, Delta_T_Sampling, freq_basis_array, n_steps):
+    '''Return Kalman state vectors for n_steps time steps of propagation with zero
+    Kalman gain, starting from x_hat.
+
+    The LKFFB dynamic model (coswave=-1) rotates each sub-state by a fixed angle
+    per time step, so m repeated propagations of x_hat rotate it by m times that
+    angle. All n_steps states are evaluated in one vectorised step; no state
+    covariance is propagated.
+
+    Parameters:
+    ----------
+        x_hat (`float64`): Kalman state vector at the last time step with a
+            Bayesian update [Dim: twonumf x 1]. A stack of state vectors
+            [Dim: batch x twonumf x 1] is also accepted.
+        Delta_T_Sampling (`float64`):  Time between measurements.
+        freq_basis_array (`float64`):  Frequency basis for LKFFB.
+        n_steps (`int`): Number of time steps to propagate x_hat forward.
+
+    Returns:
+    -------
+        store_x_hat (`float64`): Kalman state vectors after 1, 2, ..., n_steps time
+            steps [Dim: twonumf x 1 x n_steps], or [Dim: batch x twonumf x 1 x n_steps]
+            for a stack.
+    '''
+    phases = np.outer(Delta_T_Sampling*freq_basis_array*2*np.pi, np.arange(1, n_steps + 1))
+    cosines = np.cos(phases)
+    sines = np.sin(phases)
+
+    x_real = x_hat[..., ::2, :]
+    x_imag = x_hat[..., 1::2, :]
+
+    store_x_hat = np.zeros(x_hat.shape + (n_steps,))
+    store_x_hat[..., ::2, 0, :] = x_real*cosines - x_imag*sines
+    store_x_hat[..., 1::2, 0, :] = x_real*sines + x_imag*cosines
+
+    return store_x_hat
+
+
 def calc_z_proj(h, x_hat_apriori):
     ''' Return the measured output of a Kalman state, under a linearisable
     measurement model.
@@ -276,7 +507,233 @@ def calc_Kalman_Gain(h_, P_hat_apriori, rk, quantised='No', x_hat_apriori=None):
     W = np.dot(P_hat_apriori, h.T)*S_inv
     return W, S
 
-def one_shot_msmt(n=1, p=0.5, num_samples=1):
+def calc_Gamma_batch(x_hat, oe, numf):
+    ''' Return noise features vectors for a stack of LKFFB Kalman states.
+
+    Vectorised equivalent of calc_Gamma applied to each member of the stack.
+
+       Parameters:
+       ----------
+            x_hat (`float64`) : Stack of Kalman state vectors [Dim: batch x twonumf x 1].
+                A single state vector [Dim: twonumf x 1] is also accepted.
+            oe (`float64`) : Kalman process noise variance scale.
+            numf (`int`) : Number of sub-states in the LKFFB.
+
+       Returns:
+       -------
+            Gamma2 (`float64`) : LKFFB process noise features vectors
+                [Dim: batch x twonumf x 1].
+    '''
+    Gamma2 = np.zeros_like(x_hat)
+    scale = np.sqrt(oe**2/ (x_hat[..., ::2, :]**2 + x_hat[..., 1::2, :]**2))
+    Gamma2[..., ::2, :] = x_hat[..., ::2, :]*scale
+    Gamma2[..., 1::2, :] = x_hat[..., 1::2, :]*scale
+    return Gamma2
+
+
+def propagate_states_batch(a, x_hat, P_hat, oe, numf):
+    '''Return state propagation for a stack of LKFFB filters sharing one dynamic
+        model, but without a Kalman gain / Bayesian update.
+
+    Parameters:
+    ----------
+        a (`float64`): Kalman dynamical model, shared by all filters [Dim: twonumf x twonumf].
+        x_hat (`float64`): Stack of Kalman state vectors (posterior at previous
+            time step) [Dim: batch x twonumf x 1].
+        P_hat (`float64`): Stack of Kalman state covariance matrices (posterior at
+            previous time step) [Dim: batch x twonumf x twonumf].
+        oe (`float64`): Kalman process noise variance scale.
+        numf (`int`):  Number of Kalman sub-states in LKFFB.
+
+    Returns:
+    -------
+        x_hat_apriori : Stack of Kalman state vectors (prior at current time step).
+        P_hat_apriori : Stack of Kalman state covariance matrices (prior at current
+            time step).
+        Q : Stack of Kalman process noise covariance matrices.
+    '''
+    x_hat_apriori = np.matmul(a, x_hat)
+    Gamma = np.matmul(a, calc_Gamma_batch(x_hat, oe, numf))
+    Q = Gamma*Gamma.transpose(0, 2, 1)
+    P_hat_apriori = np.matmul(np.matmul(a, P_hat), a.T) + Q
+
+    return x_hat_apriori, P_hat_apriori, Q
+
+
+def calc_Kalman_Gain_batch(h, P_hat_apriori, rk):
+    '''Return Kalman gains and scalars S for a stack of LKFFB filters sharing one
+    linear measurement model.
+
+    Parameters:
+    ----------
+        h (`float64`) : Kalman measurement model [Dim: 1 x twonumf].
+        P_hat_apriori (`float64`) : Stack of Kalman state variance matrices
+            [Dim: batch x twonumf x twonumf].
+        rk (`float64`) : Kalman measurement noise variance scale.
+
+    Returns:
+    -------
+        W : Stack of Kalman gains [Dim: batch x twonumf x 1].
+        S : Stack of intermediary scalars for calculating Kalman gain [Dim: batch x 1 x 1].
+    '''
+    intermediary = np.matmul(P_hat_apriori, h.T)
+    S = np.matmul(h, intermediary) + rk
+
+    S_inv = 1.0/S
+
+    if not np.isfinite(S_inv).all():
+        print("S is not finite")
+        raise RuntimeError
+
+    W = intermediary*S_inv
+    return W, S
+
+
+def calc_Kalman_Gain_block(P_hat_apriori, rk):
+    '''Return the Kalman gain and scalar S as in calc_Kalman_Gain, for the linear
+    LKFFB measurement model h (ones on even indices, zeros elsewhere). Sums over
+    the even columns of P_hat_apriori replace the products with h.
+
+    Parameters:
+    ----------
+        P_hat_apriori (`float64`) : Kalman state variance matrix. A stack
+            [Dim: batch x twonumf x twonumf] is also accepted.
+        rk (`float64`) : Kalman measurement noise variance scale.
+
+    Returns:
+    -------
+        W, S : As defined in calc_Kalman_Gain.
+    '''
+    intermediary = np.sum(P_hat_apriori[..., ::2], axis=-1)[..., np.newaxis]
+    S = np.sum(intermediary[..., ::2, :], axis=-2)[..., np.newaxis] + rk
+
+    S_inv = 1.0/S
+
+    if not np.isfinite(S_inv).all():
+        print("S is not finite")
+        raise RuntimeError
+
+    W = intermediary*S_inv
+    return W, S
+
+
+DENSE, BLOCK = range(2)
+PropagationMode = {
+    "Dense": DENSE,
+    "Block": BLOCK
+}
+
+
+RECORD_NONE, RECORD_DIAGONAL, RECORD_DECIMATED, RECORD_FULL, RECORD_MEMMAP = range(5)
+RecordPolicy = {
+    "None": RECORD_NONE,
+    "Diagonal": RECORD_DIAGONAL,
+    "Decimated": RECORD_DECIMATED,
+    "Full": RECORD_FULL,
+    "Memmap": RECORD_MEMMAP
+}
+
+
+def init_state_record(record_policy_, twonumf, num, record_every=1, record_path=None):
+    '''Return an empty store for the history of a (twonumf x twonumf) Kalman
+    variable (e.g. P_hat, Q), allocating only what the recording policy needs.
+
+    Parameters:
+    ----------
+        record_policy_ (`int`): Value of RecordPolicy. Keys of RecordPolicy are:
+            'None' : Nothing is recorded [Dim: twonumf x twonumf x 0].
+            'Diagonal' : Diagonals only [Dim: twonumf x num].
+            'Decimated' : Every record_every-th time step
+                [Dim: twonumf x twonumf x (num - 1) // record_every + 1].
+            'Full' : Every time step, in memory [Dim: twonumf x twonumf x num].
+            'Memmap' : Every time step, in a memory-mapped .npy file at
+                record_path + '.npy' [Dim: twonumf x twonumf x num].
+        twonumf (`int`): 2*numf.
+        num (`int`): Number of points in msmt_record.
+        record_every (`int`, optional): Decimation factor for 'Decimated'. Defaults to 1.
+        record_path (`str`, optional): Filename, without extension, for 'Memmap'.
+
+    Returns:
+    -------
+        store (`float64`): Zero initialised store for use with record_state.
+    '''
+    if record_policy_ == RECORD_NONE:
+        return np.zeros((twonumf, twonumf, 0))
+
+    if record_policy_ == RECORD_DIAGONAL:
+        return np.zeros((twonumf, num))
+
+    if record_policy_ == RECORD_DECIMATED:
+        return np.zeros((twonumf, twonumf, (num - 1) // record_every + 1))
+
+    if record_policy_ == RECORD_MEMMAP:
+        return np.lib.format.open_memmap(str(record_path)+'.npy', mode='w+',
+                                         dtype=np.float64, shape=(twonumf, twonumf, num))
+
+    return np.zeros((twonumf, twonumf, num))
+
+
+def record_state(store, record_policy_, k, state, record_every=1):
+    '''Write a (twonumf x twonumf) Kalman variable at time step k into a store
+    returned by init_state_record, according to the same recording policy.
+
+    Parameters:
+    ----------
+        store (`float64`): Store returned by init_state_record.
+        record_policy_ (`int`): Value of RecordPolicy used to create store.
+        k (`int`): Time step.
+        state (`float64`): Kalman variable at time step k [Dim: twonumf x twonumf].
+        record_every (`int`, optional): Decimation factor for 'Decimated'. Defaults to 1.
+    '''
+    if record_policy_ == RECORD_NONE:
+        return
+
+    if record_policy_ == RECORD_DIAGONAL:
+        store[:, k] = np.diag(state)
+        return
+
+    if record_policy_ == RECORD_DECIMATED:
+        if k % record_every == 0:
+            store[:, :, k // record_every] = state
+        return
+
+    store[:, :, k] = state
+
+
+def state_record_items(record_policy_, **stores):
+    '''Return .npz items for stores of (twonumf x twonumf) Kalman variables
+    returned by init_state_record, keyed so that each recording policy gives
+    distinct keys:
+        'None', 'Full' : name [Dim: as init_state_record].
+        'Diagonal' : name + '_diagonal' [Dim: twonumf x num].
+        'Decimated' : name + '_decimated' [Dim: twonumf x twonumf x (num - 1) // record_every + 1].
+        'Memmap' : name + '_path', the filename of the flushed .npy memmap; the
+            history itself is not copied into the .npz file.
+    The item 'record_policy' holds the key of RecordPolicy.
+
+    Parameters:
+    ----------
+        record_policy_ (`int`): Value of RecordPolicy used to create stores.
+        stores (`float64`): Stores returned by init_state_record, keyed by name.
+
+    Returns:
+    -------
+        items (`dict`): Keyword arguments for np.savez.
+    '''
+    suffix = {RECORD_DIAGONAL: '_diagonal', RECORD_DECIMATED: '_decimated'}
+    items = {'record_policy': [key for key in RecordPolicy if RecordPolicy[key] == record_policy_][0]}
+
+    for name in stores:
+        if record_policy_ == RECORD_MEMMAP:
+            stores[name].flush()
+            items[name + '_path'] = stores[name].filename
+        else:
+            items[name + suffix.get(record_policy_, '')] = stores[name]
+
+    return items
+
+
+def one_shot_msmt(n=1, p=0.5, num_samples=1, rng=None):
     '''Return a single shot qubit measurement, with Born probaility for measuring an up
         state specified as p.
 
@@ -288,23 +745,26 @@ def one_shot_msmt(n=1, p=0.5, num_samples=1):
             Default set to 0.5.
         num_samples (`int`): Number of samples drawn from binomial distribution.
             Default set to 1.
+        rng (`np.random.RandomState`, optional): Random number stream. If None,
+            draws from the global np.random state.
 
     Returns:
     -------
         Qubit state (`int`):  Return 0 or 1 outcome from a Bernoulli trial.
     '''
-    return np.random.binomial(n,p,size=num_samples)
+    rng = np.random if rng is None else rng
+    return rng.binomial(n,p,size=num_samples)
 
 
-def projected_msmt(jitter):
+def projected_msmt(jitter, rng=None):
     '''Return a qubit measurement outcome based on an estimate of relative stochastic
-    qubit phase under dephasing.'''
+    qubit phase under dephasing. Outcomes are drawn from rng, as in one_shot_msmt.'''
 
     prob_of_msmt = 0.5 + 0.5*np.cos(2.0*jitter)
     quantised_msmt = []
 
     for item in prob_of_msmt:
-        quantised_msmt.append(one_shot_msmt(p=item))
+        quantised_msmt.append(one_shot_msmt(p=item, rng=rng))
 
     return np.array(quantised_msmt).ravel()
 
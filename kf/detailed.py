@@ -21,7 +21,8 @@ import numpy as np
 #import numba as nb
 import numpy.linalg as la
 
-from kf.common import calc_inst_params, calc_pred, calc_Gamma, get_dynamic_model, propagate_states, calc_Kalman_Gain, calc_residuals
+from kf.common import calc_inst_params, calc_harmonic_sum, calc_pred, calc_Gamma, get_dynamic_model, propagate_states, calc_Kalman_Gain, calc_residuals
+from kf.common import RecordPolicy, init_state_record, record_state, state_record_items
 
 
 def makePropForward(freq_basis_array, x_hat, Delta_T_Sampling, phase_correction_noisetraces, num, n_train, numf):
@@ -48,32 +49,23 @@ def makePropForward(freq_basis_array, x_hat, Delta_T_Sampling, phase_correction_
             state x_hat [Dim: numf x num]
     '''
     # Instantaneous Amplitude, Phase and Frequency Calculations
-    # # not optimised as it doesn't concern the loop
     instantA = np.zeros((numf, num))
     instantP = np.zeros((numf, num))
-        ## CALCULATE INSTANTANEOUS PHASE, AMPLITUDE AND FREQUENCY
-    k = 1
-    while (k < num):
-        instantA[:, k], instantP[:, k] = calc_inst_params(x_hat[:, :, k])
-        k = k + 1
+    ## CALCULATE INSTANTANEOUS PHASE, AMPLITUDE AND FREQUENCY
+    # Vectorised over all time steps k >= 1
+    instantA[:, 1:], instantP[:, 1:] = calc_inst_params(x_hat[:, :, 1:])
 
     ## PROPAGATE FORWARD USING HARMONIC SUMS
-    Propagate_Foward = np.zeros((num))
-    instantA_Prediction = instantA[:, n_train]
-    instantP_Prediction = instantP[:, n_train]
-
-    # Using a harmonic sum for propagating the noise
-    tn = 0
-    for tn in range(n_train,num,1):
-        Propagate_Foward[tn] = instantA_Prediction[0]*np.cos((Delta_T_Sampling*tn*freq_basis_array[0]*2*np.pi + instantP_Prediction[0]))
-        Propagate_Foward[tn] += np.sum(instantA_Prediction[1:]*np.cos((Delta_T_Sampling*tn*freq_basis_array[1:]*2*np.pi + instantP_Prediction[1:] + phase_correction_noisetraces))) # with correction for noise traces 
+    Propagate_Foward = calc_harmonic_sum(freq_basis_array, instantA[:, n_train], instantP[:, n_train],
+                                         Delta_T_Sampling, phase_correction_noisetraces, num, n_train)
 
     return Propagate_Foward, instantA, instantP
 
 
 def detailed_kf(descriptor, y_signal, n_train, n_testbefore, n_predict,
                 Delta_T_Sampling, x_hat_initial,P_hat_initial, oekalman, rkalman,
-                freq_basis_array, phase_correction, skip_msmts=1): 
+                freq_basis_array, phase_correction, skip_msmts=1,
+                record_policy="Full", record_every=1, record_path=None): 
     ''' Return LKFFB predictions and spectral amplitude information and save LKFFB analysis
         as .npz file.
     
@@ -120,6 +112,14 @@ def detailed_kf(descriptor, y_signal, n_train, n_testbefore, n_predict,
         skip_msmts ('int'): Allow a non zero Kalman gain for every n-th msmt,
             where skip_msmts == n and skip_msmts=1 implies all measurements
             can have a non-zero gain.
+        record_policy (`str`, optional): 'None' / 'Diagonal' / 'Decimated' / 'Full' /
+            'Memmap' choice for recording the history of P_hat, Q and store_S_Outer_W.
+            See kf.common.init_state_record; saved keys follow
+            kf.common.state_record_items. Defaults to 'Full'.
+        record_every (`int`, optional): Decimation factor for record_policy
+            'Decimated'. Defaults to 1.
+        record_path (`str`, optional): Filename prefix for memory-mapped .npy files
+            for record_policy 'Memmap'. Defaults to descriptor.
 
     Returns:
     --------
@@ -149,7 +149,10 @@ def detailed_kf(descriptor, y_signal, n_train, n_testbefore, n_predict,
     # State Estimation
     x_hat = np.zeros((twonumf, 1, num))
     e_z = np.zeros((1, 1, num))
-    P_hat = np.zeros((twonumf, twonumf, num))
+    record_policy_ = RecordPolicy[record_policy]
+    if record_path is None:
+        record_path = descriptor
+    P_hat = init_state_record(record_policy_, twonumf, num, record_every, str(record_path)+'_P_hat')
 
     # Dynamical Model
     a = get_dynamic_model(twonumf, Delta_T_Sampling, freq_basis_array, coswave=-1)
@@ -161,10 +164,12 @@ def detailed_kf(descriptor, y_signal, n_train, n_testbefore, n_predict,
     # Initial Conditions
     x_hat[:, 0, 0] = x_hat_initial
     diag_indx = range(0, twonumf, 1)
-    P_hat[diag_indx, diag_indx, 0] = P_hat_initial
+    P_hat_k = np.zeros((twonumf, twonumf))
+    P_hat_k[diag_indx, diag_indx] = P_hat_initial
+    record_state(P_hat, record_policy_, 0, P_hat_k, record_every)
 
     # Noise Features
-    Q = np.zeros((twonumf, twonumf, num))
+    Q = init_state_record(record_policy_, twonumf, num, record_every, str(record_path)+'_Q')
     R = np.ones((1, 1, num))
     R[0, 0, :] = rkalman
 
@@ -173,14 +178,15 @@ def detailed_kf(descriptor, y_signal, n_train, n_testbefore, n_predict,
     S_inv = np.zeros((1, 1, num))
     W = np.zeros((twonumf, 1, num))
 
-    store_S_Outer_W = np.zeros((twonumf, twonumf, num))
+    store_S_Outer_W = init_state_record(record_policy_, twonumf, num, record_every, str(record_path)+'_S_Outer_W')
 
     k = 1
     while (k< n_train+1):
 
-        x_hat[:, :, k], P_hat[:, :, k], Q[:, :, k] = propagate_states(a, x_hat[:, :, k-1], P_hat[:, :, k-1], oekalman, numf)
+        x_hat[:, :, k], P_hat_k, Q_k = propagate_states(a, x_hat[:, :, k-1], P_hat_k, oekalman, numf)
+        record_state(Q, record_policy_, k, Q_k, record_every)
 
-        W[:, :, k], S[:, :, k] = calc_Kalman_Gain(h[:, :, k], P_hat[:, :, k], rkalman)
+        W[:, :, k], S[:, :, k] = calc_Kalman_Gain(h[:, :, k], P_hat_k, rkalman)
 
         # Skp Msmts
         if k % skip_msmts != 0:
@@ -190,10 +196,11 @@ def detailed_kf(descriptor, y_signal, n_train, n_testbefore, n_predict,
 
         #print 'Aposteriori Updates'
         x_hat[:, :, k] = x_hat[:, :, k] + W[:, :, k]*e_z[0, 0, k]
-        store_S_Outer_W[:, :, k] = S[:, :, k]*np.outer(W[:, :, k], W[:, :, k].T)
+        record_state(store_S_Outer_W, record_policy_, k, S[:, :, k]*np.outer(W[:, :, k], W[:, :, k].T), record_every)
 
         # For scalar S
-        P_hat[:, :, k] = P_hat[:, :, k] - S[:, :, k]*np.outer(W[:, :, k], W[:, :, k].T)
+        P_hat_k = P_hat_k - S[:, :, k]*np.outer(W[:, :, k], W[:, :, k].T)
+        record_state(P_hat, record_policy_, k, P_hat_k, record_every)
 
         k = k + 1
 
@@ -210,14 +217,11 @@ def detailed_kf(descriptor, y_signal, n_train, n_testbefore, n_predict,
              y_signal=y_signal,
              freq_basis_array=freq_basis_array,
              x_hat=x_hat,
-             P_hat=P_hat,
              a=a,
              h=h,
              z=z,
              e_z=e_z,
              W=W,
-             Q=Q,
-             store_S_Outer_W=store_S_Outer_W,
              S=S,
              instantA=instantA,
              instantP=instantP,
@@ -227,7 +231,9 @@ def detailed_kf(descriptor, y_signal, n_train, n_testbefore, n_predict,
              n_predict=n_predict,
              n_testbefore=n_testbefore,
              skip_msmts=skip_msmts,
+             record_every=record_every,
              Propagate_Foward=Propagate_Foward,
-             phase_correction=phase_correction_noisetraces)
+             phase_correction=phase_correction_noisetraces,
+             **state_record_items(record_policy_, P_hat=P_hat, Q=Q, store_S_Outer_W=store_S_Outer_W))
 
     return predictions, instantA[:, n_train]
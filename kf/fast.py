@@ -19,9 +19,12 @@ import numpy as np
 import numpy.linalg as la
 
 from kf.common import (
-    calc_inst_params, calc_pred, calc_Gamma, get_dynamic_model,
-    propagate_states, calc_Kalman_Gain, calc_residuals
+    calc_inst_params, calc_harmonic_sum, calc_pred, calc_Gamma, get_dynamic_model,
+    propagate_states, calc_Kalman_Gain, calc_residuals,
+    get_rotation_blocks, propagate_states_block, calc_Kalman_Gain_block,
+    PropagationMode, BLOCK, propagate_states_zero_gain
 )
+from kf.jit import Backend, resolve_backend, NUMBA, lkffb_loop
 
 #@nb.jit(nopython=True) 
 def makePropForward(freq_basis_array, x_hat, Delta_T_Sampling, phase_correction_noisetraces, num, n_train, numf):
@@ -51,12 +54,8 @@ def makePropForward(freq_basis_array, x_hat, Delta_T_Sampling, phase_correction_
     instantA, instantP = calc_inst_params(x_hat)
 
     ## PROPAGATE FORWARD USING HARMONIC SUMS
-    Propagate_Foward = np.zeros((num))
-
-    tn = 0
-    for tn in range(n_train, num, 1):
-        Propagate_Foward[tn] = instantA[0]*np.cos((Delta_T_Sampling*tn*freq_basis_array[0]*2*np.pi + instantP[0]))
-        Propagate_Foward[tn] += np.sum(instantA[1:]*np.cos((Delta_T_Sampling*tn*freq_basis_array[1:]*2*np.pi + instantP[1:] + phase_correction_noisetraces))) # with correction for noise traces 
+    Propagate_Foward = calc_harmonic_sum(freq_basis_array, instantA, instantP, Delta_T_Sampling,
+                                         phase_correction_noisetraces, num, n_train)
 
     return Propagate_Foward, instantA, instantP
 
@@ -69,7 +68,7 @@ PredictionMethod = {
 
 def kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0, oe, 
             rk, freq_basis_array, phase_correction=0 ,prediction_method="ZeroGain", 
-            skip_msmts=1, descriptor='Fast_KF_Results'):
+            skip_msmts=1, descriptor='Fast_KF_Results', propagation="Dense", backend="numpy"):
     ''' Return LKFFB predictions and save LKFFB analysis as .npz file.
 
     Parameters:
@@ -92,6 +91,14 @@ def kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0
     skip_msmts : Allow a non zero Kalman gain for every n-th msmt,
             where skip_msmts == n and skip_msmts=1 implies all measurements
             can have a non-zero gain.
+    propagation : 'Dense' / 'Block' choice for state covariance propagation.
+            'Block' applies the dynamic model as 2x2 rotation blocks, and the
+            measurement model as sums over even state indices, in O(numf^2)
+            per time step rather than O(numf^3). Defaults to 'Dense'.
+    backend : 'numpy' / 'numba' choice for filtering up to n_train. 'numba' runs
+            kf.jit.lkffb_loop, which applies the dynamic model as 2x2 rotation
+            blocks, and requires propagation 'Block'. Falls back to 'numpy' if numba
+            is not installed. Defaults to 'numpy'.
 
     Known Information for Filter Design:
     -------------------------------------------------------
@@ -134,10 +141,13 @@ def kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0
         have a real and imaginary parts).
 
     '''
-    return _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0, oe, rk, freq_basis_array, phase_correction, PredictionMethod[prediction_method], skip_msmts, descriptor)
+    if Backend[backend] == NUMBA and PropagationMode[propagation] != BLOCK:
+        raise ValueError("backend 'numba' requires propagation 'Block'")
+
+    return _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0, oe, rk, freq_basis_array, phase_correction, PredictionMethod[prediction_method], skip_msmts, descriptor, PropagationMode[propagation], resolve_backend(backend))
 
 
-def _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0, oe, rk, freq_basis_array, phase_correction, prediction_method_, skip_msmts, descriptor):
+def _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0, oe, rk, freq_basis_array, phase_correction, prediction_method_, skip_msmts, descriptor, propagation_, backend_):
     ''' [Wrapper Function] See kf_2017 docstring for detailed definitions. '''
 
     num = n_train + n_predict
@@ -157,6 +167,7 @@ def _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p
 
     # Dynamical Model
     a = get_dynamic_model(twonumf, Delta_T_Sampling, freq_basis_array, coswave=-1)
+    rotation_blocks = get_rotation_blocks(Delta_T_Sampling, freq_basis_array, coswave=-1)
     
     # Measurement Action
     h = np.zeros((1,twonumf)) 
@@ -180,9 +191,22 @@ def _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p
     
     # Start Filtering
     k = 1
+
+    if backend_ == NUMBA:
+        # Compiled filtering up to n_train; step n_train onwards continues below
+        empty_record = np.zeros((twonumf, twonumf, 0))
+        x_hat, P_hat = lkffb_loop(z, rotation_blocks[0], rotation_blocks[1], x_hat, P_hat,
+                                  float(oe), float(rk), n_train, n_train, skip_msmts,
+                                  store_x_hat[:,0,:], e_z, np.zeros((twonumf, num)), np.zeros(num),
+                                  empty_record, empty_record, empty_record)
+        k = n_train
+
     while (k< num): 
         
-        x_hat_apriori, P_hat_apriori, dumpQ = propagate_states(a, x_hat, P_hat, oe, numf)
+        if propagation_ == BLOCK:
+            x_hat_apriori, P_hat_apriori, dumpQ = propagate_states_block(rotation_blocks, x_hat, P_hat, oe, numf)
+        else:
+            x_hat_apriori, P_hat_apriori, dumpQ = propagate_states(a, x_hat, P_hat, oe, numf)
         
         if prediction_method_ == ZERO_GAIN and k> (n_train):
             # This loop is equivalent to setting the gain to zero 
@@ -193,7 +217,10 @@ def _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p
             k = k+1 
             continue 
         
-        W, S = calc_Kalman_Gain(h, P_hat_apriori, rk)    
+        if propagation_ == BLOCK:
+            W, S = calc_Kalman_Gain_block(P_hat_apriori, rk)
+        else:
+            W, S = calc_Kalman_Gain(h, P_hat_apriori, rk)
         #store_S[:,:, k] = S
         
         #Skip msmts        
@@ -220,6 +247,12 @@ def _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p
             predictions[n_testbefore:] = Propagate_Foward[n_train:]
             
             return predictions
+
+        if prediction_method_ == ZERO_GAIN and (k==n_train):
+            # Zero gain dynamics are pure rotations: all remaining states follow
+            # from x_hat at n_train in closed form, without covariance propagation
+            store_x_hat[:,:,n_train+1:] = propagate_states_zero_gain(x_hat, Delta_T_Sampling, freq_basis_array, num - n_train - 1)
+            break
         
         k=k+1
         
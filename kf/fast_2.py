@@ -12,6 +12,11 @@
             msmt_record via LKFFB and make predictions for timesteps > n_train.
         detailed_kf : Return LKFFB predictions and spectral amplitude information
             and save light LKFFB analysis as .npz file.
+        kf_2017_batch : Return LKFFB predictions for a stack of measurement records,
+            filtered simultaneously under one dynamic model.
+        kf_2017_batch_fork : Return LKFFB predictions for a stack of measurement
+            records under several prediction methods, sharing one filtering run
+            up to n_train.
 
 .. moduleauthor:: Riddhi Gupta <riddhi.sw@gmail.com>
 
@@ -21,9 +26,18 @@ import numpy as np
 import numpy.linalg as la
 
 from kf.common import (
-    calc_inst_params, calc_pred, calc_Gamma, get_dynamic_model,
-    propagate_states, calc_Kalman_Gain, calc_residuals
+    calc_inst_params, calc_harmonic_sum, calc_pred, calc_Gamma, get_dynamic_model,
+    propagate_states, calc_Kalman_Gain, calc_residuals,
+    get_rotation_blocks, propagate_states_block, calc_Kalman_Gain_block,
+    PropagationMode, BLOCK, propagate_states_zero_gain,
+    RecordPolicy, RECORD_NONE, RECORD_FULL, init_state_record, record_state,
+    state_record_items,
+    propagate_states_batch, calc_Kalman_Gain_batch
 )
+from kf.jit import Backend, resolve_backend, NUMPY, NUMBA, lkffb_loop
+
+# Default bound on the number of array elements per chunk of a filtered stack
+BATCH_MAX_ELEMENTS = 2**22
 
 #@nb.jit(nopython=True) 
 def makePropForward(freq_basis_array, x_hat, Delta_T_Sampling, phase_correction_noisetraces, num, n_train, numf):
@@ -53,12 +67,8 @@ def makePropForward(freq_basis_array, x_hat, Delta_T_Sampling, phase_correction_
     instantA, instantP = calc_inst_params(x_hat)
 
     ## PROPAGATE FORWARD USING HARMONIC SUMS
-    Propagate_Foward = np.zeros((num))
-
-    tn = 0
-    for tn in range(n_train, num, 1):
-        Propagate_Foward[tn] = instantA[0]*np.cos((Delta_T_Sampling*tn*freq_basis_array[0]*2*np.pi + instantP[0]))
-        Propagate_Foward[tn] += np.sum(instantA[1:]*np.cos((Delta_T_Sampling*tn*freq_basis_array[1:]*2*np.pi + instantP[1:] + phase_correction_noisetraces))) # with correction for noise traces 
+    Propagate_Foward = calc_harmonic_sum(freq_basis_array, instantA, instantP, Delta_T_Sampling,
+                                         phase_correction_noisetraces, num, n_train)
 
     return Propagate_Foward, instantA, instantP
 
@@ -71,7 +81,9 @@ PredictionMethod = {
 
 def kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0, oe, 
             rk, freq_basis_array, phase_correction=0 ,prediction_method="ZeroGain", 
-            skip_msmts=1, descriptor='Fast_KF_Results', switch_off_save='No', quantised='No'):
+            skip_msmts=1, descriptor='Fast_KF_Results', switch_off_save='No', quantised='No',
+            propagation="Dense", record_policy="Full", record_every=1, record_path=None,
+            backend="numpy"):
     ''' Return LKFFB predictions and save LKFFB analysis as .npz file.
 
     Parameters:
@@ -95,6 +107,23 @@ def kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0
     skip_msmts : Allow a non zero Kalman gain for every n-th msmt,
             where skip_msmts == n and skip_msmts=1 implies all measurements
             can have a non-zero gain.
+    propagation : 'Dense' / 'Block' choice for state covariance propagation.
+            'Block' applies the dynamic model as 2x2 rotation blocks, and the
+            measurement model as sums over even state indices, in O(numf^2)
+            per time step rather than O(numf^3). Defaults to 'Dense'.
+    record_policy : 'None' / 'Diagonal' / 'Decimated' / 'Full' / 'Memmap' choice
+            for recording the history of P_hat, Q and store_S_Outer_W in the .npz
+            output. See kf.common.init_state_record; saved keys follow
+            kf.common.state_record_items. Nothing is recorded if
+            switch_off_save == 'Yes'. Defaults to 'Full'.
+    record_every : Decimation factor for record_policy 'Decimated'. Defaults to 1.
+    record_path : Filename prefix for memory-mapped .npy files for record_policy
+            'Memmap'. Defaults to descriptor.
+    backend : 'numpy' / 'numba' choice for the filtering loop. 'numba' runs
+            kf.jit.lkffb_loop, which applies the dynamic model as 2x2 rotation
+            blocks, and requires propagation 'Block'. 'numpy' is used instead if numba
+            is not installed, if quantised == 'Yes', or for record_policy other
+            than 'None' or 'Full'. Defaults to 'numpy'.
 
     Known Information for Filter Design:
     -------------------------------------------------------
@@ -138,10 +167,13 @@ def kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0
 
     '''
 
-    return _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0, oe, rk, freq_basis_array, phase_correction, PredictionMethod[prediction_method], skip_msmts, descriptor, switch_off_save, quantised)
+    if Backend[backend] == NUMBA and PropagationMode[propagation] != BLOCK:
+        raise ValueError("backend 'numba' requires propagation 'Block'")
+
+    return _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0, oe, rk, freq_basis_array, phase_correction, PredictionMethod[prediction_method], skip_msmts, descriptor, switch_off_save, quantised, PropagationMode[propagation], RecordPolicy[record_policy], record_every, record_path, resolve_backend(backend))
 
 
-def _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0, oe, rk, freq_basis_array, phase_correction, prediction_method_, skip_msmts, descriptor, switch_off_save, quantised):
+def _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0, oe, rk, freq_basis_array, phase_correction, prediction_method_, skip_msmts, descriptor, switch_off_save, quantised, propagation_, record_policy_, record_every, record_path, backend_):
     ''' [Wrapper Function] See kf_2017 docstring for detailed definitions. '''
     num = n_train + n_predict
     numf = len(freq_basis_array)
@@ -160,6 +192,7 @@ def _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p
 
     # Dynamical Model
     a = get_dynamic_model(twonumf, Delta_T_Sampling, freq_basis_array, coswave=-1)
+    rotation_blocks = get_rotation_blocks(Delta_T_Sampling, freq_basis_array, coswave=-1)
 
     # Measurement Action
     h = np.zeros((1,twonumf)) 
@@ -170,33 +203,61 @@ def _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p
     diag_indx = range(0,twonumf,1)
     P_hat[diag_indx, diag_indx] = p0
 
+    # Covariance histories are only allocated as required by record_policy
+    if switch_off_save == 'Yes':
+        record_policy_ = RECORD_NONE
+    if record_path is None:
+        record_path = descriptor
+
     store_x_hat = np.zeros((twonumf,1,num))
-    store_P_hat = np.zeros((twonumf,twonumf,num))
+    store_P_hat = init_state_record(record_policy_, twonumf, num, record_every, str(record_path)+'_P_hat')
     store_x_hat[:,:,0] = x_hat
-    store_P_hat[:,:,0] = P_hat  
+    record_state(store_P_hat, record_policy_, 0, P_hat, record_every)
 
     store_W = np.zeros((twonumf,1,num)) 
-    store_S_Outer_W = np.zeros((twonumf,twonumf,num))
-    store_Q = np.zeros((twonumf,twonumf,num))
+    store_S_Outer_W = init_state_record(record_policy_, twonumf, num, record_every, str(record_path)+'_S_Outer_W')
+    store_Q = init_state_record(record_policy_, twonumf, num, record_every, str(record_path)+'_Q')
     store_S = np.zeros((1,1,num))
     predictions = np.zeros(n_testbefore + n_predict)
     
     # Start Filtering
     k = 1
+
+    if quantised == 'Yes' or record_policy_ not in (RECORD_NONE, RECORD_FULL):
+        backend_ = NUMPY
+
+    if backend_ == NUMBA:
+        # Compiled filtering up to n_train, and through to num for ZeroGain if
+        # covariances are saved. Any remaining steps continue below
+        k = n_train
+        if prediction_method_ == ZERO_GAIN and switch_off_save != 'Yes':
+            k = num
+        x_hat, P_hat = lkffb_loop(z, rotation_blocks[0], rotation_blocks[1], x_hat, P_hat,
+                                  float(oe), float(rk), n_train, k, skip_msmts,
+                                  store_x_hat[:,0,:], e_z, store_W[:,0,:], store_S[0,0,:],
+                                  store_P_hat, store_Q, store_S_Outer_W)
+
     while (k< num): 
         
-        x_hat_apriori, P_hat_apriori, store_Q[:,:, k]= propagate_states(a, x_hat, P_hat, oe, numf)
+        if propagation_ == BLOCK:
+            x_hat_apriori, P_hat_apriori, Q = propagate_states_block(rotation_blocks, x_hat, P_hat, oe, numf)
+        else:
+            x_hat_apriori, P_hat_apriori, Q = propagate_states(a, x_hat, P_hat, oe, numf)
+        record_state(store_Q, record_policy_, k, Q, record_every)
         
         if prediction_method_ == ZERO_GAIN and k> (n_train):
             # This loop is equivalent to setting the gain to zero 
             x_hat = x_hat_apriori
             store_x_hat[:,:,k] = x_hat
             P_hat = P_hat_apriori
-            store_P_hat[:,:,k] = P_hat
+            record_state(store_P_hat, record_policy_, k, P_hat, record_every)
             k = k+1 
             continue 
         
-        W, S = calc_Kalman_Gain(h, P_hat_apriori, rk, quantised=quantised, x_hat_apriori=x_hat_apriori)    
+        if propagation_ == BLOCK and quantised == 'No':
+            W, S = calc_Kalman_Gain_block(P_hat_apriori, rk)
+        else:
+            W, S = calc_Kalman_Gain(h, P_hat_apriori, rk, quantised=quantised, x_hat_apriori=x_hat_apriori)
         store_S[:,:, k] = S
         
         #Skip msmts        
@@ -206,11 +267,11 @@ def _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p
         e_z[k] = calc_residuals(h, x_hat_apriori, z[k], quantised=quantised)
         
         x_hat = x_hat_apriori + W*e_z[k]
-        store_S_Outer_W[:,:,k] = S*np.outer(W,W.T)
+        record_state(store_S_Outer_W, record_policy_, k, S*np.outer(W,W.T), record_every)
         P_hat = P_hat_apriori - S*np.outer(W,W.T) #Equivalent to outer(W, W)
         
         store_x_hat[:,:,k] = x_hat
-        store_P_hat[:,:,k] = P_hat         
+        record_state(store_P_hat, record_policy_, k, P_hat, record_every)
         store_W[:,:,k] = W
 
            
@@ -232,14 +293,11 @@ def _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p
                     y_signal=y_signal,
                     freq_basis_array= freq_basis_array, 
                     x_hat=store_x_hat, 
-                    P_hat=store_P_hat, 
                     a=a,
                     h=h,
                     z=z, 
                     e_z=e_z,
                     W=store_W,
-                    Q=store_Q,
-                    store_S_Outer_W=store_S_Outer_W,
                     S=store_S,
                     instantA=instantA,
                     instantP=instantP,
@@ -249,10 +307,19 @@ def _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p
                     n_predict=n_predict,
                     n_testbefore=n_testbefore,
                     skip_msmts=skip_msmts,
+                    record_every=record_every,
                     Propagate_Foward=Propagate_Foward,
-                    phase_correction=phase_correction)
+                    phase_correction=phase_correction,
+                    **state_record_items(record_policy_, P_hat=store_P_hat, Q=store_Q, store_S_Outer_W=store_S_Outer_W))
             
             return predictions
+
+        if prediction_method_ == ZERO_GAIN and (k==n_train) and switch_off_save == 'Yes':
+            # Zero gain dynamics are pure rotations: all remaining states follow
+            # from x_hat at n_train in closed form. Covariances are not returned
+            # when switch_off_save == 'Yes', so their propagation is skipped
+            store_x_hat[:,:,n_train+1:] = propagate_states_zero_gain(x_hat, Delta_T_Sampling, freq_basis_array, num - n_train - 1)
+            break
         
         k=k+1
         
@@ -266,21 +333,228 @@ def _kf_2017(y_signal, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p
              y_signal=y_signal,
              freq_basis_array= freq_basis_array, 
              x_hat=store_x_hat, 
-             P_hat=store_P_hat, 
              a=a,
              h=h,
              z=z,
              e_z=e_z,
              W=store_W,
-             Q=store_Q,
-             store_S_Outer_W=store_S_Outer_W,
              S=store_S,
              oe=oe, 
              rk=rk,
              n_train=n_train,
              n_predict=n_predict,
              n_testbefore=n_testbefore,
-             skip_msmts=skip_msmts)
+             skip_msmts=skip_msmts,
+             record_every=record_every,
+             **state_record_items(record_policy_, P_hat=store_P_hat, Q=store_Q, store_S_Outer_W=store_S_Outer_W))
     
     return predictions
 
+
+def kf_2017_batch(y_signals, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0, oe,
+                  rk, freq_basis_array, phase_correction=0, prediction_method="ZeroGain",
+                  skip_msmts=1, propagation="Dense", chunk_size=None, return_states='Yes'):
+    ''' Return LKFFB predictions for a stack of measurement records.
+
+    All records share one dynamic model, `a`, and one measurement model, `h`,
+    and every filter in a chunk of the stack is stepped forward at once.
+    Predictions for each record agree with kf_2017 called on that record alone.
+    Output is not saved as a .npz file.
+
+    Parameters:
+    ----------
+    y_signals (`float64`): Stack of measurement records for Kalman Filtering
+        [Dim: batch x num].
+    chunk_size (`int`, optional): Number of records filtered at once. If None,
+        chunks are bounded by BATCH_MAX_ELEMENTS.
+    return_states (`str`, optional): A Yes / No flag to return store_x_hat for
+        the whole stack. Defaults to 'Yes'.
+    All other parameters are as defined in kf_2017. Quantised measurements are
+    not supported.
+
+    Returns:
+    --------
+    predictions (`float64`): Output predictions for each record
+        [Dim: batch x (n_testbefore + n_predict)].
+    store_x_hat (`float64`): Aposteriori state estimates for each record
+        [Dim: batch x twonumf x 1 x num]; None if return_states is 'No'.
+    '''
+
+    return _kf_2017_batch(y_signals, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0, oe, rk, freq_basis_array, phase_correction, PredictionMethod[prediction_method], skip_msmts, PropagationMode[propagation], chunk_size, return_states)
+
+
+def _batch_chunk_size(chunk_size, num, numf):
+    ''' Return chunk_size, or the number of records per chunk such that state
+    histories and covariances of a chunk hold about BATCH_MAX_ELEMENTS elements.
+    [Helper Function]'''
+    if chunk_size is None:
+        twonumf = 2*numf
+        chunk_size = max(1, BATCH_MAX_ELEMENTS // (twonumf*num + 3*twonumf**2 + 2*num))
+    return chunk_size
+
+
+def _kf_2017_batch(y_signals, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0, oe, rk, freq_basis_array, phase_correction, prediction_method_, skip_msmts, propagation_, chunk_size, return_states):
+    ''' [Wrapper Function] See kf_2017_batch docstring for detailed definitions. '''
+
+    batch = len(y_signals)
+    chunk_size = _batch_chunk_size(chunk_size, n_train + n_predict, len(freq_basis_array))
+
+    predictions = np.zeros((batch, n_testbefore + n_predict))
+    store_x_hat = None
+    if return_states == 'Yes':
+        store_x_hat = np.zeros((batch, 2*len(freq_basis_array), 1, n_train + n_predict))
+
+    for start in xrange(0, batch, chunk_size):
+        chunk = slice(start, start + chunk_size)
+        store_x_hat_, x_hat = _train_batch(y_signals[chunk], n_train, n_predict, Delta_T_Sampling, x0, p0, oe, rk, freq_basis_array, skip_msmts, propagation_)
+        predictions[chunk], forecast_states = _forecast_batch(store_x_hat_, x_hat, n_train, n_testbefore, n_predict, Delta_T_Sampling, freq_basis_array, phase_correction, prediction_method_)
+        if store_x_hat is not None:
+            store_x_hat[chunk] = store_x_hat_
+            if forecast_states is not None:
+                store_x_hat[chunk, :, :, n_train+1:] = forecast_states
+
+    return predictions, store_x_hat
+
+
+def kf_2017_batch_fork(y_signals, n_train, n_testbefore, n_predict, Delta_T_Sampling, x0, p0, oe,
+                       rk, freq_basis_array, phase_correction=0, prediction_methods=("ZeroGain", "PropForward"),
+                       skip_msmts=1, propagation="Dense", chunk_size=None):
+    ''' Return LKFFB predictions for a stack of measurement records under several
+    prediction methods.
+
+    LKFFB runs for different prediction methods are identical up to n_train. Here,
+    the stack is filtered once up to n_train and each prediction method forecasts
+    from the shared filter state. Predictions for each method agree with
+    kf_2017_batch called with that method alone.
+
+    Parameters:
+    ----------
+    y_signals (`float64`): Stack of measurement records for Kalman Filtering
+        [Dim: batch x num].
+    prediction_methods (`str`): Sequence of keys of PredictionMethod.
+        Defaults to ("ZeroGain", "PropForward").
+    chunk_size (`int`, optional): Number of records filtered at once. If None,
+        chunks are bounded by BATCH_MAX_ELEMENTS.
+    All other parameters are as defined in kf_2017_batch.
+
+    Returns:
+    --------
+    predictions (`dict`): Output predictions for each record, keyed by prediction
+        method [Dim of each value: batch x (n_testbefore + n_predict)].
+    '''
+
+    batch = len(y_signals)
+    chunk_size = _batch_chunk_size(chunk_size, n_train + n_predict, len(freq_basis_array))
+
+    predictions = {}
+    for prediction_method in prediction_methods:
+        predictions[prediction_method] = np.zeros((batch, n_testbefore + n_predict))
+
+    for start in xrange(0, batch, chunk_size):
+        chunk = slice(start, start + chunk_size)
+        store_x_hat, x_hat = _train_batch(y_signals[chunk], n_train, n_predict, Delta_T_Sampling, x0, p0, oe, rk, freq_basis_array, skip_msmts, PropagationMode[propagation])
+
+        for prediction_method in prediction_methods:
+            # _forecast_batch leaves the shared training states unchanged
+            predictions[prediction_method][chunk] = _forecast_batch(store_x_hat, x_hat, n_train, n_testbefore, n_predict, Delta_T_Sampling, freq_basis_array, phase_correction, PredictionMethod[prediction_method])[0]
+
+    return predictions
+
+
+def _train_batch(y_signals, n_train, n_predict, Delta_T_Sampling, x0, p0, oe, rk, freq_basis_array, skip_msmts, propagation_):
+    ''' Return aposteriori state estimates for a stack of measurement records,
+    filtered up to and including n_train, and the last filtered state estimates.
+    Entries of store_x_hat for timesteps > n_train are zero. If n_predict == 0,
+    records end at n_train - 1 and filtering stops there. '''
+    num = n_train + n_predict
+    numf = len(freq_basis_array)
+    twonumf = int(numf*2.0)
+
+    # Kalman Measurement Data
+    z = np.zeros((len(y_signals), num))
+    z[:, :] = y_signals
+    batch = z.shape[0]
+
+    # State Estimation
+    x_hat = np.zeros((batch, twonumf, 1))
+    e_z = np.zeros((batch, num))
+    P_hat = np.zeros((batch, twonumf, twonumf))
+
+    # Dynamical Model
+    a = get_dynamic_model(twonumf, Delta_T_Sampling, freq_basis_array, coswave=-1)
+    rotation_blocks = get_rotation_blocks(Delta_T_Sampling, freq_basis_array, coswave=-1)
+
+    # Measurement Action
+    h = np.zeros((1, twonumf))
+    h[0, ::2] = 1.0
+
+    # Initial Conditions
+    x_hat[:, :, 0] = x0
+    diag_indx = range(0, twonumf, 1)
+    P_hat[:, diag_indx, diag_indx] = p0
+
+    store_x_hat = np.zeros((batch, twonumf, 1, num))
+    store_x_hat[:, :, :, 0] = x_hat
+
+    # Start Filtering
+    k = 1
+    while (k < min(n_train + 1, num)):
+
+        if propagation_ == BLOCK:
+            x_hat_apriori, P_hat_apriori, dumpQ = propagate_states_block(rotation_blocks, x_hat, P_hat, oe, numf)
+            W, S = calc_Kalman_Gain_block(P_hat_apriori, rk)
+        else:
+            x_hat_apriori, P_hat_apriori, dumpQ = propagate_states_batch(a, x_hat, P_hat, oe, numf)
+            W, S = calc_Kalman_Gain_batch(h, P_hat_apriori, rk)
+
+        #Skip msmts
+        if k % skip_msmts != 0:
+            W = np.zeros((batch, twonumf, 1))
+
+        e_z[:, k] = z[:, k] - np.matmul(h, x_hat_apriori)[:, 0, 0]
+
+        x_hat = x_hat_apriori + W*e_z[:, k, np.newaxis, np.newaxis]
+        P_hat = P_hat_apriori - S*(W*W.transpose(0, 2, 1)) #Equivalent to outer(W, W)
+
+        store_x_hat[:, :, :, k] = x_hat
+
+        k = k + 1
+
+    return store_x_hat, x_hat
+
+
+def _forecast_batch(store_x_hat, x_hat, n_train, n_testbefore, n_predict, Delta_T_Sampling, freq_basis_array, phase_correction, prediction_method_):
+    ''' Return predictions for a stack of records from state estimates filtered up
+    to n_train by _train_batch, and, for ZeroGain, the state estimates for
+    timesteps > n_train [Dim: batch x twonumf x 1 x (n_predict - 1)] (None for
+    PropForward). store_x_hat is not modified. '''
+    num = n_train + n_predict
+    predictions = np.zeros((store_x_hat.shape[0], n_testbefore + n_predict))
+
+    if prediction_method_ == PROP_FORWARD:
+
+        # We use previous state estimates to "predict" for n < n_train
+        predictions[:, 0:n_testbefore] = np.sum(store_x_hat[:, ::2, 0, n_train-n_testbefore:n_train], axis=1)
+
+        if n_predict > 0:
+            # Propagation forward is initiated at n_train for all records
+            instantA, instantP = calc_inst_params(x_hat.transpose(1, 2, 0))
+            Propagate_Foward = calc_harmonic_sum(freq_basis_array, instantA.T, instantP.T, Delta_T_Sampling, phase_correction, num, n_train)
+            # We use Prop Forward to "forecast" for n> n_train
+            predictions[:, n_testbefore:] = Propagate_Foward[:, n_train:]
+
+        return predictions, None
+
+    # We use filtered state estimates up to n_train (or to the end of short records)
+    n_filtered = min(n_train + 1, num) - (n_train - n_testbefore)
+    predictions[:, 0:n_filtered] = np.sum(store_x_hat[:, ::2, 0, n_train-n_testbefore:n_train-n_testbefore+n_filtered], axis=1)
+
+    if n_predict < 2:
+        return predictions, None
+
+    # Zero gain dynamics are pure rotations: all remaining states follow
+    # from x_hat at n_train in closed form, without covariance propagation
+    forecast_states = propagate_states_zero_gain(x_hat, Delta_T_Sampling, freq_basis_array, num - n_train - 1)
+    predictions[:, n_filtered:] = np.sum(forecast_states[:, ::2, 0, :], axis=1)
+
+    return predictions, forecast_states
@@ -0,0 +1,247 @@
+'''
+.. module:: kf.jit
+
+    :synopsis: Optional numba compiled time-stepping loops for LKFFB (kf.fast,
+        kf.fast_2) and AKF (akf.armakf). Kernels are selected by a `backend`
+        choice of 'numpy' or 'numba'; if numba is not installed, the 'numpy'
+        implementation is used instead.
+
+    Module Level Functions:
+    ----------------------
+        resolve_backend : Return the backend which will be used for a requested
+            backend, falling back to 'numpy' if numba is not installed.
+        lkffb_loop : Run LKFFB filtering and zero gain propagation in one
+            compiled loop.
+        akf_loop : Run AKF filtering and zero gain propagation in one compiled loop.
+
+.. moduleauthor:: Riddhi Gupta <riddhi.sw@gmail.com>
+
+'''
+
+from __future__ import division, print_function, absolute_import
+
+import warnings
+
+import numpy as np
+
+try:
+    import numba as nb
+    NUMBA_AVAILABLE = True
+except ImportError:
+    nb = None
+    NUMBA_AVAILABLE = False
+
+NUMPY, NUMBA = range(2)
+Backend = {
+    "numpy": NUMPY,
+    "numba": NUMBA
+}
+
+def resolve_backend(backend):
+    ''' Return the backend which will be used for a requested backend, falling
+    back to 'numpy' with a RuntimeWarning if numba is not installed.
+
+    Parameters:
+    ----------
+        backend (`str`): 'numpy' / 'numba' choice for Kalman time-stepping loops.
+
+    Returns:
+    -------
+        backend_ (`int`): Value of Backend to be used.
+    '''
+    backend_ = Backend[backend]
+
+    if backend_ == NUMBA and not NUMBA_AVAILABLE:
+        warnings.warn("numba is not installed; backend 'numpy' is used instead",
+                      RuntimeWarning, stacklevel=3)
+        return NUMPY
+
+    return backend_
+
+
+def jit(func):
+    ''' Return func compiled in nopython mode if numba is installed, else func. '''
+    if NUMBA_AVAILABLE:
+        return nb.njit(cache=True)(func)
+    return func
+
+
+@jit
+def _rotate_blocks(diagonals, off_diagonals, x):
+    ''' Return a * x for the LKFFB dynamic model a, stored as 2x2 rotation blocks
+    (see kf.common.get_rotation_blocks) [Dim x: twonumf x m]. '''
+    out = np.empty_like(x)
+    for idx_f in range(diagonals.shape[0]):
+        even = 2*idx_f
+        odd = even + 1
+        for col in range(x.shape[1]):
+            out[even, col] = diagonals[idx_f]*x[even, col] + off_diagonals[idx_f]*x[odd, col]
+            out[odd, col] = -off_diagonals[idx_f]*x[even, col] + diagonals[idx_f]*x[odd, col]
+    return out
+
+
+@jit
+def lkffb_loop(z, diagonals, off_diagonals, x_hat, P_hat, oe, rk, n_train, n_stop,
+               skip_msmts, store_x_hat, e_z, store_W, store_S, store_P_hat, store_Q,
+               store_S_Outer_W):
+    ''' Run LKFFB filtering for time steps 1 <= k <= n_train, and zero gain
+    propagation for n_train < k < n_stop, in one compiled loop. The dynamic model
+    is applied as 2x2 rotation blocks and the measurement model sums even state
+    indices, as for propagation 'Block' in kf.fast.kf_2017.
+
+    Parameters:
+    ----------
+        z (`float64`): Measurement record [Dim: num].
+        diagonals, off_diagonals (`float64`): As returned by
+            kf.common.get_rotation_blocks [Dim: numf].
+        x_hat (`float64`): Initial state estimate [Dim: twonumf x 1].
+        P_hat (`float64`): Initial state covariance estimate [Dim: twonumf x twonumf].
+        oe (`float64`): Kalman process noise variance scale.
+        rk (`float64`): Kalman measurement noise variance scale.
+        n_train (`int`): Last time step with a non-zero Kalman gain.
+        n_stop (`int`): Time step at which the loop stops.
+        skip_msmts (`int`): Allow a non zero Kalman gain for every n-th msmt.
+        store_x_hat (`float64`): Written in place [Dim: twonumf x num].
+        e_z (`float64`): Residuals, written in place [Dim: num].
+        store_W (`float64`): Kalman gains, written in place [Dim: twonumf x num].
+        store_S (`float64`): Scalars S, written in place [Dim: num].
+        store_P_hat, store_Q, store_S_Outer_W (`float64`): Covariance histories,
+            written in place [Dim: twonumf x twonumf x num], or not written if
+            [Dim: twonumf x twonumf x 0].
+
+    Returns:
+    -------
+        x_hat (`float64`): State estimate at n_stop - 1 [Dim: twonumf x 1].
+        P_hat (`float64`): State covariance estimate at n_stop - 1
+            [Dim: twonumf x twonumf].
+    '''
+    twonumf = x_hat.shape[0]
+    record = store_P_hat.shape[2] > 0
+    Gamma2 = np.zeros((twonumf, 1))
+    W = np.zeros(twonumf)
+
+    for k in range(1, n_stop):
+
+        x_hat_apriori = _rotate_blocks(diagonals, off_diagonals, x_hat)
+
+        for even in range(0, twonumf, 2):
+            scale = np.sqrt(oe**2/(x_hat[even, 0]**2 + x_hat[even + 1, 0]**2))
+            Gamma2[even, 0] = x_hat[even, 0]*scale
+            Gamma2[even + 1, 0] = x_hat[even + 1, 0]*scale
+        Gamma = _rotate_blocks(diagonals, off_diagonals, Gamma2)
+        Q = np.outer(Gamma[:, 0], Gamma[:, 0])
+
+        aP = _rotate_blocks(diagonals, off_diagonals, P_hat)
+        P_hat_apriori = _rotate_blocks(diagonals, off_diagonals, aP.T.copy()).T + Q
+
+        if record:
+            store_Q[:, :, k] = Q
+
+        if k > n_train:
+            # This loop is equivalent to setting the gain to zero
+            x_hat = x_hat_apriori
+            P_hat = P_hat_apriori
+            store_x_hat[:, k] = x_hat[:, 0]
+            if record:
+                store_P_hat[:, :, k] = P_hat
+            continue
+
+        S = rk
+        for row in range(twonumf):
+            W[row] = 0.0
+            for even in range(0, twonumf, 2):
+                W[row] += P_hat_apriori[row, even]
+        for even in range(0, twonumf, 2):
+            S += W[even]
+
+        if not np.isfinite(1.0/S):
+            raise RuntimeError("S is not finite")
+
+        W = W*(1.0/S)
+
+        # Skip msmts
+        if k % skip_msmts != 0:
+            W = np.zeros(twonumf)
+
+        z_proj = 0.0
+        for even in range(0, twonumf, 2):
+            z_proj += x_hat_apriori[even, 0]
+        e_z[k] = z[k] - z_proj
+
+        S_Outer_W = S*np.outer(W, W)
+        x_hat = x_hat_apriori + W.reshape((twonumf, 1))*e_z[k]
+        P_hat = P_hat_apriori - S_Outer_W
+
+        store_x_hat[:, k] = x_hat[:, 0]
+        store_W[:, k] = W
+        store_S[k] = S
+        if record:
+            store_P_hat[:, :, k] = P_hat
+            store_S_Outer_W[:, :, k] = S_Outer_W
+
+    return x_hat, P_hat
+
+
+@jit
+def akf_loop(y_signal, a, Q, x_hat, P_hat, rk, n_train, skip_msmts, store_x_hat,
+             store_P_hat, store_W, store_S, store_S_Outer_W, e_z):
+    ''' Run AKF filtering for time steps order <= k <= n_train, and zero gain
+    propagation for k > n_train, in one compiled loop, as in akf.armakf.autokf
+    with quantised == 'No'.
+
+    Parameters:
+    ----------
+        y_signal (`float64`): Measurement record [Dim: num].
+        a (`float64`): State space dynamics for AR(q) process [Dim: order x order].
+        Q (`float64`): Kalman process noise variance [Dim: order x order].
+        x_hat (`float64`): Initial state estimate [Dim: order x 1].
+        P_hat (`float64`): Initial state covariance estimate [Dim: order x order].
+        rk (`float64`): Kalman measurement noise variance scale.
+        n_train (`int`): Last time step with a non-zero Kalman gain.
+        skip_msmts (`int`): Allow a non zero Kalman gain for every n-th msmt.
+        store_x_hat (`float64`): Written in place [Dim: order x num].
+        store_P_hat, store_S_Outer_W (`float64`): Written in place
+            [Dim: order x order x num].
+        store_W (`float64`): Kalman gains, written in place [Dim: order x num].
+        store_S (`float64`): Scalars S, written in place [Dim: num].
+        e_z (`float64`): Residuals, written in place [Dim: num].
+    '''
+    order = x_hat.shape[0]
+    num = y_signal.shape[0]
+
+    for k in range(order, num):
+
+        x_hat_apriori = np.dot(a, x_hat)
+        P_hat_apriori = np.dot(np.dot(a, P_hat), a.T) + Q
+
+        if k > n_train:
+            # This loop is equivalent to setting the gain to zero (forecasting)
+            x_hat = x_hat_apriori
+            P_hat = P_hat_apriori
+            store_x_hat[:, k] = x_hat[:, 0]
+            store_P_hat[:, :, k] = P_hat
+            continue
+
+        # The AKF measurement model picks off the first state, h = (1, 0, ..., 0)
+        S = P_hat_apriori[0, 0] + rk
+
+        if not np.isfinite(1.0/S):
+            raise RuntimeError("S is not finite")
+
+        W = P_hat_apriori[:, 0]*(1.0/S)
+        store_S[k] = S
+
+        # Skip msmts
+        if k % skip_msmts != 0:
+            W = np.zeros(order)
+
+        e_z[k] = y_signal[k] - x_hat_apriori[0, 0]
+
+        S_Outer_W = S*np.outer(W, W)
+        x_hat = x_hat_apriori + W.reshape((order, 1))*e_z[k]
+        P_hat = P_hat_apriori - S_Outer_W
+
+        store_x_hat[:, k] = x_hat[:, 0]
+        store_P_hat[:, :, k] = P_hat
+        store_S_Outer_W[:, :, k] = S_Outer_W
+        store_W[:, k] = W
@@ -24,8 +24,9 @@ from ls import statePredictions as sp
 
 from data_tools.load_raw_cluster_data import LoadExperiment as le
 from data_tools.data_risk_analysis import sort_my_vals
-from ls.common import doLSF_forecast
+from ls.common import doLSF_forecast, fit_lsf, Solver, GRADIENT_DESCENT
 from data_tools.common import get_data
+from analysis_tools.rng import get_rng
 
 
 class LSF_Optimisation(object):
@@ -49,6 +50,14 @@ class LSF_Optimisation(object):
         LSF_alpha_iter (`int`) : Defaults to 50. [DEPRECIATED]
         LSF_ensembl_size (`int`, optional) : Number of different noise realisations in
             ensemble for LSF analysis. Defaults to 50.
+        LSF_solver (`str`, optional) : 'GradientDescent', 'Lstsq' or 'Cholesky'
+            choice of solver for LSF weights, see ls.common.Solver. Closed form
+            solvers do not require alpha_0 tuning. Defaults to 'GradientDescent'.
+        LSF_ridge (`float64`, optional) : Ridge regularisation for closed form
+            solvers. Defaults to 0.0.
+        LSF_joint (`str`, optional) : 'Yes' fits all n-step ahead models jointly
+            in make_LS_Ensemble_data, for closed form solvers (see
+            ls.common.doLSF_forecast). Defaults to 'No'.
 
     Methods:
     -------
@@ -62,7 +71,8 @@ class LSF_Optimisation(object):
     '''
 
     def __init__(self, test_case, variation, LSF_past_msmts, LSF_steps_forward, datapath,
-                LSF_steps_between_msmts=1, LSF_iter=50, LSF_alpha_iter=50, ensembl_size=50):
+                LSF_steps_between_msmts=1, LSF_iter=50, LSF_alpha_iter=50, ensembl_size=50,
+                LSF_solver='GradientDescent', LSF_ridge=0.0, LSF_joint='No'):
 
         self.dataobject = le(test_case, variation,
                              GPRP_load='No',
@@ -78,6 +88,9 @@ class LSF_Optimisation(object):
         self.LSF_steps_between_msmts = LSF_steps_between_msmts
         self.LSF_err_train_iter = LSF_iter
         self.LSF_ensembl_size = ensembl_size
+        self.LSF_solver = LSF_solver
+        self.LSF_ridge = LSF_ridge
+        self.LSF_joint = LSF_joint
 
 
     def loss_lsf(self, try_alpha0, user_msmt_train=0):
@@ -115,7 +128,8 @@ class LSF_Optimisation(object):
                                                   steps_forward=self.LSF_steps_forward,
                                                   steps_between_msmts=self.LSF_steps_between_msmts)
 
-        weights, errorTrain = sp.gradient_descent(training_data, self.LSF_err_train_iter, alpha_coeff=try_alpha0)
+        weights, errorTrain = fit_lsf(training_data[:, 0], training_data[:, 1:], self.LSF_err_train_iter, try_alpha0,
+                                      solver=self.LSF_solver, ridge=self.LSF_ridge)
 
         # Based on the last value of err train (not gradient estimate of error train)
         lossval = errorTrain[-1] 
@@ -130,6 +144,10 @@ class LSF_Optimisation(object):
 
         '''Return lowest loss alpha_0 from arr_alphas.
 
+        For closed form solvers (LSF_solver != 'GradientDescent'), alpha_0 has
+        no effect: LSF is trained once, and the result is returned for all
+        candidates with arr_alphas[0] as the optimal alpha.
+
         Parameters:
         ----------
 
@@ -154,6 +172,10 @@ class LSF_Optimisation(object):
         # use only one dataset for training
         measurements_train = get_data(self.dataobject)[0]
 
+        if Solver[self.LSF_solver] != GRADIENT_DESCENT:
+            lossvalTrain[:], errTrains[:, :], weightTrain[:, :] = self.loss_lsf(arr_alphas[0], user_msmt_train=measurements_train)
+            return arr_alphas[0], np.arange(iter_), lossvalTrain, errTrains, weightTrain
+
         for idx in xrange(iter_):
            lossvalTrain[idx], errTrains[idx, :], weightTrain[idx, :] = self.loss_lsf(arr_alphas[idx], user_msmt_train=measurements_train)
 
@@ -166,7 +188,7 @@ class LSF_Optimisation(object):
 
 
 
-    def make_LS_Ensemble_data(self, pick_alpha0, savetopath, num_of_iterGD=50):
+    def make_LS_Ensemble_data(self, pick_alpha0, savetopath, num_of_iterGD=50, rng_seed=None):
         '''
         Saves LSF predictions analysis as an .npz file. 
 
@@ -176,6 +198,10 @@ class LSF_Optimisation(object):
              savetopath (`str`) : Filepath for saving LSF analysis output as a .npz file.
              num_of_iterGD (`int`, optional) : Number of iterations of gradient descent in LSF.
                 Defaults to 50.
+             rng_seed (`int`, optional) : Seed for reproducible random number streams.
+                Run idx_en draws training and validation data from the stream
+                (rng_seed, (idx_en,)), see analysis_tools.rng. If None, draws from
+                the global np.random state. Defaults to None.
 
         Returns:
         -------
@@ -198,9 +224,10 @@ class LSF_Optimisation(object):
 
 
             # desired implementation in DATA v0
-            measurements_train, pick_train = get_data(self.dataobject)
+            rng = None if rng_seed is None else get_rng(rng_seed, (idx_en,))
+            measurements_train, pick_train = get_data(self.dataobject, rng=rng)
 
-            measurements_val, pick_val = get_data(self.dataobject)
+            measurements_val, pick_val = get_data(self.dataobject, rng=rng)
             shape = self.dataobject.LKFFB_macro_truth.shape
             noisetrace_val = self.dataobject.LKFFB_macro_truth.reshape(shape[0]*shape[1], shape[2])[pick_val, :]      
 
@@ -210,7 +237,10 @@ class LSF_Optimisation(object):
                                     self.LSF_steps_forward,
                                     self.LSF_past_msmts,
                                     steps_between_msmts=self.LSF_steps_between_msmts,
-                                    num_of_iterGD=num_of_iterGD)
+                                    num_of_iterGD=num_of_iterGD,
+                                    solver=self.LSF_solver,
+                                    ridge=self.LSF_ridge,
+                                    joint=self.LSF_joint)
 
             macro_weights.append(output[1])
             macro_predictions.append(output[2])
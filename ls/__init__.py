@@ -8,6 +8,7 @@
                  (statePredictions.py)
         LSF_risk_analysis :  Tunes LSF to appropriate alpha_0 value for LSF algorithm;
             generates predictions.
+        rls : Streaming LSF predictor with recursive least squares weight updates.
         statePredictions_2 : Modified version of `statePredictions` module.
         statePredictions : Least Squares Filter as developed by Virginia Frey and
             Sandeep Mavadia (2016).
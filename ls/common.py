@@ -11,25 +11,165 @@ Created on Thu Apr 20 19:20:43 2017
     ----------------------
         doLSF_forecast :  Return LSF predictions and trained weights given
                 training and validation data.
+        fit_lsf : Return LSF weights and training residuals for a choice of solver.
+        least_squares_fit : Return closed form least squares LSF weights.
+        horizon_targets : Return targets for all n-step ahead LSF models as a view.
 
 .. moduleauthor:: Riddhi Gupta <riddhi.sw@gmail.com>
 '''
 from __future__ import division, print_function, absolute_import
+import warnings
 import numpy as np
+import scipy.linalg as sla
+from numpy.lib.stride_tricks import as_strided
+
+# Solvers for LSF weights
+# 'GradientDescent' is the iterative solver in statePredictions.gradient_descent
+# 'Lstsq' solves the least squares problem via an orthogonal factorisation
+# 'Cholesky' solves the normal equations via a Cholesky factorisation
+GRADIENT_DESCENT, LSTSQ, CHOLESKY = range(3)
+Solver = {
+    "GradientDescent": GRADIENT_DESCENT,
+    "Lstsq": LSTSQ,
+    "Cholesky": CHOLESKY
+}
+
+
+def least_squares_fit(actual_values, past_measurements, numIters, solver='Lstsq', ridge=0.0):
+    ''' Return closed form least squares LSF weights.
+
+    Parameters:
+    ----------
+        actual_values (`float64`) : Target values, as in the first column of
+            statePredictions.build_training_dataset [Dim: n]; or one column of
+            targets per model sharing past_measurements [Dim: n x h].
+        past_measurements (`float64`) : Past measurements, as in the remaining
+            columns of statePredictions.build_training_dataset, or a view from
+            statePredictions.lag_windows [Dim: n x (d - 1)].
+        numIters (`int`) : Length of the returned errorTrain.
+        solver (`str`, optional) : 'Lstsq' or 'Cholesky'. If the normal equations
+            are not positive definite, 'Cholesky' falls back to 'Lstsq' with a
+            RuntimeWarning. Defaults to 'Lstsq'.
+        ridge (`float64`, optional) : Ridge (Tikhonov) regularisation strength,
+            added as ridge * |weights|**2 to the sum of squared residuals.
+            Defaults to 0.0.
+
+    Returns:
+    -------
+        weights (`float64`) : Learned weights [Dim: (d - 1) x 1], or
+            [Dim: (d - 1) x h] for h columns of targets.
+        errorTrain (`float64`) : RMS training error of the learned weights, repeated
+            numIters times for compatibility with statePredictions.gradient_descent
+            [Dim: numIters], or [Dim: h x numIters] for h columns of targets.
+    '''
+    d = past_measurements.shape[1]
+    multi_output = actual_values.ndim == 2
+
+    weights = None
+    if Solver[solver] == CHOLESKY:
+        gram = np.dot(past_measurements.T, past_measurements) + ridge*np.eye(d)
+        try:
+            weights = sla.cho_solve(sla.cho_factor(gram), np.dot(past_measurements.T, actual_values))
+        except (np.linalg.LinAlgError, ValueError):
+            warnings.warn("Normal equations are not positive definite; using 'Lstsq'",
+                          RuntimeWarning, stacklevel=2)
+
+    if weights is None:
+        if ridge > 0.0:
+            past_measurements_ = np.vstack([past_measurements, np.sqrt(ridge)*np.eye(d)])
+            actual_values_ = np.concatenate([actual_values, np.zeros((d,) + actual_values.shape[1:])])
+            weights = np.linalg.lstsq(past_measurements_, actual_values_, rcond=None)[0]
+        else:
+            weights = np.linalg.lstsq(past_measurements, actual_values, rcond=None)[0]
+
+    residuals = np.dot(past_measurements, weights) - actual_values
+    rms_train = np.sqrt(np.mean(residuals**2, axis=0))
+
+    if multi_output:
+        return weights, np.outer(rms_train, np.ones(numIters))
+    return weights.reshape(d, 1), rms_train*np.ones(numIters)
+
+
+def horizon_targets(measured, past_msmts, n_predict, steps_between_msmts=1):
+    ''' Return targets for all n-step ahead LSF models, as a read-only strided view
+    of measured.
+
+    Column idx_steps holds the targets of statePredictions.build_training_dataset
+    with steps_forward=idx_steps, for the rows shared by all models, i.e. rows
+    paired with statePredictions.lag_windows(measured)[0 : rows].
+
+    Parameters:
+    ----------
+        measured (`float64`) : Measurement record [Dim: m].
+        past_msmts (`int`) : Number of past measurement regressors in LSF model.
+        n_predict (`int`) : Number of n-step ahead models.
+        steps_between_msmts (`int`, optional) : Number time-steps between measurements.
+                Defaults to 1.
+
+    Returns:
+    -------
+        targets (`float64`) : [Dim: rows x n_predict], where
+            rows = m - (past_msmts - 1)*steps_between_msmts - (steps_between_msmts - 1) - (n_predict - 1).
+    '''
+    s = steps_between_msmts
+    first_target = (past_msmts - 1)*s + s - 1
+    rows = measured.shape[0] - first_target - (n_predict - 1)
+    stride = measured.strides[0]
+    return as_strided(measured[first_target:], shape=(rows, n_predict),
+                      strides=(stride, stride), writeable=False)
+
+
+def fit_lsf(actual_values, past_measurements, numIters, alpha_coeff, solver='GradientDescent', ridge=0.0):
+    ''' Return LSF weights and training residuals for a choice of solver.
+
+    Parameters:
+    ----------
+        actual_values (`float64`) : Target values [Dim: n].
+        past_measurements (`float64`) : Past measurements [Dim: n x (d - 1)],
+            see least_squares_fit.
+        numIters (`int`) : Number of iterations of gradient descent, and length
+            of errorTrain.
+        alpha_coeff (`float64`) : Gradient descent hyper-parameter. Not used by
+            closed form solvers.
+        solver (`str`, optional) : Choice of Solver. Defaults to 'GradientDescent'.
+        ridge (`float64`, optional) : Ridge regularisation for closed form
+            solvers, see least_squares_fit. Defaults to 0.0.
+
+    Returns:
+    -------
+        weights (`float64`) : Learned weights [Dim: (d - 1) x 1].
+        errorTrain (`float64`) : RMS training error at each iteration of gradient
+            descent, or the final RMS training error for closed form solvers
+            [Dim: numIters].
+    '''
+    if Solver[solver] == GRADIENT_DESCENT:
+        import ls.statePredictions as sp
+        training_data = np.column_stack((actual_values, past_measurements))
+        return sp.gradient_descent(training_data, numIters, alpha_coeff=alpha_coeff)
+
+    return least_squares_fit(actual_values, past_measurements, numIters, solver=solver, ridge=ridge)
+
 
 def doLSF_forecast(measurements_train, measurements_val, pick_alpha,
                    n_start_at, n_predict, past_msmts,
-                   steps_between_msmts=1, num_of_iterGD=50):
+                   steps_between_msmts=1, num_of_iterGD=50, solver='GradientDescent',
+                   ridge=0.0, joint='No'):
     ''' Return LSF predictions and trained weights given training and validation data.
 
     doLSF_forecast returns LSF predictions for n in [n_train, n_train + n_predict]
     by executing LSF for n_predict different models.
 
+    All models share the same past measurement regressors. With joint == 'Yes' and
+    a closed form solver, the weights of all models are found in one multi-output
+    least squares solve (one factorisation), using the training rows common to
+    all models (see horizon_targets).
+
     Parameters:
     ----------
         measurements_train ('float64`) : Measurement data for training.
         measurements_val ('float64`) : Measurement data for validation.
-        pick_alpha ('float64`) : Gradient descent hyper-parameter.
+        pick_alpha ('float64`) : Gradient descent hyper-parameter. Not used by
+                closed form solvers.
         n_start_at (`int`): n_train - q + 1 # Time step prior to n_train at which
                 weights are applied to get the n-the step ahead prediction.
         n_predict (`int`) : Number of time-steps in the forecasting period.
@@ -39,6 +179,12 @@ def doLSF_forecast(measurements_train, measurements_val, pick_alpha,
                 Defaults to 1.
         num_of_iterGD : Number of iterations of gradient descent in LSF.
                 Defaults to 50.
+        solver (`str`, optional) : 'GradientDescent', 'Lstsq' or 'Cholesky' choice
+                of solver for LSF weights, see Solver. Defaults to 'GradientDescent'.
+        ridge (`float64`, optional) : Ridge regularisation for closed form
+                solvers, see least_squares_fit. Defaults to 0.0.
+        joint (`str`, optional) : 'Yes' fits all n-step ahead models jointly.
+                Raises ValueError for solver 'GradientDescent'. Defaults to 'No'.
     Returns:
     -------
         row_at_n_train (`float64`): LSF past msmts record, when multipled by weights
@@ -52,7 +198,11 @@ def doLSF_forecast(measurements_train, measurements_val, pick_alpha,
                 [dims: n_predict x 1]
         errorTrain_fore (`float64`): Error trains in gradient descent for q weights
                 in weight_list; for n_predict number for models [dims: n_predict x num_of_iterGD].
+                For closed form solvers, each row repeats the final training error.
     '''
+    if joint == 'Yes' and Solver[solver] == GRADIENT_DESCENT:
+        raise ValueError("joint == 'Yes' requires a closed form solver ('Lstsq' or 'Cholesky')")
+
     import ls.statePredictions as sp
     weights_list = []
     step_list = []
@@ -61,23 +211,40 @@ def doLSF_forecast(measurements_train, measurements_val, pick_alpha,
     n_step_ahead_actual = []
     errorTrain_fore = np.zeros((n_predict, num_of_iterGD))
 
+    # Past msmts are the same for all n-step ahead models; only the targets shift.
+    # Share one read-only lag window view of each dataset across all models.
+    s = steps_between_msmts
+    first_target = (past_msmts - 1)*s
+    windows_train = sp.lag_windows(measurements_train, past_msmts=past_msmts, steps_between_msmts=s)
+    windows_val = sp.lag_windows(measurements_val, past_msmts=past_msmts, steps_between_msmts=s)
+
+    if joint == 'Yes':
+        targets_train = horizon_targets(measurements_train, past_msmts, n_predict, steps_between_msmts=s)
+        joint_weights, errorTrain_fore[:, :] = least_squares_fit(targets_train,
+                                                                 windows_train[0 : targets_train.shape[0]],
+                                                                 num_of_iterGD, solver=solver, ridge=ridge)
+
     for idx_steps in range(0, n_predict, 1): # MODEL CHANGES HERE AS WE CYCLE THROUGH STEPS FWD
-        training_data = sp.build_training_dataset(measurements_train,
-                                                  past_msmts=past_msmts,
-                                                  steps_forward=idx_steps, # training data for n-step ahead
-                                                  steps_between_msmts=steps_between_msmts)
-        weights_tuned, errorTrain_fore[idx_steps, :] = sp.gradient_descent(training_data, num_of_iterGD, alpha_coeff=pick_alpha)
-        validation_data = sp.build_training_dataset(measurements_val,
-                                                    past_msmts=past_msmts,
-                                                    steps_forward=idx_steps, # testing data for n-step ahead
-                                                    steps_between_msmts=steps_between_msmts)
+
+        k = idx_steps + s - 1
+
+        if joint == 'Yes':
+            weights_tuned = joint_weights[:, idx_steps : idx_steps + 1]
+        else:
+            # training data for n-step ahead, as in sp.build_training_dataset(steps_forward=idx_steps)
+            rows_train = windows_train.shape[0] - k
+            weights_tuned, errorTrain_fore[idx_steps, :] = fit_lsf(measurements_train[first_target + k : first_target + k + rows_train],
+                                                                   windows_train[0 : rows_train],
+                                                                   num_of_iterGD, pick_alpha,
+                                                                   solver=solver, ridge=ridge)
 
         if not np.all(np.isfinite(weights_tuned)):
             print("invalid weights")
             raise RuntimeError
 
-        past_measurements = validation_data[:, 1:]
-        actual_values = validation_data[:, 0]
+        # testing data for n-step ahead; only the row at n_start_at is used
+        past_measurements = windows_val[n_start_at : n_start_at + 1]
+        actual_value = measurements_val[first_target + k + n_start_at]
 
         # Predictions for n-step ahead
         predictions = sp.get_predictions(weights_tuned, past_measurements)
@@ -85,9 +252,9 @@ def doLSF_forecast(measurements_train, measurements_val, pick_alpha,
         weights_list.append(weights_tuned)
 
         # This row in validation data is multipled by weights and gives n-step ahead prediction from t = n_start_at
-        row_at_n_train.append(validation_data[n_start_at, :])
-        n_step_ahead_prediction.append(predictions[n_start_at]) # n-step ahead prediction
-        n_step_ahead_actual.append(actual_values[n_start_at])
+        row_at_n_train.append(np.concatenate(([actual_value], past_measurements[0])))
+        n_step_ahead_prediction.append(predictions[0]) # n-step ahead prediction
+        n_step_ahead_actual.append(actual_value)
         # Alternatively, once you have the trained weights for all n_step ahead models:
         # you could try to use [n_train - q, n_train] pts in any truth
         # to generate predictions. Namely:
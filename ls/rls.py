@@ -0,0 +1,157 @@
+'''
+.. module:: ls.rls
+
+    :synopsis: Streaming Least Squares Filter (LSF): updates AR(q) weights by
+        recursive least squares as each new measurement arrives, and returns
+        n-step ahead predictions in constant time.
+
+    The regressors and targets follow the data layout of
+    statePredictions.build_training_dataset: for the measurement at time t, the
+    past msmts are [y(t), y(t - s), ..., y(t - (q - 1)s)] and the target is
+    y(t + k), where k = steps_forward + steps_between_msmts - 1.
+
+    Module Level Classes:
+    ----------------------
+        RLS_Predictor : Online LSF predictor for one n-step ahead model.
+
+.. moduleauthor:: Riddhi Gupta <riddhi.sw@gmail.com>
+'''
+from __future__ import division, print_function, absolute_import
+import numpy as np
+
+
+class RLS_Predictor(object):
+    ''' Online LSF predictor for one n-step ahead model, trained by recursive
+    least squares with an optional forgetting factor.
+
+    Each call to update() costs O(past_msmts**2), and each call to predict()
+    costs O(past_msmts), independent of the number of measurements seen.
+
+    Attributes:
+    ----------
+        past_msmts (`int`) : Number of past measurement regressors, q.
+        steps_forward (`int`) : As in statePredictions.build_training_dataset.
+        steps_between_msmts (`int`) : Number time-steps between measurements.
+        forgetting_factor (`float64`) : Weight lambda in (0, 1] applied to older
+            residuals at each update. lambda = 1 gives ordinary least squares.
+        weights (`float64`) : Learned AR(q) weights [Dim: past_msmts x 1].
+        P_hat (`float64`) : Inverse of the (weighted) Gram matrix of past msmts
+            [Dim: past_msmts x past_msmts].
+        num_updates (`int`) : Number of weight updates so far.
+        num_msmts (`int`) : Number of measurements seen so far.
+
+    Methods:
+    -------
+        update : Add one new measurement and update weights.
+        train : Add a sequence of measurements.
+        predict : Return the n-step ahead prediction from the latest measurements.
+    '''
+
+    def __init__(self, past_msmts, steps_forward=1, steps_between_msmts=1,
+                 forgetting_factor=1.0, p0=10000, initial_weights=None):
+        '''Initiates a RLS_Predictor class instance.
+
+        Parameters:
+        ----------
+            past_msmts (`int`) : Number of past measurement regressors, q.
+            steps_forward (`int`, optional) : As in statePredictions.build_training_dataset.
+                Defaults to 1.
+            steps_between_msmts (`int`, optional) : Number time-steps between measurements.
+                Defaults to 1.
+            forgetting_factor (`float64`, optional) : Forgetting factor in (0, 1].
+                Defaults to 1.0 (no forgetting).
+            p0 (`float64`, optional) : Initial P_hat = p0 * identity. Large p0
+                gives little weight to initial_weights. Defaults to 10000.
+            initial_weights (`float64`, optional) : Initial weights [Dim: past_msmts].
+                If None, weights are initialised as in statePredictions.gradient_descent
+                (the latest msmt is the prediction).
+        '''
+
+        if not 0.0 < forgetting_factor <= 1.0:
+            raise ValueError("forgetting_factor must be in (0, 1]")
+
+        self.past_msmts = past_msmts
+        self.steps_forward = steps_forward
+        self.steps_between_msmts = steps_between_msmts
+        self.forgetting_factor = forgetting_factor
+
+        self.weights = np.zeros((past_msmts, 1))
+        if initial_weights is None:
+            self.weights[0, 0] = 1 # same situation as in traditional feedback
+        else:
+            self.weights[:, 0] = initial_weights
+
+        self.P_hat = p0*np.eye(past_msmts)
+        self.num_updates = 0
+        self.num_msmts = 0
+
+        # Ring buffer holding the measurements needed for a regressor and its target
+        s = steps_between_msmts
+        self._k = steps_forward + s - 1
+        self._buffer = np.zeros((past_msmts - 1)*s + self._k + 1)
+        self._lags = np.arange(past_msmts)*s # offsets of past msmts from the latest regressor msmt
+
+
+    def _past_msmts(self, delay):
+        ''' Return past msmts for the regressor msmt received delay msmts ago. '''
+        latest = self.num_msmts - 1 - delay
+        return self._buffer[(latest - self._lags) % self._buffer.shape[0]]
+
+
+    def update(self, msmt):
+        ''' Add one new measurement, y(t). If the past msmts for the target y(t)
+        are available, update weights by recursive least squares.
+
+        Parameters:
+        ----------
+            msmt (`float64`) : New measurement.
+
+        Returns:
+        -------
+            e_z (`float64`) : A priori residual y(t) - prediction of y(t), or None
+                if no update was made.
+        '''
+
+        self._buffer[self.num_msmts % self._buffer.shape[0]] = msmt
+        self.num_msmts += 1
+
+        if self.num_msmts < self._buffer.shape[0]:
+            return None
+
+        x = self._past_msmts(self._k)
+        Px = np.dot(self.P_hat, x)
+        gain = Px / (self.forgetting_factor + np.dot(x, Px))
+        e_z = msmt - np.dot(x, self.weights[:, 0])
+
+        self.weights[:, 0] += gain*e_z
+        P_hat = (self.P_hat - np.outer(gain, Px)) / self.forgetting_factor
+        self.P_hat = 0.5*(P_hat + P_hat.T) # keep P_hat symmetric against round-off
+        self.num_updates += 1
+
+        return e_z
+
+
+    def train(self, measurements):
+        ''' Add a sequence of measurements, in order, via update().
+
+        Parameters:
+        ----------
+            measurements (`float64`) : Measurement record [Dim: m].
+
+        Returns:
+        -------
+            weights (`float64`) : Learned AR(q) weights [Dim: past_msmts x 1].
+        '''
+        for msmt in measurements:
+            self.update(msmt)
+        return self.weights
+
+
+    def predict(self):
+        ''' Return the prediction of y(t + k) from the latest measurements, where
+        y(t) is the latest measurement; or None if fewer than the past msmts of
+        one regressor have been received.
+        '''
+        if self.num_msmts < (self.past_msmts - 1)*self.steps_between_msmts + 1:
+            return None
+        return np.dot(self._past_msmts(0), self.weights[:, 0])
@@ -9,6 +9,8 @@ import numpy as np
 import time
 from matplotlib.colors import LogNorm
 from matplotlib import ticker
+from numpy.lib.stride_tricks import as_strided
+from scipy.linalg import solve_triangular
 
 ''' State prediction for FS experiments with various parameters '''
 
@@ -54,22 +56,41 @@ def build_training_dataset(measured, engineered=np.array([]),
     else:
         new_dataset = np.zeros((m-(n*s-s)-k,n+2))       
 
-    for i in range(0,m-(n*s-s)-k):                              # loop through rows
-        if predict_noise==True:                                 # predict noise or msmts
-            new_dataset[i,0] = engineered[(n-1)*s+k+i]          # set first column value in the data matrix
-        else:
-            new_dataset[i,0] = measured[(n-1)*s+k+i]
-        
-        for j in range(1,n+1):                                  # loop through columns
-            new_dataset[i,j] = measured[(n-1)*s+i-(j-1)*s]
-        if include_offset == True:
-            new_dataset[i,n+1] = 1   
+    rows = m-(n*s-s)-k
+    if predict_noise==True:                                     # predict noise or msmts
+        new_dataset[:,0] = engineered[(n-1)*s+k:(n-1)*s+k+rows] # set first column values in the data matrix
+    else:
+        new_dataset[:,0] = measured[(n-1)*s+k:(n-1)*s+k+rows]
+
+    new_dataset[:,1:n+1] = lag_windows(measured,n,s)[0:rows]    # row i: measured[(n-1)*s+i-(j-1)*s], j = 1..n
+    if include_offset == True:
+        new_dataset[:,n+1] = 1
 
     return new_dataset
 
 
 
 
+def lag_windows(measured, past_msmts=3, steps_between_msmts=1):
+    ''' Returns a read-only view of the past measurements in build_training_dataset, without copying.
+        Input:
+            measured                1D data set
+            past_msmts              The number of labels (past measurements) in each row
+            steps_between_msmts     (optional) discrete steps between points in the data set
+
+        Returns:
+            windows                 A read-only (m-(n-1)*s x n) strided view of measured, whose row i
+                                    contains measured[(n-1)*s+i], measured[(n-1)*s+i-s], ..., measured[i].
+                                    The first m-(n-1)*s-k rows are columns 1..n of build_training_dataset
+                                    for k = steps_forward + steps_between_msmts - 1.
+        '''
+    n = past_msmts
+    s = steps_between_msmts
+    stride = measured.strides[0]
+    return as_strided(measured[(n-1)*s:], shape=(measured.shape[0]-(n-1)*s, n),
+                      strides=(stride, -s*stride), writeable=False)
+
+
 def rms_error(actual_values,predicted_values):
     ''' Calculates the RMS error of the predicted and actual values, both given as 1D vectors '''
     squared_error = (actual_values-predicted_values)**2
@@ -159,8 +180,78 @@ def gradient_descent(training_data,numIters,alpha_coeff=0.5):
 
 
     
+def order_recursive_range_of_predictions(measured, engineered=np.array([]),
+                                         val_measured=np.array([]), val_engineered=np.array([]),
+                                         max_past_msmts=3, max_steps_forward=1, steps_between_msmts=1,
+                                         include_offset=False):
+    '''
+        Calculates the grid of RMS errors of calculate_range_of_predictions(args[]) by exact least squares,
+        for all numbers of past measurements from one QR factorisation of the largest model.
+
+        The design matrix with max_past_msmts past measurements is X = QR. The model with p past measurements
+        uses the first p columns of X, so its least squares coefficients in the basis Q are the first p entries
+        of c = Q^T y. Its residual sum of squares is |y|^2 - |c[0:p]|^2, and its weights are R[0:p,0:p]^-1 c[0:p].
+        The offset column (if included) is always the first column of X.
+
+        All grid cells use the rows shared by the largest model and the most steps forward, i.e. up to
+        (max_past_msmts-1)*s + max_steps_forward fewer rows than build_training_dataset for small models.
+
+        Input:
+            measured, engineered            Training data, as in calculate_range_of_predictions(args[])
+            val_measured, val_engineered    (optional) Validation data. If val_measured is empty, no
+                                            validation RMS values are calculated.
+            max_past_msmts                  Largest number of past measurements
+            max_steps_forward               Largest number of steps forward
+            steps_between_msmts             (optional) discrete steps between points in the data set
+            include_offset                  (optional) includes a DC offset in every model
+
+        Returns:
+            rms_training_data               RMS values for the training dataset (max_past_msmts x max_steps_forward)
+            rms_validation_data             RMS values for the validation dataset (max_past_msmts x max_steps_forward),
+                                            or None if val_measured is empty
+        '''
+    mpm = max_past_msmts
+    msf = max_steps_forward
+    s = steps_between_msmts
+
+    def design(measured_, engineered_):
+        ''' Returns past measurements and targets for all steps forward, on the shared rows. '''
+        targets_ = engineered_ if engineered_.size != 0 else measured_
+        rows = measured_.shape[0]-(mpm-1)*s-(msf+s-1)
+        X = lag_windows(measured_,mpm,s)[0:rows]
+        if include_offset == True:
+            X = np.column_stack((np.ones(rows),X))
+        first = (mpm-1)*s+s                                 # target of row 0, one step forward
+        Y = targets_[first+np.arange(rows)[:,np.newaxis]+np.arange(msf)]
+        return X, Y
+
+    X, Y = design(measured,engineered)
+    Q, R = np.linalg.qr(X)
+    c = np.dot(Q.T,Y)                                       # coefficients in the basis Q, all steps forward
+
+    d0 = 1 if include_offset == True else 0                 # columns present in every model
+    rss = np.sum(Y**2,axis=0) - np.cumsum(c**2,axis=0)      # residual sum of squares, models with 1..X.shape[1] columns
+    rms_training_data = np.sqrt(np.maximum(rss[d0:,:],0.0)/X.shape[0])
+
+    if val_measured.size == 0:
+        return rms_training_data, None
+
+    X_val, Y_val = design(val_measured,val_engineered)
+    R_inv = solve_triangular(R,np.eye(R.shape[0]))          # leading blocks of R_inv invert leading blocks of R
+    nested = np.triu(np.ones((R.shape[0],R.shape[0])))[:,d0:]   # column p: keep first p + d0 + 1 coefficients
+
+    rms_validation_data = np.zeros((mpm,msf))
+    for j in range(0,msf):                                  # loop through steps forward
+        weights = np.dot(R_inv,c[:,j:j+1]*nested)           # column p: weights of the model with p + 1 past msmts
+        predictions = np.dot(X_val,weights)
+        rms_validation_data[:,j] = np.sqrt(np.mean((predictions-Y_val[:,j:j+1])**2,axis=0))
+
+    return rms_training_data, rms_validation_data
+
+
 def calculate_range_of_predictions(measured, engineered=np.array([]), alpha_=0.5,
-                           max_past_msmts=3, max_steps_forward=1, steps_between_msmts=1,pct=-1, validation_dataset = np.array([])):
+                           max_past_msmts=3, max_steps_forward=1, steps_between_msmts=1,pct=-1, validation_dataset = np.array([]),
+                           method='GradientDescent'):
     '''
         Creates a dataset with variable numbers of past measurements used for predictions and steps forward based
         on measured data using gradient_descent(args[]).
@@ -169,6 +260,10 @@ def calculate_range_of_predictions(measured, engineered=np.array([]), alpha_=0.5
         is calculated and saved in a 2D array with dimensions (max_past_msmts x max_steps_forward).
 
         A distinction between training and validation data can be made by using 'pct' elem [0,1] ...  
+
+        method='OrderRecursive' calculates the whole grid by exact least squares from one QR factorisation
+        of the largest model, see order_recursive_range_of_predictions(args[]), instead of running
+        gradient_descent(args[]) for each grid cell.
         '''
 
     print '---------------------------------------------------------------------------'
@@ -191,7 +286,7 @@ def calculate_range_of_predictions(measured, engineered=np.array([]), alpha_=0.5
     
     if (0.1 < pct < 0.9) and validation_dataset.size == 0:
         use_validation_data = True              # pct is fraction of training dataset / whole dataset
-        n = np.floor(pct*m)                     # size of the training dataset
+        n = int(np.floor(pct*m))                # size of the training dataset
         print "Points in training data:",n
         print "Points in validation data:",m-n
         rms_validation_data = np.zeros((mpm,msf))   # RMS values for the validation dataset
@@ -204,6 +299,27 @@ def calculate_range_of_predictions(measured, engineered=np.array([]), alpha_=0.5
         n = m
     
     tic = time.time()
+    if method == 'OrderRecursive':
+        val_measured = np.array([])                 # validation data, as in the loop below
+        val_engineered = np.array([])
+        if use_validation_data == True:
+            val_measured, val_engineered = measured[n:m], engineered[n:m]
+        elif use_ext_validation_data == True:
+            if len(list(validation_dataset.shape)) == 1:
+                val_measured = validation_dataset
+            else:
+                val_measured, val_engineered = validation_dataset[0,:], validation_dataset[1,:]
+        rms_training_data, rms_validation_data = order_recursive_range_of_predictions(measured[0:n], engineered[0:n],
+                                                                                      val_measured, val_engineered,
+                                                                                      mpm, msf, sbm,
+                                                                                      include_offset=False)
+        toc = time.time()-tic
+        print 'Time taken to calculate the range of predictions:',np.round(toc,2),'s'
+        print '---------------------------------------------------------------------------'
+        if use_validation_data == True or use_ext_validation_data == True:
+            return rms_validation_data
+        return rms_training_data
+
     for i in range(0,mpm):                              # loop through numbers of past measurements
         #print 'past measurements: ',i+1
         for j in range(0,msf):                          # loop through steps forward
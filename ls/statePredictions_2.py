@@ -13,6 +13,7 @@ import numpy as np
 import time
 from matplotlib.colors import LogNorm
 from matplotlib import ticker
+from ls.statePredictions import lag_windows, order_recursive_range_of_predictions
 
 ''' State prediction for FS experiments with various parameters.
 
@@ -68,16 +69,15 @@ def build_training_dataset(measured, engineered=np.array([]),
     else:
         new_dataset = np.zeros((m-(n*s-s)-k,n+2))       
 
-    for i in range(0,m-(n*s-s)-k):                              # loop through rows
-        if predict_noise==True:                                 # predict noise or msmts
-            new_dataset[i,0] = engineered[(n-1)*s+k+i]          # set first column value in the data matrix
-        else:
-            new_dataset[i,0] = measured[(n-1)*s+k+i]
-        
-        for j in range(1,n+1):                                  # loop through columns
-            new_dataset[i,j] = measured[(n-1)*s+i-(j-1)*s]
-        if include_offset == True:
-            new_dataset[i,n+1] = 1   
+    rows = m-(n*s-s)-k
+    if predict_noise==True:                                     # predict noise or msmts
+        new_dataset[:,0] = engineered[(n-1)*s+k:(n-1)*s+k+rows] # set first column values in the data matrix
+    else:
+        new_dataset[:,0] = measured[(n-1)*s+k:(n-1)*s+k+rows]
+
+    new_dataset[:,1:n+1] = lag_windows(measured,n,s)[0:rows]    # row i: measured[(n-1)*s+i-(j-1)*s], j = 1..n
+    if include_offset == True:
+        new_dataset[:,n+1] = 1
 
     return new_dataset
 
@@ -210,7 +210,8 @@ def gradient_descent(training_data,numIters,initial_weights=0,alpha_coeff=0.05):
 
     
 def calculate_range_of_predictions(measured, engineered=np.array([]),
-                           max_past_msmts=3, max_steps_forward=1, steps_between_msmts=1,pct=-1, validation_dataset = np.array([])):
+                           max_past_msmts=3, max_steps_forward=1, steps_between_msmts=1,pct=-1, validation_dataset = np.array([]),
+                           method='GradientDescent'):
     '''
         Creates a dataset with variable numbers of past measurements used for predictions and steps forward based
         on measured data using gradient_descent(args[]).
@@ -219,6 +220,10 @@ def calculate_range_of_predictions(measured, engineered=np.array([]),
         is calculated and saved in a 2D array with dimensions (max_past_msmts x max_steps_forward).
 
         A distinction between training and validation data can be made by using 'pct' elem [0,1] ...  
+
+        method='OrderRecursive' calculates the whole grid by exact least squares from one QR factorisation
+        of the largest model, see order_recursive_range_of_predictions(args[]), instead of running
+        gradient_descent(args[]) for each grid cell.
         '''
 
     print '---------------------------------------------------------------------------'
@@ -241,7 +246,7 @@ def calculate_range_of_predictions(measured, engineered=np.array([]),
     
     if (0.1 < pct < 0.9) and validation_dataset.size == 0:
         use_validation_data = True              # pct is fraction of training dataset / whole dataset
-        n = np.floor(pct*m)                     # size of the training dataset
+        n = int(np.floor(pct*m))                # size of the training dataset
         print "Points in training data:",n
         print "Points in validation data:",m-n
         rms_validation_data = np.zeros((mpm,msf))   # RMS values for the validation dataset
@@ -254,6 +259,27 @@ def calculate_range_of_predictions(measured, engineered=np.array([]),
         n = m
     
     tic = time.time()
+    if method == 'OrderRecursive':
+        val_measured = np.array([])                 # validation data, as in the loop below
+        val_engineered = np.array([])
+        if use_validation_data == True:
+            val_measured, val_engineered = measured[n:m], engineered[n:m]
+        elif use_ext_validation_data == True:
+            if len(list(validation_dataset.shape)) == 1:
+                val_measured = validation_dataset
+            else:
+                val_measured, val_engineered = validation_dataset[0,:], validation_dataset[1,:]
+        rms_training_data, rms_validation_data = order_recursive_range_of_predictions(measured[0:n], engineered[0:n],
+                                                                                      val_measured, val_engineered,
+                                                                                      mpm, msf, sbm,
+                                                                                      include_offset=True)
+        toc = time.time()-tic
+        print 'Time taken to calculate the range of predictions:',np.round(toc,2),'s'
+        print '---------------------------------------------------------------------------'
+        if use_validation_data == True or use_ext_validation_data == True:
+            return rms_validation_data
+        return rms_training_data
+
     for i in range(0,mpm):                              # loop through numbers of past measurements
         #print 'past measurements: ',i+1
         for j in range(0,msf):                          # loop through steps forward
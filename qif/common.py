@@ -22,6 +22,10 @@ Created on Thu Apr 20 19:20:43 2017
         propagate_x : Return x_hat_apriori i.e. state propagation without a Kalman update.
         propagate_p : Return P_hat_apriori i.e. state covariance propagation
             without a Kalman update.
+        propagate_x_companion : As propagate_x, using the companion matrix structure
+            of the AR(q) dynamic model.
+        propagate_p_companion : As propagate_p, using the companion matrix structure
+            of the AR(q) dynamic model in O(order^2).
         calc_gain : Return the Kalman gain and scalar S for performing state updates,
             with linearised, state-dependent h(x) as measurement model.
         saturate : Saturates p between [-threshold, threshold] for a one bit
@@ -39,6 +43,8 @@ import numpy.linalg as la
 import scipy.stats as stats
 from scipy.special import erf as erf_func
 
+from akf.armakf import companion_dot
+
 
 ############################################### QIF Bayes Risk Helper Funcs ####
 
@@ -59,7 +65,7 @@ def normalise(x):
 ############################################### AR PROCESS DATA ################
 
 
-def generate_AR(xinit, num, weights, oe):
+def generate_AR(xinit, num, weights, oe, rng=None):
     ''' Return a num-length AR sequence of order q.
 
     Parameters:
@@ -68,6 +74,8 @@ def generate_AR(xinit, num, weights, oe):
         num : Total length of the output vector (num of forward steps = num - weights.shape[0]).
         weights : AR coefficients, where order of AR process == weights.shape[0].
         oe : White noise variance (Kalman equivalent of process noise variance scale.)
+        rng : Random number stream, np.random.RandomState. If None, draws from
+            the global np.random state.
 
     Returns:
     -------
@@ -75,6 +83,7 @@ def generate_AR(xinit, num, weights, oe):
             terms == num.
     '''
 
+    rng = np.random if rng is None else rng
     x = np.zeros(num)
     order = weights.shape[0]
 
@@ -86,13 +95,13 @@ def generate_AR(xinit, num, weights, oe):
 
             x[step] += weights[idx_weight]*x[step - 1 - idx_weight]
 
-        x[step] +=  np.random.normal(scale=np.sqrt(oe))
+        x[step] +=  rng.normal(scale=np.sqrt(oe))
 
     return x
 
 ############################################### QUANTISATION MODEL #############
 
-def one_shot_msmt(n=1, p=0.5, num_samples=1):
+def one_shot_msmt(n=1, p=0.5, num_samples=1, rng=None):
 
     '''Return a single shot qubit measurement, with Born probaility for measuring an up
         state specified as p.
@@ -105,12 +114,15 @@ def one_shot_msmt(n=1, p=0.5, num_samples=1):
             Default set to 0.5.
         num_samples (`int`): Number of samples drawn from binomial distribution.
             Default set to 1.
+        rng (`np.random.RandomState`, optional): Random number stream. If None,
+            draws from the global np.random state.
 
     Returns:
     -------
         Qubit state (`int`):  Return 0 or 1 outcome from a Bernoulli trial.
     '''
-    return np.random.binomial(n, p, size=num_samples)
+    rng = np.random if rng is None else rng
+    return rng.binomial(n, p, size=num_samples)
 
 
 def saturate(p_, threshold=0.5):
@@ -128,7 +140,7 @@ def saturate(p_, threshold=0.5):
     return p
 
 
-def projected_msmt(z_proj):
+def projected_msmt(z_proj, rng=None):
     ''' Return a qubit measurement outcome based on an estimate of relative stochastic
     qubit phase under dephasing.
 
@@ -136,6 +148,8 @@ def projected_msmt(z_proj):
     ----------
         z_proj (`float`) : Outcome of measuring a Kalman state vector,
                             according to a Kalman measurement model.
+        rng (`np.random.RandomState`, optional): Random number stream, as in
+            one_shot_msmt.
 
     Returns:
     -------
@@ -158,7 +172,7 @@ def projected_msmt(z_proj):
 
         # Non Linear Msmt Model with Amp Quantisation
         bias = saturate(item, threshold=0.5) + 0.5
-        quantised_msmt.append(one_shot_msmt(p=bias))
+        quantised_msmt.append(one_shot_msmt(p=bias, rng=rng))
 
     # # Turn off quantisation
     # return z_proj
@@ -167,7 +181,7 @@ def projected_msmt(z_proj):
 
 ############################################### MEASUREMENT MODEL ##############
 
-def noisy_z(x, rk, saturate_='Yes'):
+def noisy_z(x, rk, saturate_='Yes', rng=None):
 
     ''' Return noisy simulated measurment outcomes by making measurements
         on evolution of an internal (hidden) state, x, via a (non-linear)
@@ -180,6 +194,8 @@ def noisy_z(x, rk, saturate_='Yes'):
         rk (`float64`):  Measurement noise variance scale.
         saturate_ (`str`) : 'Yes'/ 'No' flag to saturate values of output random
             variable within certain bounds. 'Yes' will add saturation errors.
+        rng (`np.random.RandomState`, optional): Random number stream. If None,
+            draws from the global np.random state.
 
     Returns:
     -------
@@ -197,7 +213,8 @@ def noisy_z(x, rk, saturate_='Yes'):
 
     if rk != 0.0:
         print(rk)
-        z += np.random.normal(loc=0.0, scale=np.sqrt(rk), size=z.shape[0])
+        rng = np.random if rng is None else rng
+        z += rng.normal(loc=0.0, scale=np.sqrt(rk), size=z.shape[0])
 
     if saturate_ == 'No':
         return z
@@ -274,6 +291,38 @@ def propagate_p(a, P_hat, Q):
     '''
     return np.dot(np.dot(a, P_hat),a.T) + Q
 
+def propagate_x_companion(weights, x_hat):
+    '''Return x_hat_apriori as in propagate_x, where the dynamical model is the
+    companion matrix of AR weights (see akf.armakf.get_autoreg_model).
+
+    Parameters:
+    ----------
+        weights (`float64`):  Coefficients of an AR(q) process [Dim: 1 x order].
+        x_hat (`float64`):  Kalman state vector (posterior at previous time step).
+
+    Returns:
+    -------
+        x_hat_apriori (`float64`):  Kalman state vector (prior at current time step).
+    '''
+    return companion_dot(weights, x_hat)
+
+def propagate_p_companion(weights, P_hat, Q):
+    '''Return P_hat_apriori as in propagate_p, where the dynamical model is the
+    companion matrix of AR weights, in O(order^2) rather than O(order^3).
+
+    Parameters:
+    ----------
+        weights (`float64`):  Coefficients of an AR(q) process [Dim: 1 x order].
+        P_hat (`float64`):  Kalman state covariance matrix (posterior at previous time step).
+        Q (`float64`): Process noise covariance matrix (noise injection at current time step).
+
+    Returns:
+    -------
+        P_hat_apriori (`float64`):  Kalman covariance matrix (prior at current time step).
+    '''
+    # a P a.T == (a (a P).T).T
+    return companion_dot(weights, companion_dot(weights, P_hat).T).T + Q
+
 def calc_gain(x_hat_apriori, P_hat_apriori, rk):
     ''' Return the Kalman gain and scalar S for performing state updates,
         with linearised, state-dependent h(x) as measurement model.
@@ -20,12 +20,13 @@ import numpy as np
 import sys
 sys.path.append('../')
 
-from akf.armakf import get_autoreg_model
+from akf.armakf import get_autoreg_model, PropagationMode, COMPANION
 from qif.common import calc_residuals, calc_gain, projected_msmt, propagate_x, propagate_p, update_p, calc_z_proj
+from qif.common import propagate_x_companion, propagate_p_companion
 
 
 def qif(descriptor, y_signal, weights, oe, rk, n_train=1000, n_testbefore=50,
-        n_predict=50, p0=10000, skip_msmts=1,  save='No'):
+        n_predict=50, p0=10000, skip_msmts=1,  save='No', propagation='Companion', rng=None):
 
     '''
     Saves results of Quantised Kalman Filtering (QKF) with AR dynamics as .npz file.
@@ -49,6 +50,13 @@ def qif(descriptor, y_signal, weights, oe, rk, n_train=1000, n_testbefore=50,
             Defaults to 1.
         save=(`str`, optional): 'Yes' / 'No' flag. Saves QKF output as .npz file if 'Yes'.
             Defaults to 'No'.
+        propagation (`str`, optional): 'Dense' / 'Companion' choice for state
+            propagation. 'Companion' exploits the companion matrix structure of the
+            AR(q) dynamic model, in O(order^2) per time step rather than O(order^3).
+            Defaults to 'Companion'.
+        rng (`np.random.RandomState`, optional): Random number stream for the initial
+            state and quantised predictions. If None, draws from the global
+            np.random state.
 
     Returns:
     -------
@@ -79,7 +87,9 @@ def qif(descriptor, y_signal, weights, oe, rk, n_train=1000, n_testbefore=50,
     # Q[0,0] = oe # # This is used in AKF with Q[0,0] = oe**2
 
     a = get_autoreg_model(order, weights)
-    x_hat[:, 0] = np.random.normal(scale=np.sqrt(oe), size=order) # y_signal[0:order]
+    propagation_ = PropagationMode[propagation]
+    rng = np.random if rng is None else rng
+    x_hat[:, 0] = rng.normal(scale=np.sqrt(oe), size=order) # y_signal[0:order]
     P_hat[idx, idx] = p0
 
     store_x_hat = np.zeros((order, 1, num))
@@ -100,12 +110,16 @@ def qif(descriptor, y_signal, weights, oe, rk, n_train=1000, n_testbefore=50,
     k = order # wait until order number of msmts have been made
     while (k< num):
         # print k
-        x_hat_apriori = propagate_x(a, x_hat)
-        P_hat_apriori = propagate_p(a, P_hat, Q)
+        if propagation_ == COMPANION:
+            x_hat_apriori = propagate_x_companion(weights, x_hat)
+            P_hat_apriori = propagate_p_companion(weights, P_hat, Q)
+        else:
+            x_hat_apriori = propagate_x(a, x_hat)
+            P_hat_apriori = propagate_p(a, P_hat, Q)
 
         # Make predictions
         z_proj = calc_z_proj(x_hat_apriori) # potentially non linear msmt h(x)
-        predictions[k] = projected_msmt(z_proj) # quantisation
+        predictions[k] = projected_msmt(z_proj, rng=rng) # quantisation
 
         # Residuals / innovations
         e_z[k] = calc_residuals(predictions[k], y_signal[k])
@@ -0,0 +1,8 @@
+'''
+Tests import the repository packages (kf, akf, ls, gpr, analysis_tools, ...)
+from the repository root.
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
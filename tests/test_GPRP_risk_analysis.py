@@ -0,0 +1,79 @@
+import sys
+
+import pytest
+
+if sys.version_info[0] > 2:
+    pytest.skip("the repository targets Python 2.7", allow_module_level=True)
+
+import numpy as np
+
+from gpr import GPRP_risk_analysis
+from gpr.GPRP_risk_analysis import GPRPOptimisation
+
+
+class StubExpt(object):
+    n_train, n_testbefore, n_predict = 100, 10, 20
+    number_of_points = n_train + n_predict
+    Delta_T_Sampling = 1.0
+
+
+# Stands in for data_tools.load_raw_cluster_data.LoadExperiment
+class StubExperiment(object):
+    def __init__(self, test_case, variation, **kwargs):
+        rng = np.random.RandomState(0)
+        timeaxis = np.arange(StubExpt.number_of_points)
+        phases = rng.uniform(0.0, 2.0*np.pi, size=(2, 3, 1))
+        self.Expt = StubExpt
+        self.LKFFB_max_it_BR = 3
+        self.LKFFB_msmt_noise_variance = 0.01
+        self.LKFFB_macro_truth = np.sin(2.0*np.pi*timeaxis/25.0 + phases)
+
+
+def gpr_optimisation(monkeypatch, savetopath):
+    monkeypatch.setattr(GPRP_risk_analysis, "le", StubExperiment)
+    return GPRPOptimisation(0, 0, 5.0, 5.0, None, str(savetopath) + '/')
+
+
+def saved_gpr_map(savetopath):
+    return np.load(str(savetopath.join('test_case_0_var_0_GPR_PER_.npz')))
+
+
+def test_pooled_restarts_match_serial(tmpdir, monkeypatch):
+    gpr_maps = []
+    for num_processes in [1, 2]:
+        savetopath = tmpdir.mkdir('processes_%s' % num_processes)
+        gpr_optimisation(monkeypatch, savetopath).make_GPR_PER(num_restarts=3, num_processes=num_processes,
+                                                                rng_seed=9)
+        gpr_maps.append(saved_gpr_map(savetopath))
+
+    for key in ['GPR_opt_params', 'GPR_init_params', 'GPR_PER_prediction_errors', 'GPR_PER_forecastng_errors']:
+        assert np.array_equal(gpr_maps[1][key], gpr_maps[0][key]), key
+
+
+def test_restarts_warm_start_from_latest_record(tmpdir, monkeypatch):
+    optimisation = gpr_optimisation(monkeypatch, tmpdir)
+    starts = []
+    call_GPR_multi_restart = optimisation.call_GPR_multi_restart
+
+    def recorded_multi_restart(X, Y, init_params_lists, **kwargs):
+        starts.append([list(init_params_list) for init_params_list in init_params_lists])
+        return call_GPR_multi_restart(X, Y, init_params_lists, **kwargs)
+    optimisation.call_GPR_multi_restart = recorded_multi_restart
+
+    optimisation.make_GPR_PER(num_restarts=3, rng_seed=9)
+    gpr_map = saved_gpr_map(tmpdir)
+
+    assert len(starts) == 3
+    assert len(starts[0]) == 3 # no warm start for the first record
+    for idx_d in xrange(1, 3):
+        assert starts[idx_d][1] == list(gpr_map['GPR_opt_params'][idx_d - 1])
+    for idx_d in xrange(3):
+        assert list(gpr_map['GPR_init_params'][idx_d]) in starts[idx_d]
+    assert optimisation.warm_start[1] == list(gpr_map['GPR_opt_params'][-1])
+
+
+def test_gpy_backend_rejects_process_pool(tmpdir, monkeypatch):
+    optimisation = gpr_optimisation(monkeypatch, tmpdir)
+    optimisation.backend = 'GPy'
+    with pytest.raises(ValueError):
+        optimisation.make_GPR_PER(num_restarts=3, num_processes=2)
@@ -0,0 +1,76 @@
+import sys
+
+import pytest
+
+if sys.version_info[0] > 2:
+    pytest.skip("the repository targets Python 2.7", allow_module_level=True)
+
+import numpy as np
+import numpy.linalg as la
+
+from akf import armakf
+
+
+N_TRAIN, N_TESTBEFORE, N_PREDICT = 150, 10, 50
+WEIGHTS = np.array([0.5, -0.2, 0.1])
+OE, RK = 0.1, 0.01
+
+
+def measurement_record(seed=1):
+    rng = np.random.RandomState(seed)
+    num = N_TRAIN + N_PREDICT
+    return np.sin(0.3*np.arange(num)) + 0.1*rng.randn(num)
+
+
+def run_autokf(tmpdir, y_signal, **kwargs):
+    return armakf.autokf(str(tmpdir.join('akf')), y_signal, WEIGHTS, OE, RK, n_train=N_TRAIN,
+                         n_testbefore=N_TESTBEFORE, n_predict=N_PREDICT, **kwargs)
+
+
+@pytest.mark.parametrize("steady_state_tol", [None, 1e-10])
+@pytest.mark.parametrize("propagation", ["Dense", "Companion"])
+def test_steady_state_matches_time_varying_gain(tmpdir, steady_state_tol, propagation):
+    y_signal = measurement_record()
+
+    expected = run_autokf(tmpdir, y_signal, propagation=propagation)
+    predictions = run_autokf(tmpdir, y_signal, propagation=propagation, steady_state='Yes',
+                             steady_state_tol=steady_state_tol)
+
+    assert np.allclose(predictions, expected, rtol=1e-12, atol=1e-12)
+
+
+def test_failed_steady_state_solve_warns(tmpdir, monkeypatch):
+    def no_solution(weights, oe, rk):
+        raise la.LinAlgError("no stabilising solution")
+    monkeypatch.setattr(armakf, "get_steady_state_gain", no_solution)
+    y_signal = measurement_record()
+
+    with pytest.warns(RuntimeWarning):
+        predictions = run_autokf(tmpdir, y_signal, steady_state='Yes')
+
+    assert np.array_equal(predictions, run_autokf(tmpdir, y_signal))
+
+
+@pytest.mark.parametrize("skip_msmts", [1, 3])
+@pytest.mark.parametrize("propagation", ["Dense", "Companion"])
+def test_batch_matches_single_records(tmpdir, skip_msmts, propagation):
+    y_signals = np.array([measurement_record(seed) for seed in xrange(4)])
+
+    predictions = armakf.autokf_batch(y_signals, WEIGHTS, OE, RK, n_train=N_TRAIN,
+                                      n_testbefore=N_TESTBEFORE, n_predict=N_PREDICT,
+                                      skip_msmts=skip_msmts, propagation=propagation)
+
+    expected = np.array([run_autokf(tmpdir, y_signal, skip_msmts=skip_msmts, propagation=propagation)
+                         for y_signal in y_signals])
+    assert predictions.shape == (len(y_signals), N_TESTBEFORE + N_PREDICT)
+    assert np.allclose(predictions, expected, rtol=1e-12, atol=1e-12)
+
+
+def test_gain_schedule_is_cached():
+    num = N_TRAIN + N_PREDICT
+    W_schedule = armakf.get_gain_schedule(WEIGHTS, OE, RK, 10000, N_TRAIN, 1, num)
+
+    assert armakf.get_gain_schedule(WEIGHTS.copy(), OE, RK, 10000, N_TRAIN, 1, num) is W_schedule
+    assert armakf.get_gain_schedule(WEIGHTS, OE, RK, 10000, N_TRAIN, 2, num) is not W_schedule
+    assert not W_schedule.flags.writeable
+    assert np.all(W_schedule[N_TRAIN + 1:] == 0)
@@ -0,0 +1,66 @@
+import sys
+
+import pytest
+
+if sys.version_info[0] > 2:
+    pytest.skip("the repository targets Python 2.7", allow_module_level=True)
+
+import numpy as np
+
+from kf import fast, fast_2
+from akf.armakf import autokf
+
+
+N_TRAIN, N_TESTBEFORE, N_PREDICT = 120, 10, 30
+FREQ_BASIS = np.arange(0.0, 0.5, 0.05)
+
+
+def measurement_record(seed=0):
+    rng = np.random.RandomState(seed)
+    num = N_TRAIN + N_PREDICT
+    return np.sin(0.3*np.arange(num)) + 0.1*rng.randn(num)
+
+
+@pytest.mark.parametrize("module", [fast, fast_2])
+def test_numba_requires_block_propagation(module):
+    with pytest.raises(ValueError):
+        module.kf_2017(measurement_record(), N_TRAIN, N_TESTBEFORE, N_PREDICT, 1.0, 1.0,
+                       1.0, 0.01, 0.1, FREQ_BASIS, propagation="Dense", backend="numba")
+
+
+@pytest.mark.parametrize("prediction_method", ["ZeroGain", "PropForward"])
+def test_lkffb_loop_matches_numpy(tmpdir, prediction_method):
+    pytest.importorskip("numba")
+    y_signal = measurement_record()
+
+    for module in [fast, fast_2]:
+        predictions = {}
+        for backend in ["numpy", "numba"]:
+            descriptor = str(tmpdir.join(module.__name__ + prediction_method + backend))
+            predictions[backend] = module.kf_2017(y_signal, N_TRAIN, N_TESTBEFORE, N_PREDICT,
+                                                  1.0, 1.0, 1.0, 0.01, 0.1, FREQ_BASIS,
+                                                  prediction_method=prediction_method,
+                                                  descriptor=descriptor, propagation="Block",
+                                                  backend=backend)
+        assert np.allclose(predictions["numba"], predictions["numpy"], rtol=1e-9, atol=1e-12)
+
+
+def test_akf_loop_matches_numpy(tmpdir):
+    pytest.importorskip("numba")
+    y_signal = measurement_record()
+    weights = np.array([0.5, -0.2, 0.1])
+
+    predictions = {}
+    for backend in ["numpy", "numba"]:
+        predictions[backend] = autokf(str(tmpdir.join(backend)), y_signal, weights, 0.1, 0.01,
+                                      n_train=N_TRAIN, n_testbefore=N_TESTBEFORE,
+                                      n_predict=N_PREDICT, backend=backend)
+    assert np.allclose(predictions["numba"], predictions["numpy"], rtol=1e-9, atol=1e-12)
+
+
+def test_missing_numba_falls_back_with_warning():
+    from kf import jit
+    if jit.NUMBA_AVAILABLE:
+        pytest.skip("numba is installed")
+    with pytest.warns(RuntimeWarning):
+        assert jit.resolve_backend("numba") == jit.NUMPY
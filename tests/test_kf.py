@@ -0,0 +1,92 @@
+import sys
+
+import pytest
+
+if sys.version_info[0] > 2:
+    pytest.skip("the repository targets Python 2.7", allow_module_level=True)
+
+import numpy as np
+
+from kf import fast_2
+
+
+N_TRAIN, N_TESTBEFORE, N_PREDICT = 80, 10, 25
+FREQ_BASIS = np.arange(0.0, 0.5, 0.05)
+KF_PARAMS = dict(Delta_T_Sampling=1.0, x0=1.0, p0=1.0, oe=0.01, rk=0.1,
+                 freq_basis_array=FREQ_BASIS, phase_correction=0.3)
+
+
+def measurement_records(batch=5, n_predict=N_PREDICT, seed=0):
+    rng = np.random.RandomState(seed)
+    num = N_TRAIN + n_predict
+    phases = rng.uniform(0.0, 2.0*np.pi, size=(batch, 1))
+    return np.sin(0.3*np.arange(num) + phases) + 0.1*rng.randn(batch, num)
+
+
+def single_record_runs(y_signals, n_predict=N_PREDICT, **kwargs):
+    outputs = [fast_2.kf_2017(y_signal, N_TRAIN, N_TESTBEFORE, n_predict,
+                              switch_off_save='Yes', **dict(KF_PARAMS, **kwargs))
+               for y_signal in y_signals]
+    return np.array([output[0] for output in outputs]), np.array([output[1] for output in outputs])
+
+
+@pytest.mark.parametrize("prediction_method", ["ZeroGain", "PropForward"])
+@pytest.mark.parametrize("propagation", ["Dense", "Block"])
+@pytest.mark.parametrize("skip_msmts", [1, 3])
+@pytest.mark.parametrize("chunk_size", [None, 2])
+def test_batch_matches_single_records(prediction_method, propagation, skip_msmts, chunk_size):
+    y_signals = measurement_records()
+    kwargs = dict(prediction_method=prediction_method, propagation=propagation,
+                  skip_msmts=skip_msmts)
+
+    predictions, store_x_hat = fast_2.kf_2017_batch(y_signals, N_TRAIN, N_TESTBEFORE, N_PREDICT,
+                                                    chunk_size=chunk_size,
+                                                    **dict(KF_PARAMS, **kwargs))
+
+    assert predictions.shape == (len(y_signals), N_TESTBEFORE + N_PREDICT)
+    assert store_x_hat.shape == (len(y_signals), 2*len(FREQ_BASIS), 1, N_TRAIN + N_PREDICT)
+    single_predictions, single_x_hat = single_record_runs(y_signals, **kwargs)
+    assert np.allclose(predictions, single_predictions, rtol=1e-10, atol=1e-12)
+    assert np.allclose(store_x_hat, single_x_hat, rtol=1e-10, atol=1e-12)
+
+
+@pytest.mark.parametrize("propagation", ["Dense", "Block"])
+@pytest.mark.parametrize("skip_msmts", [1, 3])
+@pytest.mark.parametrize("n_predict", [N_PREDICT, 1, 0])
+def test_fork_matches_separate_runs(propagation, skip_msmts, n_predict):
+    y_signals = measurement_records(n_predict=n_predict)
+    kwargs = dict(propagation=propagation, skip_msmts=skip_msmts)
+
+    forked = fast_2.kf_2017_batch_fork(y_signals, N_TRAIN, N_TESTBEFORE, n_predict, chunk_size=2,
+                                       prediction_methods=("ZeroGain", "PropForward"),
+                                       **dict(KF_PARAMS, **kwargs))
+
+    assert sorted(forked) == ["PropForward", "ZeroGain"]
+    for prediction_method in forked:
+        kwargs["prediction_method"] = prediction_method
+        batch_predictions = fast_2.kf_2017_batch(y_signals, N_TRAIN, N_TESTBEFORE, n_predict,
+                                                 return_states='No', **dict(KF_PARAMS, **kwargs))[0]
+        single_predictions = single_record_runs(y_signals, n_predict=n_predict, **kwargs)[0]
+
+        assert forked[prediction_method].shape == (len(y_signals), N_TESTBEFORE + n_predict)
+        assert np.allclose(forked[prediction_method], batch_predictions, rtol=1e-12, atol=1e-14)
+        assert np.allclose(forked[prediction_method], single_predictions, rtol=1e-10, atol=1e-12)
+
+
+def test_kalman_forked_batch_prediction_matches_batch_prediction(tmpdir):
+    from analysis_tools.kalman import Kalman
+
+    expt_params = [N_TRAIN, N_PREDICT, N_TESTBEFORE, 20.0, 0.5]
+    kalman_params = [0.01, 0.1, 1.0, 1.0, 0.05]
+    true_noise_params = [0.0, 'Uniform', 0.001, 1.0, -1.0, 30, 1]
+    kalman = Kalman('fork', str(tmpdir), 1, expt_params, kalman_params, [0.0, 0.1], true_noise_params)
+    kalman.propagation = 'Block'
+    y_signals = measurement_records()
+
+    forked = kalman.forked_batch_prediction(y_signals, 1, basis_choice='B', chunk_size=2)
+
+    assert sorted(forked) == sorted(kalman.prediction_method_list)
+    for prediction_method in kalman.prediction_method_list:
+        predictions = kalman.batch_prediction(y_signals, 1, basis_choice='B',
+                                              prediction_method_default=prediction_method)
+        assert np.allclose(forked[prediction_method], predictions, rtol=1e-12, atol=1e-14)
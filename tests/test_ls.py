@@ -0,0 +1,142 @@
+import sys
+
+import pytest
+
+if sys.version_info[0] > 2:
+    pytest.skip("the repository targets Python 2.7", allow_module_level=True)
+
+import numpy as np
+
+from ls.common import least_squares_fit, horizon_targets, doLSF_forecast
+from ls.statePredictions import build_training_dataset, order_recursive_range_of_predictions
+
+
+NUM_ITERS = 7
+
+
+def training_dataset(seed=0, past_msmts=5):
+    rng = np.random.RandomState(seed)
+    measured = np.sin(0.2*np.arange(300)) + 0.1*rng.randn(300)
+    return build_training_dataset(measured, past_msmts=past_msmts, steps_forward=2)
+
+
+@pytest.mark.parametrize("solver", ["Lstsq", "Cholesky"])
+def test_least_squares_fit_matches_lstsq(solver):
+    training_data = training_dataset()
+    actual_values, past_measurements = training_data[:, 0], training_data[:, 1:]
+    expected = np.linalg.lstsq(past_measurements, actual_values, rcond=None)[0]
+
+    weights, errorTrain = least_squares_fit(actual_values, past_measurements, NUM_ITERS, solver=solver)
+
+    assert weights.shape == (past_measurements.shape[1], 1)
+    assert np.allclose(weights[:, 0], expected, rtol=1e-8, atol=1e-10)
+    rms = np.sqrt(np.mean((np.dot(past_measurements, expected) - actual_values)**2))
+    assert errorTrain.shape == (NUM_ITERS,)
+    assert np.allclose(errorTrain, rms)
+
+
+@pytest.mark.parametrize("solver", ["Lstsq", "Cholesky"])
+def test_ridge_matches_augmented_lstsq(solver):
+    training_data = training_dataset()
+    actual_values, past_measurements = training_data[:, 0], training_data[:, 1:]
+    ridge = 0.5
+    d = past_measurements.shape[1]
+    expected = np.linalg.lstsq(np.vstack([past_measurements, np.sqrt(ridge)*np.eye(d)]),
+                               np.concatenate([actual_values, np.zeros(d)]), rcond=None)[0]
+
+    weights = least_squares_fit(actual_values, past_measurements, NUM_ITERS, solver=solver, ridge=ridge)[0]
+
+    assert np.allclose(weights[:, 0], expected, rtol=1e-8, atol=1e-10)
+
+
+def test_multi_output_errorTrain_shape():
+    training_data = training_dataset()
+    actual_values = np.column_stack([training_data[:, 0], 2.0*training_data[:, 0]])
+    past_measurements = training_data[:, 1:]
+
+    weights, errorTrain = least_squares_fit(actual_values, past_measurements, NUM_ITERS)
+
+    assert weights.shape == (past_measurements.shape[1], 2)
+    assert errorTrain.shape == (2, NUM_ITERS)
+    assert np.allclose(weights[:, 1], 2.0*weights[:, 0])
+
+
+def test_cholesky_falls_back_to_lstsq_with_warning():
+    training_data = training_dataset()
+    actual_values = training_data[:, 0]
+    # A zero column makes the normal equations singular
+    past_measurements = np.column_stack([training_data[:, 1:], np.zeros(training_data.shape[0])])
+    expected = np.linalg.lstsq(past_measurements, actual_values, rcond=None)[0]
+
+    with pytest.warns(RuntimeWarning):
+        weights = least_squares_fit(actual_values, past_measurements, NUM_ITERS, solver="Cholesky")[0]
+
+    assert np.allclose(weights[:, 0], expected)
+
+
+def test_joint_requires_closed_form_solver():
+    measured = np.sin(0.2*np.arange(300))
+    with pytest.raises(ValueError):
+        doLSF_forecast(measured, measured, 0.5, 100, 4, 5, solver='GradientDescent', joint='Yes')
+
+
+def test_joint_matches_per_horizon_lstsq_on_shared_rows():
+    rng = np.random.RandomState(1)
+    measurements_train = np.sin(0.2*np.arange(300)) + 0.1*rng.randn(300)
+    measurements_val = np.sin(0.2*np.arange(300)) + 0.1*rng.randn(300)
+    n_predict, past_msmts = 6, 5
+
+    weights_list = doLSF_forecast(measurements_train, measurements_val, 0.5, 100, n_predict,
+                                  past_msmts, solver='Lstsq', joint='Yes')[1]
+
+    rows = horizon_targets(measurements_train, past_msmts, n_predict).shape[0]
+    for idx_steps in range(n_predict):
+        training_data = build_training_dataset(measurements_train, past_msmts=past_msmts,
+                                               steps_forward=idx_steps)[0 : rows]
+        expected = np.linalg.lstsq(training_data[:, 1:], training_data[:, 0], rcond=None)[0]
+        assert np.allclose(weights_list[idx_steps][:, 0], expected, rtol=1e-8, atol=1e-10)
+
+
+def per_cell_design(measured, past_msmts, steps_forward, max_past_msmts, max_steps_forward,
+                    steps_between_msmts, include_offset):
+    ''' Return regressors and targets of one grid cell of
+    order_recursive_range_of_predictions, on the rows shared by all cells. '''
+    s = steps_between_msmts
+    rows = measured.shape[0] - (max_past_msmts - 1)*s - (max_steps_forward + s - 1)
+    now = (max_past_msmts - 1)*s + np.arange(rows)
+    X = np.column_stack([measured[now - idx*s] for idx in range(past_msmts)])
+    if include_offset:
+        X = np.column_stack((np.ones(rows), X))
+    return X, measured[now + s + steps_forward - 1]
+
+
+@pytest.mark.parametrize("steps_between_msmts, include_offset", [(1, False), (2, False), (1, True)])
+@pytest.mark.parametrize("validate", [False, True])
+def test_order_recursive_grid_matches_per_cell_lstsq(steps_between_msmts, include_offset, validate):
+    rng = np.random.RandomState(2)
+    measured = np.sin(0.2*np.arange(200)) + 0.1*rng.randn(200)
+    val_measured = np.sin(0.2*np.arange(200)) + 0.1*rng.randn(200) if validate else np.array([])
+    max_past_msmts, max_steps_forward = 6, 4
+
+    rms_training_data, rms_validation_data = order_recursive_range_of_predictions(
+        measured, val_measured=val_measured, max_past_msmts=max_past_msmts,
+        max_steps_forward=max_steps_forward, steps_between_msmts=steps_between_msmts,
+        include_offset=include_offset)
+
+    assert rms_training_data.shape == (max_past_msmts, max_steps_forward)
+    if not validate:
+        assert rms_validation_data is None
+
+    for idx_p in range(max_past_msmts):
+        for idx_f in range(max_steps_forward):
+            args = (idx_p + 1, idx_f + 1, max_past_msmts, max_steps_forward,
+                    steps_between_msmts, include_offset)
+            X, y = per_cell_design(measured, *args)
+            weights = np.linalg.lstsq(X, y, rcond=None)[0]
+            rms = np.sqrt(np.mean((np.dot(X, weights) - y)**2))
+            assert np.allclose(rms_training_data[idx_p, idx_f], rms, rtol=1e-8)
+
+            if validate:
+                X_val, y_val = per_cell_design(val_measured, *args)
+                rms_val = np.sqrt(np.mean((np.dot(X_val, weights) - y_val)**2))
+                assert np.allclose(rms_validation_data[idx_p, idx_f], rms_val, rtol=1e-8)
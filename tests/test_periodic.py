@@ -0,0 +1,188 @@
+import sys
+
+import pytest
+
+if sys.version_info[0] > 2:
+    pytest.skip("the repository targets Python 2.7", allow_module_level=True)
+
+import numpy as np
+
+from gpr.periodic import GPR_Periodic, GPR_Periodic_FITC, FactorCache, std_periodic
+
+
+def uniform_grid_data(n=300, seed=0):
+    rng = np.random.RandomState(seed)
+    X = np.arange(n, dtype=np.float64)
+    Y = np.sin(2.0*np.pi*X/60.0) + 0.1*rng.randn(n)
+    return X, Y
+
+
+def scattered_data(n=60, seed=2):
+    rng = np.random.RandomState(seed)
+    X = np.sort(rng.uniform(0.0, 100.0, n))
+    Y = np.sin(2.0*np.pi*X/40.0) + 0.1*rng.randn(n)
+    return X, Y
+
+
+PARAMS = [1.3, 0.05, 40.0, 0.8]
+
+
+def central_difference_gradient(model, params, step=1e-4):
+    gradient = np.zeros(len(params))
+    for idx in xrange(len(params)):
+        shifted = list(params)
+        shifted[idx] = params[idx] + step*params[idx]
+        model.set_params(shifted)
+        log_lik_plus = model.log_likelihood()
+        shifted[idx] = params[idx] - step*params[idx]
+        model.set_params(shifted)
+        log_lik_minus = model.log_likelihood()
+        gradient[idx] = (log_lik_plus - log_lik_minus)/(2.0*step*params[idx])
+    model.set_params(params)
+    return gradient
+
+
+@pytest.mark.parametrize("data, solver", [
+    (scattered_data(), 'Cholesky'),
+    (uniform_grid_data(n=100), 'Toeplitz'),
+])
+def test_gradient_matches_central_differences(data, solver):
+    model = GPR_Periodic(data[0], data[1], *PARAMS, solver=solver)
+
+    log_lik, gradient = model.log_likelihood_gradient()
+
+    assert log_lik == model.log_likelihood()
+    assert np.allclose(gradient, central_difference_gradient(model, PARAMS), rtol=1e-5, atol=1e-8)
+
+
+def test_predict_matches_dense_solve():
+    X, Y = scattered_data()
+    sigma, R, period, lengthscale = PARAMS
+    Xnew = np.linspace(90.0, 120.0, 7)
+
+    K = std_periodic(X, X, sigma, period, lengthscale) + R*np.eye(X.shape[0])
+    K_star = std_periodic(X, Xnew, sigma, period, lengthscale)
+    expected_mean = np.dot(K_star.T, np.linalg.solve(K, Y))
+    expected_var = sigma - np.sum(K_star*np.linalg.solve(K, K_star), axis=0) + R
+
+    mean, var = GPR_Periodic(X, Y, *PARAMS).predict(Xnew)
+
+    assert mean.shape == var.shape == (Xnew.shape[0], 1)
+    assert np.allclose(mean[:, 0], expected_mean, rtol=1e-10, atol=1e-12)
+    assert np.allclose(var[:, 0], expected_var, rtol=1e-10, atol=1e-12)
+
+
+def test_fitc_at_training_inputs_matches_exact_model():
+    X, Y = scattered_data()
+    Xnew = np.linspace(90.0, 120.0, 7)
+    exact = GPR_Periodic(X, Y, *PARAMS)
+    sparse = GPR_Periodic_FITC(X, Y, *(PARAMS + [X]))
+
+    # Inducing jitter of INDUCING_JITTER*sigma limits agreement
+    assert np.allclose(sparse.log_likelihood(), exact.log_likelihood(), rtol=1e-5)
+    assert np.allclose(sparse.log_likelihood_gradient()[1], exact.log_likelihood_gradient()[1], rtol=1e-4)
+    for moment_sparse, moment_exact in zip(sparse.predict(Xnew), exact.predict(Xnew)):
+        assert np.allclose(moment_sparse, moment_exact, rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize("inducing", [15, 30])
+def test_fitc_gradient_matches_central_differences(inducing):
+    X, Y = scattered_data()
+    model = GPR_Periodic_FITC(X, Y, *(PARAMS + [inducing]))
+
+    log_lik, gradient = model.log_likelihood_gradient()
+
+    assert model.Z.shape == (inducing,)
+    assert log_lik == model.log_likelihood()
+    assert np.allclose(gradient, central_difference_gradient(model, PARAMS), rtol=1e-5, atol=1e-8)
+
+
+@pytest.mark.parametrize("sigma, R, period, lengthscale", [
+    (1.0, 0.1, 60.0, 1.0),
+    (2.0, 1e-3, 160.0, 3.0),
+    (0.5, 1.0, 25.0, 0.5),
+])
+def test_toeplitz_matches_cholesky(sigma, R, period, lengthscale):
+    X, Y = uniform_grid_data()
+    toeplitz = GPR_Periodic(X, Y, sigma, R, period, lengthscale, solver='Toeplitz')
+    cholesky = GPR_Periodic(X, Y, sigma, R, period, lengthscale, solver='Cholesky')
+
+    log_lik_t, gradient_t = toeplitz.log_likelihood_gradient()
+    log_lik_c, gradient_c = cholesky.log_likelihood_gradient()
+
+    assert toeplitz._get_posterior()[0][0] == 'Toeplitz'
+    assert np.allclose(log_lik_t, log_lik_c, rtol=1e-10, atol=1e-8)
+    assert np.allclose(gradient_t, gradient_c, rtol=1e-8, atol=1e-8*np.max(np.abs(gradient_c)))
+
+    # Predictive variances cancel sigma against k^T (K + R I)^-1 k
+    Xnew = np.arange(X.shape[0] - 10, X.shape[0] + 20, dtype=np.float64)
+    for moment_t, moment_c in zip(toeplitz.predict(Xnew), cholesky.predict(Xnew)):
+        assert np.allclose(moment_t, moment_c, rtol=1e-6, atol=1e-8*sigma)
+
+
+def test_auto_uses_cholesky_for_ill_conditioned_grid():
+    X, Y = uniform_grid_data(n=500)
+    auto = GPR_Periodic(X, Y, 1.0, 1e-7, 100.0, 3.0, solver='Auto')
+    cholesky = GPR_Periodic(X, Y, 1.0, 1e-7, 100.0, 3.0, solver='Cholesky')
+
+    assert auto._get_posterior()[0][0] == 'Cholesky'
+    assert auto.log_likelihood() == cholesky.log_likelihood()
+    assert np.all(auto.predict(np.arange(500.0, 550.0))[1] > 0)
+
+
+def cholesky_factor(n, value=1.0):
+    return ('Cholesky', value*np.eye(n), 0.0)
+
+
+def test_factor_cache_evicts_least_recently_used():
+    nbytes = cholesky_factor(10)[1].nbytes
+    cache = FactorCache(max_bytes=2*nbytes)
+
+    cache.put('a', cholesky_factor(10))
+    cache.put('b', cholesky_factor(10))
+    assert cache.get('a') is not None # 'b' is now least recently used
+    cache.put('c', cholesky_factor(10))
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.nbytes == 2*nbytes
+
+
+def test_factor_cache_respects_byte_bound():
+    nbytes = cholesky_factor(10)[1].nbytes
+    cache = FactorCache(max_bytes=3*nbytes - 1)
+
+    for key in range(5):
+        cache.put(key, cholesky_factor(10))
+        assert cache.nbytes <= cache.max_bytes
+    assert cache.nbytes == 2*nbytes
+
+    cache.put('large', cholesky_factor(30)) # larger than max_bytes: not stored
+    assert cache.get('large') is None
+    assert cache.nbytes == 2*nbytes
+
+    cache.put(4, cholesky_factor(10, value=2.0)) # replacing an entry does not double count
+    assert cache.nbytes == 2*nbytes
+    assert cache.get(4)[1][0, 0] == 2.0
+
+    cache.clear()
+    assert cache.nbytes == 0 and cache.get(4) is None
+
+
+def test_models_sharing_inputs_and_params_reuse_factorisation():
+    X, Y = uniform_grid_data()
+    cache = FactorCache()
+    params = [1.0, 0.1, 60.0, 1.0]
+
+    first = GPR_Periodic(X, Y, *params, cache=cache)
+    first.log_likelihood()
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    second = GPR_Periodic(X, 2.0*Y, *params, cache=cache)
+    assert second._get_posterior()[0] is first._get_posterior()[0]
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert np.allclose(second.predict(X[-5:])[0], 2.0*first.predict(X[-5:])[0])
+
+    GPR_Periodic(X, Y, 1.0, 0.2, 60.0, 1.0, cache=cache).log_likelihood()
+    GPR_Periodic(X[1:], Y[1:], *params, cache=cache).log_likelihood()
+    assert (cache.hits, cache.misses) == (1, 3)
@@ -0,0 +1,42 @@
+import sys
+
+import pytest
+
+if sys.version_info[0] > 2:
+    pytest.skip("the repository targets Python 2.7", allow_module_level=True)
+
+import numpy as np
+
+from analysis_tools.riskanalysis import Create_KF_Experiment
+
+
+BAYES_PARAMS = [3, 4, np.arange(-3, 3), 2]
+EXPT_PARAMS = [200, 50, 30, 20.0, 50.0]
+KALMAN_PARAMS = [0.01, 0.1, 1.0, 100.0, 5.0]
+MSMT_NOISE_PARAMS = [0.0, 0.1]
+TRUE_NOISE_PARAMS = [0.0, 'Uniform', 0.001, 1.0, -1.0, 30, 1]
+
+
+def bayes_risk_map(savetopath, num_processes, rng_seed):
+    np.random.seed(3)
+    experiment = Create_KF_Experiment(BAYES_PARAMS, 'test', str(savetopath), 4, EXPT_PARAMS,
+                                      KALMAN_PARAMS, MSMT_NOISE_PARAMS, TRUE_NOISE_PARAMS)
+    experiment.num_processes = num_processes
+    experiment.rng_seed = rng_seed
+    experiment.naive_implementation()
+
+    bayes_map = dict(np.load(str(savetopath.join('testBR_Map.npz')), allow_pickle=True))
+    del bayes_map['savetopath']
+    return bayes_map, np.random.rand()
+
+
+@pytest.mark.parametrize("rng_seed", [None, 7])
+def test_pooled_bayes_risk_map_matches_serial(tmpdir, rng_seed):
+    serial_map, serial_next_draw = bayes_risk_map(tmpdir.mkdir('serial'), 1, rng_seed)
+    pooled_map, pooled_next_draw = bayes_risk_map(tmpdir.mkdir('pooled'), 2, rng_seed)
+
+    assert sorted(pooled_map) == sorted(serial_map)
+    for key in serial_map:
+        assert pooled_map[key].tolist() == serial_map[key].tolist(), key
+    # Both runs draw the same numbers from the global np.random state
+    assert pooled_next_draw == serial_next_draw
@@ -0,0 +1,54 @@
+import sys
+
+import pytest
+
+if sys.version_info[0] > 2:
+    pytest.skip("the repository targets Python 2.7", allow_module_level=True)
+
+import numpy as np
+
+from ls.rls import RLS_Predictor
+from ls.statePredictions import build_training_dataset
+
+
+def measurement_record(seed=3, num=400):
+    rng = np.random.RandomState(seed)
+    return np.sin(0.15*np.arange(num)) + 0.5*np.cos(0.4*np.arange(num)) + 0.1*rng.randn(num)
+
+
+@pytest.mark.parametrize("steps_forward, steps_between_msmts", [(1, 1), (3, 1), (2, 2)])
+@pytest.mark.parametrize("forgetting_factor", [1.0, 0.98])
+def test_rls_matches_batch_lstsq(steps_forward, steps_between_msmts, forgetting_factor):
+    measured = measurement_record()
+    past_msmts = 4
+
+    predictor = RLS_Predictor(past_msmts, steps_forward=steps_forward,
+                              steps_between_msmts=steps_between_msmts,
+                              forgetting_factor=forgetting_factor, p0=1e8)
+    weights = predictor.train(measured)
+
+    training_data = build_training_dataset(measured, past_msmts=past_msmts, steps_forward=steps_forward,
+                                           steps_between_msmts=steps_between_msmts)
+    assert predictor.num_updates == training_data.shape[0]
+
+    # Residual i is weighted by forgetting_factor**(number of later updates)
+    sqrt_w = np.sqrt(forgetting_factor**np.arange(training_data.shape[0] - 1, -1, -1))
+    expected = np.linalg.lstsq(training_data[:, 1:]*sqrt_w[:, np.newaxis],
+                               training_data[:, 0]*sqrt_w, rcond=None)[0]
+
+    assert np.allclose(weights[:, 0], expected, rtol=1e-5, atol=1e-7)
+
+
+def test_rls_prediction_uses_latest_msmts():
+    measured = measurement_record()
+    predictor = RLS_Predictor(3, steps_forward=2, steps_between_msmts=2)
+    assert predictor.predict() is None
+
+    predictor.train(measured)
+    latest = measured[::-1][0 : 3*2 : 2]
+    assert np.allclose(predictor.predict(), np.dot(latest, predictor.weights[:, 0]))
+
+
+def test_rls_rejects_invalid_forgetting_factor():
+    with pytest.raises(ValueError):
+        RLS_Predictor(3, forgetting_factor=0.0)
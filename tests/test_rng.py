@@ -0,0 +1,42 @@
+import sys
+
+import pytest
+
+if sys.version_info[0] > 2:
+    pytest.skip("the repository targets Python 2.7", allow_module_level=True)
+
+import numpy as np
+
+from analysis_tools.rng import get_rng, spawn_rngs, SETUP_KEY
+
+
+KEYS = [(), (0,), (1,), (0, 0), (0, 1), SETUP_KEY]
+
+
+def test_streams_do_not_depend_on_call_order():
+    forward = dict((key, get_rng(11, key).randn(5)) for key in KEYS)
+
+    np.random.seed(0)
+    backward = {}
+    for key in reversed(KEYS):
+        np.random.rand()
+        rng = get_rng(11, key)
+        backward[key] = rng.randn(5)
+        # Later draws from other streams or the global state do not alter this one
+        get_rng(11, key[:-1]).randn(3)
+
+    for key in KEYS:
+        assert np.array_equal(backward[key], forward[key])
+
+
+def test_streams_differ_by_seed_and_key():
+    draws = [get_rng(11, key).randn(5) for key in KEYS] + [get_rng(12, ()).randn(5)]
+
+    for idx in xrange(len(draws)):
+        for other in xrange(idx + 1, len(draws)):
+            assert not np.array_equal(draws[idx], draws[other])
+
+
+def test_spawn_rngs_match_get_rng():
+    for idx, rng in enumerate(spawn_rngs(11, 3, key=(4,))):
+        assert np.array_equal(rng.randn(5), get_rng(11, (4, idx)).randn(5))
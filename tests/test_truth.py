@@ -0,0 +1,48 @@
+import sys
+
+import pytest
+
+if sys.version_info[0] > 2:
+    pytest.skip("the repository targets Python 2.7", allow_module_level=True)
+
+import numpy as np
+
+from analysis_tools.truth import Truth
+
+
+def make_truth(f0, Delta_T_Sampling, number_of_points, J):
+    return Truth([0.0, 'Uniform', 0.001, f0, -1.0, J, 1], num=number_of_points,
+                 DeltaT=Delta_T_Sampling)
+
+
+@pytest.mark.parametrize("f0, Delta_T_Sampling, number_of_points, J", [
+    (0.5, 0.001, 2000, 299),
+    (1.0, 0.02, 250, 30),
+    (1.0, 0.02, 250, 200), # Components above the sampling frequency alias
+])
+def test_fft_synthesis_matches_direct(f0, Delta_T_Sampling, number_of_points, J):
+    truth = make_truth(f0, Delta_T_Sampling, number_of_points, J)
+    assert truth.fft_grid_spacing() is not None
+
+    fft_traces = truth.beta_z_batch(20, rng=np.random.RandomState(1), chunk_size=7)
+    direct_traces = truth.beta_z_batch(20, rng=np.random.RandomState(1), synthesis='Direct')
+
+    assert fft_traces.shape == (20, number_of_points)
+    assert np.max(np.abs(fft_traces - direct_traces)) < 1e-12*np.max(np.abs(direct_traces))
+
+
+def test_non_commensurate_comb_falls_back_to_direct():
+    truth = make_truth(0.497, 0.001, 2000, 100)
+    assert truth.fft_grid_spacing() is None
+
+    auto_traces = truth.beta_z_batch(20, rng=np.random.RandomState(1))
+    direct_traces = truth.beta_z_batch(20, rng=np.random.RandomState(1), synthesis='Direct')
+
+    assert np.array_equal(auto_traces, direct_traces)
+
+
+def test_beta_z_is_first_row_of_batch():
+    truth = make_truth(0.5, 0.001, 2000, 299)
+    single = truth.beta_z(rng=np.random.RandomState(2))[0]
+    batch = truth.beta_z_batch(3, rng=np.random.RandomState(2))
+    assert np.max(np.abs(single - batch[0])) < 1e-12*np.max(np.abs(batch[0]))